@@ -3,26 +3,71 @@
 import argparse
 from collections import OrderedDict
 from datetime import datetime
-import glob
+import hashlib
+import json
 import os
-from pprint import pprint
 import shutil
 import sys
-import urllib
-
-# Installed packages
-import mistune
-import requests
-import yaml
+import urllib.parse
+
+# Package modules
+from artblog.assets import get_asset_copy_mode, sync_file
+from artblog.cli import COMMANDS, STARTUP_OPTIONS
+from artblog.cli import main as cli_main
+from artblog.buildprofile import (PROFILE_FILE, add_post_records,
+                                  finish_profile, get_counters, get_startup,
+                                  post_record, print_startup_report,
+                                  profile_stage, start_profile)
+from artblog.compress import compress_outputs, get_precompress_formats
+from artblog.discovery import (check_slug_collisions, get_git_index,
+                               list_folder)
+from artblog.feeds import (FEED_FILE, FEED_LINK, feed_xml, get_feed_posts,
+                           sitemap_files)
+from artblog.fingerprint import (CACHE_MANIFEST, cache_manifest_text,
+                                 fingerprint_output, fingerprint_urls,
+                                 get_fingerprint, rewrite_asset_urls)
+from artblog.frontmatter import parse_front_matter, split_front_matter
+from artblog.generations import (KEEP_GENERATIONS, finish_generation,
+                                 start_generation)
+from artblog.imageprobe import (add_image_dimensions, get_image_placeholders,
+                                get_lazy_images, image_placeholder,
+                                probe_images)
+from artblog.images import (BODY_IMAGE_SIZES, CARD_IMAGE_SIZES,
+                            generate_image_variants, get_image_widths,
+                            group_images_by_folder, rewrite_img_tags)
+from artblog.manifest import (CACHE_FOLDER, finish_build, hash_file,
+                              hash_text, is_unchanged, load_manifest,
+                              start_build)
+from artblog.metaindex import post_outfile, post_slug, update_metadata_index
+from artblog.minify import (get_minifier, get_minify, output_digest,
+                            write_minified, write_output)
+from artblog.renderers import (DEFAULT_RENDERER, get_markdown_renderer,
+                               render_markdown)
+from artblog.search import (SEARCH_FOLDER, SEARCH_FORM, SEARCH_PAGE,
+                            SEARCH_SCRIPT, collect_terms, get_search,
+                            index_digest, index_files, post_terms,
+                            reuse_index)
+from artblog.sizereport import (SIZE_REPORT_FILE, finish_size_report,
+                                get_size_budgets, is_over_budget,
+                                make_size_report)
+from artblog.template import (BRACKET_SLOT, compile_template, escape,
+                              render_template, split_template)
 
 CMDLINE_APP_NAME = 'ArtBlog - a static site generator'
 
 DATA_HTML_BASE = os.path.join('html', 'base.html')
 DATA_HTML_LICENSE = os.path.join('html', 'license.html')
 DATA_CSS_STYLE = os.path.join('css', 'style.css')
+DATA_JS_SEARCH = os.path.join('js', 'search.js')
 CONFIG_TEMPLATE = os.path.join('config', 'config.yml')
 
-MARKDOWN_EXTENSIONS = ('.md')
+
+# Config settings only used for category pages
+LISTING_KEYS = ('posts_per_page', 'sort_posts_by', 'sort_order',
+                'image_placeholders')
+
+# Config settings that don't change the content of pages
+OUTPUT_KEYS = ('output', 'precompress', 'feed_posts', 'image_cache')
 
 LOGO_LINK = '''
 <div class="logo">
@@ -45,11 +90,20 @@ POST_LINK = '''
 
 '''.lstrip()
 
+PAGE_LINKS = '''
+<nav class="pagination">
+  [PREV]
+  <span class="page-number">Page [PAGE]</span>
+  [NEXT]
+</nav>
+'''.lstrip()
+
 ROBOTS_TXT = '''
 User-agent: *
 Host: {{base_url}}
 Disallow: /cgi-bin/
 Disallow: /tmp/
+Sitemap: {{base_url}}/sitemap.xml
 '''.lstrip()
 
 PROPERTY = '''
@@ -62,16 +116,94 @@ PROPERTY = '''
 {{TAGS}}
 '''.strip()
 
+TAG_PROPERTY = '  <meta property="article:tag" content="{{tag}}">\n'
+
+def add_build_arguments(parser):
+    """Add the arguments controlling how the site is built."""
+    parser.add_argument('config_yml', help='YAML configuration file')
+    add_build_options(parser)
+
+
+def add_build_options(parser):
+    """Add the options of add_build_arguments(), without the config file."""
+    parser.add_argument('--preserve_output', '-p',
+                        action='store_true',
+                        help='if set, current output folder will be preserved')
+    parser.add_argument('--incremental', '-i',
+                        action='store_true',
+                        help='if set, only regenerate outputs whose inputs '
+                             'changed since the last build')
+    parser.add_argument('--staged', '-s',
+                        action='store_true',
+                        help='build into a new generation folder and switch '
+                             'the output link to it once the build succeeded')
+    parser.add_argument('--generations',
+                        type=int, default=KEEP_GENERATIONS,
+                        help='number of generations kept by staged builds')
+    parser.add_argument('--jobs', '-j',
+                        type=int, default=1,
+                        help='number of processes rendering posts '
+                             '(0 uses all CPU cores)')
+    parser.add_argument('--profile',
+                        nargs='?', const=PROFILE_FILE, metavar='REPORT_JSON',
+                        help='write the time, I/O and memory of every build '
+                             f'stage to a JSON report ({PROFILE_FILE} if no '
+                             'file is given)')
+    parser.add_argument('--profile_top',
+                        type=int, default=10,
+                        help='number of slowest posts in the profile report')
+    parser.add_argument('--cprofile',
+                        metavar='STATS_FILE',
+                        help='run the build under cProfile and write its '
+                             'stats to this file')
+    parser.add_argument('--time_startup', '--time-startup',
+                        action='store_true',
+                        help='print the time taken to start and to import '
+                             'the dependencies')
+    parser.add_argument('--size_report',
+                        nargs='?', const=SIZE_REPORT_FILE,
+                        metavar='REPORT_JSON',
+                        help='write the weight of every page, with its images '
+                             'and stylesheets, to a JSON report '
+                             f'({SIZE_REPORT_FILE} if no file is given)')
+    parser.add_argument('--size_top',
+                        type=int, default=10,
+                        help='number of largest pages, images and categories '
+                             'in the size report')
+    parser.add_argument('--strict_budgets',
+                        action='store_true',
+                        help='exit with status 1 if a page or image is over '
+                             'the page_budget or image_budget of the config')
+
+
+def check_build_arguments(args):
+    """Check and update the arguments added by add_build_arguments()."""
+    if args.jobs < 0:
+        print(f'ERROR: Invalid number of jobs: {args.jobs}')
+        sys.exit(1)
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.profile_top < 0:
+        print(f'ERROR: Invalid number of posts: {args.profile_top}')
+        sys.exit(1)
+    if args.generations < 1:
+        print(f'ERROR: Invalid number of generations: {args.generations}')
+        sys.exit(1)
+    if args.size_top < 0:
+        print(f'ERROR: Invalid number of largest pages: {args.size_top}')
+        sys.exit(1)
+
+
 def get_user_inputs():
     '''Get user arguments.'''
     parser = argparse.ArgumentParser(
         description=CMDLINE_APP_NAME,
+        epilog='other commands: ' + ', '.join(
+            f'artblog {command} -h' for command in COMMANDS),
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('config_yml', help='YAML configuration file')
-    parser.add_argument('--preserve_output', '-p',
-                        action='store_true',
-                        help='if set, current output folder will be preserved')
+    add_build_arguments(parser)
     args = parser.parse_args()
+    check_build_arguments(args)
 
     if not os.path.isfile(args.config_yml):
         print(f'Generating template file: {args.config_yml}')
@@ -84,7 +216,15 @@ def get_user_inputs():
             f.write(config_yml_txt)
         sys.exit(0)
 
-    with open(args.config_yml) as f:
+    return load_config(args.config_yml), args
+
+
+def load_config(config_yml):
+    """Read the configuration file and check its settings."""
+    # Imported when needed, to start quickly (e.g. "artblog daemon build")
+    import yaml
+
+    with open(config_yml) as f:
         # yaml.BaseLoader loads everything as string
         # yaml.FullLoader interprets as int, etc
         config = yaml.load(f, Loader=yaml.BaseLoader)
@@ -107,6 +247,24 @@ def get_user_inputs():
     if 'favicon' in config:
         config['favicon'] = check_file(config['favicon'])
 
+    # Check how source files are listed and copied to the output folder
+    get_git_index(config)
+    get_asset_copy_mode(config)
+    get_image_widths(config)
+    get_lazy_images(config)
+    get_image_placeholders(config)
+    get_precompress_formats(config)
+    get_fingerprint(config)
+    get_minify(config)
+    get_feed_posts(config)
+    get_search(config)
+    get_markdown_renderer(config)
+    get_size_budgets(config)
+
+    # Check how category pages are split and sorted
+    get_posts_per_page(config)
+    get_sort_order(config)
+
     # Clean up and check the URL
     config['base_url'] = config['base_url'].strip('/')
     check_url(config['base_url'])
@@ -116,7 +274,7 @@ def get_user_inputs():
     if 'site_name' in config:
         config['page_title_postfix'] = f" | {config['site_name']}"
 
-    return config, args.preserve_output
+    return config
 
 
 def check_url(url):
@@ -163,43 +321,124 @@ def package_data_file(filepath):
     return filepath
 
 
-def read_package_data_files():
-    """Read package data files and return the text."""
-    with open(package_data_file(DATA_HTML_BASE),
-                'rt', encoding='utf-8') as f:
-        base_html = f.read()
+# Package data file -> (mtime_ns, text), see read_package_data_file()
+_package_data = {}
 
-    with open(package_data_file(DATA_HTML_LICENSE),
-                'rt', encoding='utf-8') as f:
-        license_html = f.read()
 
-    with open(package_data_file(DATA_CSS_STYLE),
-                'rt', encoding='utf-8') as f:
-        style_css = f.read()
+def read_package_data_file(filepath):
+    """Return the text of a package data file.
 
+    The text is kept while the file is unmodified, so the builds of a
+    daemon don't read it again.
+    """
+    filepath = package_data_file(filepath)
+    mtime_ns = os.stat(filepath).st_mtime_ns
+    cached = _package_data.get(filepath)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    with open(filepath, 'rt', encoding='utf-8') as f:
+        txt = f.read()
+    _package_data[filepath] = (mtime_ns, txt)
+    return txt
+
+
+def read_package_data_files():
+    """Read package data files and return the text."""
+    base_html = read_package_data_file(DATA_HTML_BASE)
+    license_html = read_package_data_file(DATA_HTML_LICENSE)
+    style_css = read_package_data_file(DATA_CSS_STYLE)
     return base_html, license_html, style_css
 
 
-def remove_directory_contents(path_to_folder):
+def remove_directory_contents(path_to_folder, keep=(CACHE_FOLDER,)):
     """Remove contents of directory without deleting the directory."""
-    for root, dirs, files in os.walk(path_to_folder):
-        for f in files:
-            os.remove(os.path.join(root, f))
-        for d in dirs:
-            shutil.rmtree(os.path.join(root, d))
+    for name in os.listdir(path_to_folder):
+        if name in keep:
+            continue
+        path = os.path.join(path_to_folder, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def write_page(config, outfile, txt, manifest):
+    """Write generated text to the output folder if it changed."""
+    relpath = os.path.relpath(outfile, config['output'])
+    minifier = get_minifier(config, outfile)
+    digest = output_digest(hash_text(txt), minifier)
+    manifest['current']['pages'][relpath] = digest
+    if is_unchanged(config['output'], relpath, digest, manifest, 'pages'):
+        return
 
+    os.makedirs(os.path.dirname(outfile), exist_ok=True)
+    manifest['stats']['minified'] += write_output(outfile, txt, minifier)
+
+
+class PageWriter:
+    """Write generated text to the output folder piece by piece.
+
+    Like write_page(), without holding the whole text in memory: pieces
+    are hashed as they are written to a temporary file, which replaces
+    the output on close() only if the text changed. Each piece is
+    minified on its own, so pieces should be whole HTML elements.
+    """
 
-def generate_style_css(config, style_css):
+    def __init__(self, config, outfile, manifest):
+        self.output = config['output']
+        self.outfile = outfile
+        self.manifest = manifest
+        self.minifier = get_minifier(config, outfile)
+        self.hash = hashlib.sha256()
+        self.saved = 0
+        os.makedirs(os.path.dirname(outfile), exist_ok=True)
+        self.tmpfile = outfile + '.artblog-tmp'
+        self.file = open(self.tmpfile, 'wt', encoding='utf-8')
+
+    def write(self, txt):
+        self.hash.update(txt.encode('utf-8'))
+        self.saved += write_minified(self.file, txt, self.minifier)
+
+    def close(self):
+        self.file.close()
+        relpath = os.path.relpath(self.outfile, self.output)
+        digest = output_digest(self.hash.hexdigest(), self.minifier)
+        self.manifest['current']['pages'][relpath] = digest
+        if is_unchanged(self.output, relpath, digest, self.manifest,
+                        'pages'):
+            os.remove(self.tmpfile)
+            return
+        os.replace(self.tmpfile, self.outfile)
+        self.manifest['stats']['minified'] += self.saved
+
+
+def find_posts(config):
+    """Return the post .md files of all sources."""
+    list_markdown = []
+    for posts_folder in config['sources']:
+        list_markdown += list_folder(config, posts_folder)[0]
+    check_slug_collisions(list_markdown)
+    return list_markdown
+
+
+def sync_files(config, src_folder, dst_folder, list_other, manifest):
+    """Copy non-markdown files of a folder to the output."""
+    for relpath in list_other:
+        sync_file(config, os.path.join(src_folder, relpath),
+                  os.path.join(dst_folder, relpath), manifest)
+
+
+def generate_style_css(config, style_css, manifest):
     """Generate style.css in output folder."""
-    outpath = os.path.join(config['output'], 'css')
-    if not os.path.exists(outpath):
-        os.mkdir(outpath)
-    outfile = os.path.join(config['output'], DATA_CSS_STYLE)
-    with open(outfile, 'wt', encoding='utf-8') as f:
-        f.write(style_css)
+    digest = output_digest(hash_text(style_css),
+                           get_minifier(config, DATA_CSS_STYLE))
+    relpath = fingerprint_output(config, DATA_CSS_STYLE, digest, manifest)
+    outfile = os.path.join(config['output'], relpath)
+    write_page(config, outfile, style_css, manifest)
 
 
-def generate_base_html(config, base_html, license_html):
+def generate_base_html(config, base_html, license_html, manifest):
     """Generate the base HTML template."""
     KEYS_TO_REPLACE = ['author', 'base_url', 'copyright_year']
     if 'copyright_year' not in config:
@@ -209,63 +448,90 @@ def generate_base_html(config, base_html, license_html):
         s = config[k]
         if k=='base_url':
             s += '/'
-        base_html = base_html.replace(tag, s)
+        base_html = base_html.replace(tag, escape(s))
 
     base_html = base_html.replace('{{license}}', license_html)
 
     outpath = os.path.join(config['output'], 'site_images')
-    if not os.path.exists(outpath):
-        os.mkdir(outpath)
 
     if 'favicon' not in config:
         base_html = base_html.replace('{{favicon}}', '')
     else:
         faviconfile = '/site_images/' + os.path.basename(config['favicon'])
-        s = f'<link rel="icon" href="{faviconfile}">'
+        s = f'<link rel="icon" href="{escape(faviconfile)}">'
         base_html = base_html.replace('{{favicon}}', s)
         dstfile = os.path.join(outpath, os.path.basename(config['favicon']))
-        shutil.copyfile(config['favicon'], dstfile)
+        sync_file(config, config['favicon'], dstfile, manifest)
+
+    if not get_feed_posts(config):
+        base_html = base_html.replace('{{feed}}', '')
+    else:
+        title = config.get('site_name', config['base_url'])
+        s = FEED_LINK.replace('{{title}}', escape(title))
+        base_html = base_html.replace('{{feed}}', s)
+
+    if not get_search(config):
+        base_html = base_html.replace('{{search}}', '')
+    else:
+        base_html = base_html.replace('{{search}}', SEARCH_FORM)
 
     if 'logo' not in config:
         base_html = base_html.replace('{{logo}}', '')
     else:
         logofile = '/site_images/' + os.path.basename(config['logo'])
-        s = LOGO_LINK.replace('[LOGOFILE]', logofile)
+        s = LOGO_LINK.replace('[LOGOFILE]', escape(logofile))
         #s = s.replace('[HREF]', config['base_url'])
         #s = f'<div class="logo"><img src="{logofile}" alt="logo"></div>'
         base_html = base_html.replace('{{logo}}', s)
         dstfile = os.path.join(outpath, os.path.basename(config['logo']))
-        shutil.copyfile(config['logo'], dstfile)
+        sync_file(config, config['logo'], dstfile, manifest)
 
     return base_html
 
 
-def markdown_to_html(filepath, metadata=True):
-    """Convert markdown to HTML."""
+# Markdown HTML kept for the sites of a batch build, see share_markdown()
+_shared_markdown = {'folders': (), 'html': {}}
+
+
+def share_markdown(folders):
+    """Keep the HTML of the markdown files below folders for later builds.
+
+    Used by batch builds of sites with sources in common, so these are
+    converted once. share_markdown(()) stops it and frees the HTML.
+    """
+    _shared_markdown['folders'] = tuple(
+        os.path.join(os.path.realpath(folder), '') for folder in folders)
+    _shared_markdown['html'] = {}
+
+
+def markdown_to_html(filepath, metadata=True, renderer=DEFAULT_RENDERER):
+    """Convert markdown to HTML with a renderer of artblog.renderers."""
     with open(filepath, 'rt', encoding='utf-8') as f:
         txt = f.read()
 
     meta = None
     if metadata:
-        # Separate metadata from markdown text
-        loc = txt.find('---', 3)  # Find 2nd occurrence of "---"
-        if loc < 0:
-            print(f'ERROR: Cannot find metadata in {filepath}')
-            sys.exit(1)
-
-        meta_txt = txt[:loc]
-        md_txt = txt[loc+3:]  # skip over 2nd occurrence of "---"
-
-        # Extract metadata
-        meta = yaml.load(meta_txt, Loader=yaml.BaseLoader)
+        # Separate metadata from markdown text and extract metadata
+        meta_txt, md_txt = split_front_matter(txt)
+        meta = parse_front_matter(meta_txt)
 
         # Add title to markdown
-        md_txt = f'# {meta["title"]}\n---\n' + md_txt
+        md_txt = f'# {escape(meta["title"])}\n---\n' + md_txt
     else:
         md_txt = txt
 
-    # Convert markdown to html
-    html = mistune.html(md_txt)
+    # Convert markdown to html, once for files shared by several sites
+    key = None
+    if _shared_markdown['folders'] and \
+            os.path.realpath(filepath).startswith(_shared_markdown['folders']):
+        key = hash_text(renderer + '\n' + md_txt)
+        html = _shared_markdown['html'].get(key)
+        if html is not None:
+            return html, meta
+
+    html = render_markdown(md_txt, renderer)
+    if key is not None:
+        _shared_markdown['html'][key] = html
 
     return html, meta
 
@@ -273,7 +539,7 @@ def markdown_to_html(filepath, metadata=True):
 def generate_menu_folders(config):
     """Generate folders to hold menu html pages."""
     menu_folder = os.path.join(config['output'], 'menu')
-    os.mkdir(menu_folder)
+    os.makedirs(menu_folder, exist_ok=True)
 
     if 'Other' not in config['menu']:
         config['menu'].append('Other')
@@ -282,7 +548,7 @@ def generate_menu_folders(config):
     for category in config['menu']:
         s = category.strip().lower().replace(' ','')
         folder = os.path.join(menu_folder, s)
-        os.mkdir(folder)
+        os.makedirs(folder, exist_ok=True)
         cat2slug[category] = f'menu/{s}/'
 
     return cat2slug
@@ -297,8 +563,8 @@ def generate_navbar_html(cat2slug, active_category=None):
     navbar_html = ''
     for category, slug in cat2slug.items():
         s = f'      {MENU_LINE}\n'
-        s = s.replace('[VISIBLE]', category)
-        s = s.replace('[HREF]', '/' + slug)
+        s = s.replace('[VISIBLE]', escape(category))
+        s = s.replace('[HREF]', escape('/' + slug))
         if category != active_category:
             s = s.replace(' class="active"', '')
         navbar_html += s
@@ -307,189 +573,644 @@ def generate_navbar_html(cat2slug, active_category=None):
     return navbar_html
 
 
-def generate_mainpage(config, base_html, cat2slug):
-    """Generate main landing page of blog in output folder."""
-    shutil.copytree(
-            config['mainpage_folder'],
-            config['output'],
-            dirs_exist_ok=True)
+def generate_page_templates(base_html, cat2slug, dct_images,
+                            dct_fingerprints, dct_dimensions):
+    """Compile the templates and navigation bars shared by all pages."""
+    # There is one navigation bar per highlighted category, plus the
+    # one without highlighted category
+    navbars = {None: generate_navbar_html(cat2slug)}
+    for category in cat2slug:
+        navbars[category] = generate_navbar_html(
+            cat2slug, active_category=category)
+
+    return {
+        'page': compile_template(base_html),
+        'property': compile_template(PROPERTY),
+        'tag_property': compile_template(TAG_PROPERTY),
+        'post_link': compile_template(POST_LINK, BRACKET_SLOT),
+        'page_links': compile_template(PAGE_LINKS, BRACKET_SLOT),
+        'navbars': navbars,
+        'images': dct_images,
+        'fingerprints': dct_fingerprints,
+        'dimensions': dct_dimensions,
+        }
+
+
+def sync_site_assets(config, manifest):
+    """Copy images etc. to output folder and return the post .md files."""
+    mainpage_folder = config['mainpage_folder']
+    sync_files(config, mainpage_folder, config['output'],
+               list_folder(config, mainpage_folder)[1], manifest)
+
+    # Find all posts first, so no output is written over by another post
+    list_markdown = []
+    dct_other = OrderedDict()
+    for posts_folder in config['sources']:
+        list_source_markdown, dct_other[posts_folder] = list_folder(
+            config, posts_folder)
+        list_markdown += list_source_markdown
+    check_slug_collisions(list_markdown)
 
-    # Update base_html with navigation bar
-    navbar_html = generate_navbar_html(cat2slug)
-    base_html = base_html.replace('{{nav_line_items}}', navbar_html)
+    output_posts = os.path.join(config['output'], 'posts')
+    for posts_folder, list_other in dct_other.items():
+        sync_files(config, posts_folder, output_posts, list_other, manifest)
+
+    return list_markdown
 
+
+def generate_mainpage(config, templates, manifest):
+    """Generate main landing page of blog in output folder."""
     # Generate html and update fields
-    filepath = os.path.join(config['output'], 'index.md')
-    html, _ = markdown_to_html(filepath, metadata=False)
-    os.remove(filepath)  # Remove source markdown from output
-    html = base_html.replace('{{content}}', html)
-    s = 'Main' + config['page_title_postfix']
-    html = html.replace('{{page_title}}', s)
-    html = html.replace('{{property}}', '')
+    filepath = os.path.join(config['mainpage_folder'], 'index.md')
+    html, _ = markdown_to_html(filepath, metadata=False,
+                               renderer=get_markdown_renderer(config))
+    if templates['images']:
+        html = rewrite_img_tags(
+            html, '/', templates['images'], BODY_IMAGE_SIZES)
+    if templates['dimensions']:
+        html = add_image_dimensions(html, '/', templates['dimensions'])
+    html = rewrite_asset_urls(html, '/', templates['fingerprints'])
 
     # Update canonical link, slug provides root-relative URL
-    mainpage_html = os.path.splitext(filepath)[0] + '.html'
+    mainpage_html = os.path.join(config['output'], 'index.html')
     slug = '/'
     canonical = config['base_url'] + slug
-    html = html.replace('{{canonical}}', canonical)
+
+    html = render_template(templates['page'], {
+        'content': html,
+        'page_title': escape('Main' + config['page_title_postfix']),
+        'property': '',
+        'canonical': escape(canonical),
+        'nav_line_items': templates['navbars'][None],
+        })
 
     # Write to output HTML files
-    with open(mainpage_html, 'wt', encoding='utf-8') as f:
-        f.write(html)
+    write_page(config, mainpage_html, html, manifest)
 
 
-def generate_posts(config, base_html, cat2slug):
-    """Copy posts to output folder as HTML."""
-    # Copy post .md files to output
-    output_posts = os.path.join(config['output'], 'posts')
-    for posts_folder in config['sources']:
-        shutil.copytree(
-                posts_folder,
-                output_posts,
-                dirs_exist_ok=True)
+# Shared state of a post rendering process, see init_post_worker()
+_post_worker = {}
+
+
+def init_post_worker(config, templates, profile=False):
+    """Store the state shared by all posts rendered in this process."""
+    _post_worker['config'] = config
+    _post_worker['templates'] = templates
+    _post_worker['profile'] = profile
+
+
+def render_post(filepath):
+    """Render one post.
+
+    Return (slug, search terms, page hash, bytes saved by minifying, error
+    message, profile record). The rest of the metadata is not kept, the
+    listings read it from the metadata index.
+    """
+    start = get_counters() if _post_worker['profile'] else None
+    try:
+        meta, digest, saved = generate_post_html(
+            _post_worker['config'], _post_worker['templates'], filepath)
+    except Exception as e:
+        return None, None, None, 0, f'{filepath}: {e}', None
+    record = post_record(filepath, start) if start is not None else None
+    return meta['slug'], meta.get('terms'), digest, saved, None, record
+
 
-    dct_html = OrderedDict()
+def generate_post_html(config, templates, filepath):
+    """Write a post to output folder as HTML.
 
-    glob_path = os.path.join(output_posts, '**/*')
-    for filepath in glob.glob(glob_path, recursive=True):
-        if not filepath.endswith(MARKDOWN_EXTENSIONS):
+    Return (meta, page hash, bytes saved by minifying).
+    """
+    html, meta = markdown_to_html(
+        filepath, renderer=get_markdown_renderer(config))
+
+    # Update canonical link, slug provides root-relative URL
+    meta['slug'] = post_slug(filepath)
+    if get_search(config):
+        meta['terms'] = post_terms(meta, html)
+    if templates['images']:
+        html = rewrite_img_tags(
+            html, '/' + meta['slug'], templates['images'], BODY_IMAGE_SIZES)
+    if templates['dimensions']:
+        html = add_image_dimensions(
+            html, '/' + meta['slug'], templates['dimensions'])
+    html = rewrite_asset_urls(
+        html, '/' + meta['slug'], templates['fingerprints'])
+    if 'canonical' not in meta:
+        meta['canonical'] = config['base_url'] + '/' + meta['slug']
+
+    tag_property = ''
+    if 'tags' in meta:
+        list_tags = meta['tags'].split(',')
+        tag_property = ''.join(
+            render_template(templates['tag_property'],
+                            {'tag': escape(tag.strip())})
+            for tag in list_tags)
+
+    page_title = escape(meta["title"] + config['page_title_postfix'])
+    canonical = escape(meta['canonical'])
+    property_html = render_template(templates['property'], {
+        'base_url': escape(config['base_url']),
+        'page_title': page_title,
+        'canonical': canonical,
+        'title': escape(meta["title"]),
+        'category': escape(meta["category"]),
+        'TAGS': tag_property,
+        })
+
+    # Navigation bar with category highlighted
+    navbars = templates['navbars']
+    navbar_html = navbars.get(meta['category'], navbars[None])
+
+    html = render_template(templates['page'], {
+        'content': html,
+        'property': property_html,
+        'page_title': page_title,
+        'canonical': canonical,
+        'nav_line_items': navbar_html,
+        })
+
+    # Write HTML to file
+    outfile = post_outfile(config['output'], meta['slug'])
+    os.makedirs(os.path.dirname(outfile), exist_ok=True)
+    minifier = get_minifier(config, outfile)
+    saved = write_output(outfile, html, minifier)
+    meta['outfile'] = outfile
+    # meta['html'] = html  # debug only
+    meta['page'] = False
+
+    return meta, output_digest(hash_text(html), minifier), saved
+
+
+def generate_posts(config, templates, manifest, list_markdown, jobs=1):
+    """Write posts to output folder as HTML."""
+    previous = manifest['previous']
+    site_unchanged = manifest['current']['site'] == previous['site']
+
+    # Reuse the previous build of unchanged posts
+    dct_digest = {}
+    list_render = []
+    images_by_folder = group_images_by_folder(templates['images'])
+    fingerprints_by_folder = group_images_by_folder(templates['fingerprints'])
+    dimensions_by_folder = group_images_by_folder(templates['dimensions'])
+    for filepath in list_markdown:
+        key = os.path.abspath(filepath)
+        digest = hash_file(filepath, manifest)
+
+        # Post also depends on the resized copies of its images
+        list_urls = images_by_folder.get('/' + post_slug(filepath))
+        if list_urls:
+            digest = hash_text(digest + repr(
+                [templates['images'][url] for url in list_urls]))
+
+        # and on the content-hashed names of its files
+        list_urls = fingerprints_by_folder.get('/' + post_slug(filepath))
+        if list_urls:
+            digest = hash_text(digest + repr(
+                [templates['fingerprints'][url] for url in list_urls]))
+
+        # and on the sizes of its images
+        list_urls = dimensions_by_folder.get('/' + post_slug(filepath))
+        if list_urls:
+            digest = hash_text(digest + repr(
+                [(templates['dimensions'][url]['width'],
+                  templates['dimensions'][url]['height'])
+                 for url in list_urls]))
+        dct_digest[filepath] = digest
+
+        if site_unchanged and previous['posts'].get(key) == digest:
+            relpath = os.path.relpath(
+                post_outfile(config['output'], post_slug(filepath)),
+                config['output'])
+            page_digest = previous['pages'].get(relpath)
+            if page_digest and is_unchanged(config['output'], relpath,
+                                            page_digest, manifest, 'pages'):
+                manifest['current']['pages'][relpath] = page_digest
+                manifest['current']['posts'][key] = digest
+                manifest['stats']['reused'] += 1
+                continue
+        list_render.append(filepath)
+
+    # Render remaining posts, in worker processes if requested
+    profile = manifest.get('profile')
+    worker_args = (config, templates, profile is not None)
+    pooled = jobs > 1 and len(list_render) > 1
+    if not pooled:
+        init_post_worker(*worker_args)
+        results = list(map(render_post, list_render))
+    else:
+        chunksize = max(1, len(list_render) // (jobs * 4))
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=init_post_worker,
+                                 initargs=worker_args) as executor:
+            results = list(executor.map(
+                render_post, list_render, chunksize=chunksize))
+
+    add_post_records(profile, [r[5] for r in results], pooled)
+
+    list_errors = []
+    for filepath, (slug, terms, page_digest, saved, error, _) in zip(
+            list_render, results):
+        if error is not None:
+            list_errors.append(error)
             continue
+        manifest['stats']['minified'] += saved
+        key = os.path.abspath(filepath)
+        if terms is not None:
+            manifest['terms'][key] = terms
+        relpath = os.path.relpath(post_outfile(config['output'], slug),
+                                  config['output'])
+        manifest['current']['pages'][relpath] = page_digest
+        manifest['current']['posts'][key] = dct_digest[filepath]
+        manifest['stats']['rendered'] += 1
+
+    if list_errors:
+        for error in list_errors:
+            print(f'ERROR: {error}')
+        print(f'ERROR: {len(list_errors)} post(s) failed')
+        sys.exit(1)
 
-        # Generate html and update fields
-        html, meta = markdown_to_html(filepath)
-        os.remove(filepath)  # Delete post .md file
-        html = base_html.replace('{{content}}', html)
-        html = html.replace('{{property}}', PROPERTY)
-        s = meta["title"] + config['page_title_postfix']
-        html = html.replace('{{page_title}}', s)
 
-        # Update canonical link, slug provides root-relative URL
-        post_folder = os.path.split(filepath)[0]
-        post_folder = os.path.split(post_folder)[1]
-        meta['slug'] = 'posts/' + post_folder + '/'
-        if 'canonical' not in meta:
-            meta['canonical'] = config['base_url'] + '/' + meta['slug']
-        html = html.replace('{{canonical}}', meta['canonical'])
-
-        # Generate navigation bar with category highlighted
-        navbar_html = generate_navbar_html(
-            cat2slug, active_category=meta['category'])
-        html = html.replace('{{nav_line_items}}', navbar_html)
-
-        # Add remaining property info
-        html = html.replace('{{base_url}}', config['base_url'])
-        html = html.replace('{{title}}', meta["title"])
-        html = html.replace('{{category}}', meta["category"])
-        
-        tag_property = ''
-        if 'tags' in meta:
-            list_tags = meta['tags'].split(',')
-            for tag in list_tags:
-                s = '  <meta property="article:tag" content="{{tag}}">\n'
-                tag_property += s.replace('{{tag}}', tag.strip())
-
-        html = html.replace('{{TAGS}}', tag_property)
-            
-
-        # Write HTML to file
-        dst_folder = os.path.join(config['output'], meta['slug'].strip('/'))
-        outfile = os.path.join(dst_folder, 'index.html')
-        if not os.path.isdir(dst_folder):
-            os.mkdir(dst_folder)
-
-        with open(outfile, 'wt', encoding='utf-8') as f:
-            f.write(html)
-        meta['outfile'] = outfile
-        # meta['html'] = html  # debug only
-        meta['page'] = False
-        dct_html[meta['slug']] = meta
-
-    return dct_html
-
-
-def generate_category_pages(config, base_html, dct_html, cat2slug):
-    """Generate html pages for each category."""
-    # Prepare html content (list of posts) for each category
-    content = OrderedDict()
-    for category in cat2slug:
-        content[category] = f'<h2>{category.title()}</h2>\n'
-
-    # Find posts for current category
-    for slug, meta in dct_html.items():
-        s = POST_LINK
-        s = s.replace('[HREF]', '/' + meta['slug'])
-        s = s.replace('[TITLE]', meta['title'])
-        if 'summary' in meta:
-            s = s.replace('[SUMMARY]', meta['summary'])
-        else:
-            s = s.replace('[SUMMARY]', '')
+def get_posts_per_page(config):
+    """Return the maximum number of posts per category page, or None."""
+    if 'posts_per_page' not in config:
+        return None
+    try:
+        posts_per_page = int(config['posts_per_page'])
+    except (TypeError, ValueError):
+        posts_per_page = 0
+    if posts_per_page <= 0:
+        print('ERROR: posts_per_page must be a positive integer')
+        sys.exit(1)
+    return posts_per_page
 
-        if 'image' in meta:
-            s = s.replace('[IMAGE]', '/' + meta['slug'] + meta['image'])
-        else:
-            s = s.replace('[IMAGE]', '')
 
-        category = None
-        if 'category' in meta:
-            category = meta['category']
+def get_sort_order(config):
+    """Return (metadata key, descending) for sorting category pages."""
+    sort_order = config.get('sort_order', 'ascending')
+    if sort_order not in ('ascending', 'descending'):
+        print('ERROR: sort_order must be "ascending" or "descending"')
+        sys.exit(1)
+    return config.get('sort_posts_by'), sort_order == 'descending'
 
-        if category in content:
-            content[category] += s
-        else:
-            content['Other'] += s
 
-    # Create HTML content for each page
-    for category, slug in cat2slug.items():
-        # Generate navigation bar with category highlighted
-        navbar_html = generate_navbar_html(cat2slug, active_category=category)
-        html = base_html.replace('{{nav_line_items}}', navbar_html)
+def sort_posts(config, dct_meta):
+    """Return post records in the listing order of category pages."""
+    list_meta = list(dct_meta.values())
+    key, descending = get_sort_order(config)
+    if key is None:
+        if descending:
+            list_meta.reverse()
+        return list_meta
 
-        # Update content with list of posts
-        html = html.replace('{{content}}', content[category])
+    # Stable sort, posts without the key stay in source order at the end
+    with_key = [meta for meta in list_meta if meta.sort_value is not None]
+    without_key = [meta for meta in list_meta if meta.sort_value is None]
+    with_key.sort(key=lambda meta: meta.sort_value, reverse=descending)
+    return with_key + without_key
 
-        s = f'{meta["title"]}' + config['page_title_postfix']
-        html = html.replace('{{page_title}}', s)
 
-        # Update canonical link, slug provides root-relative URL
-        html = html.replace('{{canonical}}', slug)
+def category_page_slug(slug, page):
+    """Return root-relative URL of a page of a category."""
+    if page == 1:
+        return slug
+    return f'{slug}page/{page}/'
 
-        html = html.replace('{{property}}', '')
 
-        # Write to output HTML files
-        filepath = os.path.join(config['output'], slug, 'index.html')
-        with open(filepath, 'wt', encoding='utf-8') as f:
-            f.write(html)
+def render_post_card(templates, meta, placeholder=None):
+    """Return the HTML of the link to a post on category pages.
 
+    placeholder is passed on to add_image_dimensions().
+    """
+    image = ''
+    if 'image' in meta:
+        image = escape('/' + meta['slug'] + meta['image'])
+
+    s = render_template(templates['post_link'], {
+        'HREF': escape('/' + meta['slug']),
+        'TITLE': escape(meta['title']),
+        'SUMMARY': escape(meta.get('summary', '')),
+        'IMAGE': image,
+        })
+    if templates['images']:
+        s = rewrite_img_tags(
+            s, '/', templates['images'], CARD_IMAGE_SIZES)
+    if templates['dimensions']:
+        s = add_image_dimensions(s, '/', templates['dimensions'], placeholder)
+    return rewrite_asset_urls(s, '/', templates['fingerprints'])
+
+
+def open_category_page(config, templates, category, slug, page, n_pages,
+                       manifest):
+    """Start writing a page of a category.
+
+    Return the page writer with the text before the post links written,
+    and the text after them.
+    """
+    page_slug = category_page_slug(slug, page)
+    page_title = category
+    if page > 1:
+        page_title += f' - Page {page}'
+
+    # Links to previous and next pages
+    links = {'PREV': '', 'NEXT': '', 'PAGE': str(page)}
+    property_html = ''
+    for k, rel, label, n in (('PREV', 'prev', '&laquo; Previous', page - 1),
+                             ('NEXT', 'next', 'Next &raquo;', page + 1)):
+        if 1 <= n <= n_pages:
+            href = escape('/' + category_page_slug(slug, n))
+            links[k] = f'<a href="{href}" rel="{rel}">{label}</a>'
+            property_html += f'<link rel="{rel}" href="{href}">\n'
+
+    values = {
+        'page_title': escape(page_title + config['page_title_postfix']),
+        # Update canonical link, slug provides root-relative URL
+        'canonical': escape(config['base_url'] + '/' + page_slug),
+        'property': property_html.strip(),
+        'nav_line_items': templates['navbars'][category],
+        }
+    before, after = split_template(templates['page'], 'content')
+    tail = render_template(after, values)
+    if n_pages > 1:
+        tail = render_template(templates['page_links'], links) + tail
+
+    filepath = os.path.join(config['output'], page_slug, 'index.html')
+    writer = PageWriter(config, filepath, manifest)
+    writer.write(render_template(before, values))
+    writer.write(f'<h2>{escape(category.title())}</h2>\n')
+    return writer, tail
+
+
+def generate_category_pages(config, templates, dct_meta, cat2slug, manifest):
+    """Generate html pages for each category, return their post slugs.
+
+    Post links are written to the open page of their category as the
+    sorted posts are read, so pages are never held in memory.
+    """
+    list_meta = sort_posts(config, dct_meta)
+
+    def post_category(meta):
+        category = meta.get('category')
+        return category if category in cat2slug else 'Other'
+
+    # Number of pages of each category, a category without posts has one
+    posts_per_page = get_posts_per_page(config)
+    dct_counts = dict.fromkeys(cat2slug, 0)
+    for meta in list_meta:
+        dct_counts[post_category(meta)] += 1
+    dct_pages = OrderedDict()
+    dct_n_pages = {}
+    for category, slug in cat2slug.items():
+        n_pages = 1
+        if posts_per_page is not None and dct_counts[category]:
+            n_pages = -(-dct_counts[category] // posts_per_page)
+        dct_n_pages[category] = n_pages
+        for page in range(1, n_pages + 1):
+            dct_pages[category_page_slug(slug, page)] = []
+
+    # Posts in view when a page is opened get image placeholders
+    n_placeholders = get_image_placeholders(config)
+
+    def placeholder(entry):
+        return image_placeholder(config, manifest, entry)
+
+    # Open page of each category: [page, writer, text after post links]
+    dct_open = {}
+
+    def close_page(category):
+        _, writer, tail = dct_open.pop(category)
+        writer.write(tail)
+        writer.close()
+
+    def open_page(category, page):
+        writer, tail = open_category_page(
+            config, templates, category, cat2slug[category], page,
+            dct_n_pages[category], manifest)
+        dct_open[category] = [page, writer, tail]
+
+    dct_seen = dict.fromkeys(cat2slug, 0)
+    for meta in list_meta:
+        category = post_category(meta)
+        page, index = 1, dct_seen[category]
+        if posts_per_page is not None:
+            page, index = divmod(index, posts_per_page)
+            page += 1
+        dct_seen[category] += 1
+        if category in dct_open and dct_open[category][0] != page:
+            close_page(category)
+        if category not in dct_open:
+            open_page(category, page)
+        card = render_post_card(
+            templates, meta,
+            placeholder if index < n_placeholders else None)
+        dct_open[category][1].write(card)
+        page_slug = category_page_slug(cat2slug[category], page)
+        dct_pages[page_slug].append(meta['slug'])
 
-def generate_robots_txt(config):
+    for category in cat2slug:
+        if not dct_seen[category]:
+            open_page(category, 1)
+        close_page(category)
+
+    return dct_pages
+
+
+def generate_sitemap_and_feed(config, dct_meta, dct_pages, manifest):
+    """Generate sitemap and Atom feed from the post metadata."""
+    for filename, txt in sitemap_files(config, dct_meta, dct_pages).items():
+        write_page(config, os.path.join(config['output'], filename), txt,
+                   manifest)
+
+    txt = feed_xml(config, dct_meta)
+    if txt is not None:
+        write_page(config, os.path.join(config['output'], FEED_FILE), txt,
+                   manifest)
+
+
+def generate_search_index(config, templates, dct_meta, manifest):
+    """Generate the search page and the index of the posts."""
+    if not get_search(config):
+        return
+
+    html = render_template(templates['page'], {
+        'content': SEARCH_PAGE,
+        'page_title': escape('Search' + config['page_title_postfix']),
+        'canonical': escape(config['base_url'] + '/' + SEARCH_FOLDER + '/'),
+        'property': '',
+        'nav_line_items': templates['navbars'][None],
+        })
+    filepath = os.path.join(config['output'], SEARCH_FOLDER, 'index.html')
+    write_page(config, filepath, html, manifest)
+
+    script = read_package_data_file(DATA_JS_SEARCH)
+    filepath = os.path.join(config['output'], SEARCH_SCRIPT)
+    write_page(config, filepath, script, manifest)
+
+    # The index only changes with the posts
+    digest = index_digest(dct_meta, manifest)
+    manifest['current']['search'] = digest
+    if reuse_index(config, digest, manifest):
+        return
+    list_terms = collect_terms(config, dct_meta, manifest)
+    for relpath, txt in index_files(dct_meta, list_terms).items():
+        write_page(config, os.path.join(config['output'], relpath), txt,
+                   manifest)
+
+
+def generate_cache_manifest(config, manifest):
+    """Write the cache manifest if outputs are fingerprinted."""
+    if not get_fingerprint(config):
+        return
+    filepath = os.path.join(config['output'], CACHE_MANIFEST)
+    write_page(config, filepath, cache_manifest_text(manifest), manifest)
+
+
+def generate_robots_txt(config, manifest):
     """Create an empty robots.txt file."""
     filepath = os.path.join(config['output'], 'robots.txt')
     s = ROBOTS_TXT.replace('{{base_url}}', config['base_url'])
-    with open(filepath, 'wt') as f:
-        f.write(s)
+    write_page(config, filepath, s, manifest)
+
+
+def build_site(config, args):
+    """Generate the site in the output folder, return the build stats."""
+    profile = start_profile(args)
+
+    # Staged builds write a new generation, the served one is untouched
+    live_output = config['output']
+    if args.staged:
+        with profile_stage(profile, 'snapshot'):
+            config['output'] = start_generation(live_output)
+
+    # Regenerate output folder. A full staged build keeps the snapshot, for
+    # its cache folder and the outputs not written again, and removes the
+    # outputs of its manifest that are no longer generated at the end.
+    prune = args.incremental or (args.staged and not args.preserve_output)
+    with profile_stage(profile, 'clean_output'):
+        if not args.preserve_output and not args.incremental and \
+                (not args.staged or
+                 not load_manifest(config['output'])['pages']):
+            remove_directory_contents(config['output'])
+    with profile_stage(profile, 'load_manifest'):
+        manifest = start_build(config['output'], args.incremental,
+                               prune=prune)
+        manifest['profile'] = profile
 
+    # Prepare html templates
+    with profile_stage(profile, 'base_html', manifest):
+        base_html, license_html, style_css = read_package_data_files()
+        base_html = generate_base_html(
+            config, base_html, license_html, manifest)
+        generate_style_css(config, style_css, manifest)
+        base_html = rewrite_asset_urls(
+            base_html, '/', fingerprint_urls(manifest))
+
+    with profile_stage(profile, 'assets', manifest):
+        list_markdown = sync_site_assets(config, manifest)
+    with profile_stage(profile, 'image_dimensions', manifest):
+        dct_dimensions = probe_images(config, manifest)
+    with profile_stage(profile, 'image_variants', manifest):
+        dct_images = generate_image_variants(config, manifest, jobs=args.jobs)
+    dct_fingerprints = fingerprint_urls(manifest)
+
+    # Every page embeds the config (e.g. menu), base template and names of
+    # site files, category pages are regenerated anyway
+    site_config = {k: v for k, v in config.items()
+                   if k not in LISTING_KEYS + OUTPUT_KEYS}
+    site_fingerprints = sorted((url, hashed) for url, hashed
+                               in dct_fingerprints.items()
+                               if not url.startswith('/posts/'))
+    manifest['current']['site'] = hash_text(
+        json.dumps(site_config, sort_keys=True) + base_html +
+        repr(site_fingerprints))
+
+    with profile_stage(profile, 'mainpage', manifest):
+        cat2slug = generate_menu_folders(config)
+        templates = generate_page_templates(
+            base_html, cat2slug, dct_images, dct_fingerprints,
+            dct_dimensions)
+        generate_mainpage(config, templates, manifest)
+    with profile_stage(profile, 'posts', manifest):
+        generate_posts(config, templates, manifest, list_markdown,
+                       jobs=args.jobs)
+
+    # Listings only need the post metadata
+    with profile_stage(profile, 'metadata_index', manifest):
+        dct_meta, _ = update_metadata_index(config, list_markdown,
+                                            records=True)
+    with profile_stage(profile, 'category_pages', manifest):
+        dct_pages = generate_category_pages(
+            config, templates, dct_meta, cat2slug, manifest)
+    with profile_stage(profile, 'sitemap_feed', manifest):
+        generate_sitemap_and_feed(config, dct_meta, dct_pages, manifest)
+    with profile_stage(profile, 'search_index', manifest):
+        generate_search_index(config, templates, dct_meta, manifest)
+
+    with profile_stage(profile, 'robots_txt', manifest):
+        generate_robots_txt(config, manifest)
+    with profile_stage(profile, 'cache_manifest', manifest):
+        generate_cache_manifest(config, manifest)
+
+    with profile_stage(profile, 'compress', manifest):
+        compress_outputs(config, manifest, jobs=args.jobs)
+
+    # Weigh the pages as they are served
+    size_report = None
+    if args.size_report or args.strict_budgets:
+        with profile_stage(profile, 'size_report', manifest):
+            size_report = make_size_report(config, dct_pages, cat2slug,
+                                           args.size_top)
+    over_budget = args.strict_budgets and is_over_budget(size_report)
+
+    # A staged build over budget is never served
+    if over_budget and args.staged:
+        finish_size_report(size_report, args)
+        print(f'ERROR: Build over budget, {live_output} still links to the '
+              'previous build')
+        sys.exit(1)
 
-def main():
-    config, preserve_output = get_user_inputs()
-
-    # Regenerate output folder
-    if not preserve_output:
-        remove_directory_contents(config['output'])
+    with profile_stage(profile, 'save_manifest', manifest):
+        finish_build(config['output'], manifest)
+    if args.staged:
+        with profile_stage(profile, 'switch_generation'):
+            finish_generation(live_output, config['output'],
+                              args.generations)
+        config['output'] = live_output
+    finish_profile(profile, manifest)
+
+    if args.incremental:
+        stats = manifest['stats']
+        print(f"Posts rendered: {stats['rendered']}, "
+              f"unchanged: {stats['reused']}, "
+              f"files copied: {stats['copied']}, "
+              f"linked: {stats['linked']}, "
+              f"compressed: {stats['compressed']}, "
+              f"removed: {stats['removed']}")
+    if get_minify(config):
+        print(f"Minifying saved {manifest['stats']['minified']} bytes "
+              f"in the HTML and CSS files written")
+    print(f'Site generated at: {config["output"]}')
+    if size_report is not None:
+        finish_size_report(size_report, args)
+        if over_budget:
+            sys.exit(1)
+    return manifest['stats']
 
-    # Prepare html templates
-    base_html, license_html, style_css = read_package_data_files()
-    base_html = generate_base_html(config, base_html, license_html)
-    generate_style_css(config, style_css)
 
-    cat2slug = generate_menu_folders(config)
-    generate_mainpage(config, base_html, cat2slug)
-    dct_html = generate_posts(config, base_html, cat2slug)
+def build_main():
+    """Build the site, run by artblog.cli.main() if no command is given."""
+    # Before parsing arguments, which may import deferred dependencies
+    if any(arg in STARTUP_OPTIONS for arg in sys.argv):
+        print_startup_report(get_startup())
 
-    generate_category_pages(config, base_html, dct_html, cat2slug)
+    config, args = get_user_inputs()
+    build_site(config, args)
 
-    generate_robots_txt(config)
 
-    print(f'Site generated at: {config["output"]}')
+def main():
+    # Commands are dispatched in one place, e.g. "artblog serve config.yml"
+    cli_main()
 
 
 if __name__ == "__main__":
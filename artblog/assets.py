@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Copy post images and other assets to the output folder.
+
+Files are only copied when the output is missing or differs from the source.
+Where the platform allows it, the copy is done without moving the data
+through Python (reflink, copy_file_range, sendfile), or replaced by a
+hardlink. Identical files are stored once in the output.
+"""
+# Standard libraries
+import errno
+import os
+import shutil
+import sys
+
+# Package modules
+from artblog.fingerprint import fingerprint_output
+from artblog.manifest import hash_file, is_unchanged
+
+# Values of the "asset_copy" config setting
+ASSET_COPY_MODES = ('auto', 'copy', 'hardlink')
+
+# Linux ioctl to share the data blocks of two files (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# Errors meaning a fast copy method is not possible for these files
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM,
+                   errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+
+# Device pairs (source, output) known not to support a fast copy method
+_no_reflink = set()
+_no_copy_file_range = set()
+
+
+def get_asset_copy_mode(config):
+    """Return the asset copy mode from the config."""
+    mode = config.get('asset_copy', 'auto')
+    if mode not in ASSET_COPY_MODES:
+        print(f'ERROR: asset_copy must be one of {ASSET_COPY_MODES}')
+        sys.exit(1)
+    return mode
+
+
+def same_file_stat(srcfile, dstfile):
+    """Return True if the output has the source's size and mtime."""
+    try:
+        src = os.stat(srcfile)
+        dst = os.stat(dstfile)
+    except OSError:
+        return False
+    return src.st_size == dst.st_size and src.st_mtime_ns == dst.st_mtime_ns
+
+
+def reflink(srcfile, dstfile):
+    """Clone file data without copying it, return True if it worked."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    devices = (os.stat(srcfile).st_dev,
+               os.stat(os.path.dirname(dstfile)).st_dev)
+    if devices in _no_reflink:
+        return False
+
+    with open(srcfile, 'rb') as fsrc, open(dstfile, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS:
+                raise
+            _no_reflink.add(devices)
+            return False
+    return True
+
+
+def copy_file_range(srcfile, dstfile):
+    """Copy file data in the kernel, return True if it worked."""
+    if not hasattr(os, 'copy_file_range'):
+        return False
+
+    devices = (os.stat(srcfile).st_dev,
+               os.stat(os.path.dirname(dstfile)).st_dev)
+    if devices in _no_copy_file_range:
+        return False
+
+    with open(srcfile, 'rb') as fsrc, open(dstfile, 'wb') as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            try:
+                n = os.copy_file_range(
+                    fsrc.fileno(), fdst.fileno(), remaining)
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRNOS:
+                    raise
+                _no_copy_file_range.add(devices)
+                return False
+            if n == 0:
+                break
+            remaining -= n
+    return True
+
+
+def copy_file(srcfile, dstfile, mode='auto'):
+    """Copy file with the fastest available method, return method name.
+
+    The output is first created under a temporary name and then renamed,
+    so an output hardlinked to another output is never modified in place.
+    """
+    tmpfile = dstfile + '.artblog-tmp'
+    if os.path.lexists(tmpfile):
+        os.remove(tmpfile)
+
+    method = None
+    if mode == 'hardlink':
+        try:
+            os.link(srcfile, tmpfile)
+            method = 'hardlink'
+        except OSError:
+            pass
+
+    if method is None:
+        if mode != 'copy' and reflink(srcfile, tmpfile):
+            method = 'reflink'
+        elif mode != 'copy' and copy_file_range(srcfile, tmpfile):
+            method = 'copy_file_range'
+        else:
+            # Uses sendfile() on Linux and fcopyfile() on macOS
+            shutil.copyfile(srcfile, tmpfile)
+            method = 'copy'
+        shutil.copystat(srcfile, tmpfile)
+
+    os.replace(tmpfile, dstfile)
+    return method
+
+
+def sync_file(config, srcfile, dstfile, manifest):
+    """Copy a file to the output folder if its content changed."""
+    relpath = os.path.relpath(dstfile, config['output'])
+    digest = hash_file(srcfile, manifest)
+    relpath = fingerprint_output(config, relpath, digest, manifest)
+    dstfile = os.path.join(config['output'], relpath)
+    manifest['current']['assets'][relpath] = digest
+    if is_unchanged(config['output'], relpath, digest, manifest, 'assets') \
+            or same_file_stat(srcfile, dstfile):
+        manifest['stored'].setdefault(digest, dstfile)
+        return
+
+    os.makedirs(os.path.dirname(dstfile), exist_ok=True)
+    mode = get_asset_copy_mode(config)
+
+    # Store identical files once by linking to the first output
+    stored = manifest['stored'].get(digest)
+    if mode != 'copy' and stored is not None and stored != dstfile:
+        if os.path.exists(dstfile) and os.path.samefile(stored, dstfile):
+            return
+        tmpfile = dstfile + '.artblog-tmp'
+        try:
+            if os.path.lexists(tmpfile):
+                os.remove(tmpfile)
+            os.link(stored, tmpfile)
+            os.replace(tmpfile, dstfile)
+            manifest['stats']['linked'] += 1
+            return
+        except OSError:
+            pass
+
+    method = copy_file(srcfile, dstfile, mode)
+    manifest['stored'][digest] = dstfile
+    if method == 'hardlink':
+        manifest['stats']['linked'] += 1
+    else:
+        manifest['stats']['copied'] += 1
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Batch builds of several sites in one run.
+
+Usage: artblog batch config1.yml config2.yml ... [build options]
+       artblog batch path/to/configs/ [build options]
+
+A folder stands for the .yml and .yaml files in it. The sites are built
+by a pool of worker processes (--sites N), started with the package
+templates already read. Sites with a source or main page folder in common
+are built one after the other by the same worker, which converts the
+markdown of the shared folders once for all of them. Resized images of
+all sites are cached in one folder (--image_cache), so an image used by
+several sites is only resized once.
+
+A site whose build fails doesn't stop the others. The output of every
+site is printed once it is built, followed by a summary of all sites.
+The exit status is 1 if any site failed.
+"""
+# Standard libraries
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+CONFIG_EXTENSIONS = ('.yml', '.yaml')
+
+
+def default_image_cache():
+    """Return the folder of resized images shared by the sites."""
+    folder = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(folder, 'artblog', 'images')
+
+
+def get_user_inputs(argv):
+    """Get user arguments of the batch command."""
+    from artblog.artblog import (CMDLINE_APP_NAME, add_build_options,
+                                 check_build_arguments)
+
+    parser = argparse.ArgumentParser(
+        prog='artblog batch',
+        description=f'{CMDLINE_APP_NAME} - build several sites in one run',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('configs', nargs='+', metavar='CONFIG',
+                        help='YAML configuration files, or folders of them')
+    parser.add_argument('--sites',
+                        type=int, default=0,
+                        help='number of sites built at the same time '
+                             '(0 uses all CPU cores)')
+    parser.add_argument('--image_cache',
+                        default=default_image_cache(),
+                        help='folder caching the resized images of the '
+                             'sites without "image_cache" in their config')
+    add_build_options(parser)
+    args = parser.parse_args(argv)
+
+    if args.profile is not None or args.cprofile is not None or \
+            args.size_report is not None:
+        parser.error('--profile, --cprofile and --size_report are for single '
+                     'site builds')
+    if args.sites < 0:
+        parser.error(f'invalid number of sites: {args.sites}')
+    if args.sites == 0:
+        args.sites = os.cpu_count() or 1
+    check_build_arguments(args)
+    return args
+
+
+def find_configs(list_paths):
+    """Return the config files given, with those in the folders given."""
+    list_configs = []
+    for path in list_paths:
+        if os.path.isdir(path):
+            list_configs += [os.path.join(path, name)
+                             for name in sorted(os.listdir(path))
+                             if name.lower().endswith(CONFIG_EXTENSIONS)]
+        else:
+            list_configs.append(path)
+    return list_configs
+
+
+def load_site(config_yml):
+    """Return (config or None, output of loading it)."""
+    from artblog.artblog import load_config
+
+    buffer = io.StringIO()
+    config = None
+    with contextlib.redirect_stdout(buffer):
+        if not os.path.isfile(config_yml):
+            print(f'ERROR: Configuration file not found: {config_yml}')
+        else:
+            try:
+                config = load_config(config_yml)
+            except SystemExit:
+                pass
+            except Exception as e:
+                print(f'ERROR: {e}')
+    return config, buffer.getvalue()
+
+
+def input_folders(config):
+    """Return the real paths of the input folders of a site."""
+    return {os.path.realpath(folder)
+            for folder in config['sources'] + [config['mainpage_folder']]}
+
+
+def group_sites(list_sites):
+    """Group the sites with input folders in common.
+
+    Return (list of groups of site indices, folders of several sites).
+    """
+    dct_sites = {}
+    for i, (_, config) in enumerate(list_sites):
+        for folder in input_folders(config):
+            dct_sites.setdefault(folder, []).append(i)
+
+    # Sites linked by a shared folder, directly or through other sites
+    group_of = list(range(len(list_sites)))
+
+    def find(i):
+        while group_of[i] != i:
+            group_of[i] = group_of[group_of[i]]
+            i = group_of[i]
+        return i
+
+    shared = []
+    for folder, list_indices in dct_sites.items():
+        if len(list_indices) > 1:
+            shared.append(folder)
+            for i in list_indices[1:]:
+                group_of[find(i)] = find(list_indices[0])
+
+    dct_groups = {}
+    for i in range(len(list_sites)):
+        dct_groups.setdefault(find(i), []).append(i)
+    return list(dct_groups.values()), sorted(shared)
+
+
+def build_one(config_yml, config, args):
+    """Build a site, return (status, seconds, output, stats)."""
+    from artblog.artblog import build_site
+
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    status, stats = 0, None
+    with contextlib.redirect_stdout(buffer), \
+            contextlib.redirect_stderr(buffer):
+        try:
+            args.config_yml = config_yml
+            stats = build_site(config, args)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                status = e.code or 0
+            else:
+                print(e.code)
+                status = 1
+        except Exception:
+            import traceback
+            traceback.print_exc(file=sys.stdout)
+            status = 1
+    return status, time.perf_counter() - start, buffer.getvalue(), stats
+
+
+def build_group(task):
+    """Build a group of sites in turn, return their results."""
+    from artblog.artblog import share_markdown
+
+    list_sites, args, shared = task
+    share_markdown(shared)
+    try:
+        return [(config_yml,) + build_one(config_yml, config, args)
+                for config_yml, config in list_sites]
+    finally:
+        share_markdown(())
+
+
+def print_result(result):
+    """Print the output of a site build."""
+    config_yml, status, seconds, output, _ = result
+    print(f'=== {config_yml} ({"OK" if status == 0 else "FAILED"}, '
+          f'{seconds:.2f} s)')
+    sys.stdout.write(output)
+    sys.stdout.flush()
+
+
+def print_summary(list_results):
+    """Print the status of every site, return the number of failures."""
+    failed = 0
+    print(f'Summary of {len(list_results)} site(s):')
+    for config_yml, status, seconds, _, stats in list_results:
+        if status != 0:
+            failed += 1
+        details = ''
+        if stats is not None:
+            details = (f"posts rendered: {stats['rendered']}, "
+                       f"unchanged: {stats['reused']}  ")
+        print(f'  {"OK" if status == 0 else "FAILED":6}  {seconds:7.2f} s  '
+              f'{details}{config_yml}')
+    print(f'{len(list_results) - failed} site(s) built, {failed} failed')
+    return failed
+
+
+def main(argv):
+    from artblog.artblog import (DATA_JS_SEARCH, read_package_data_file,
+                                 read_package_data_files)
+
+    args = get_user_inputs(argv)
+    list_configs = find_configs(args.configs)
+    if not list_configs:
+        print('ERROR: No configuration files found')
+        sys.exit(1)
+
+    # Sites that can't be built are reported with the others
+    list_results = []
+    list_sites = []
+    outputs = set()
+    for config_yml in list_configs:
+        config, output = load_site(config_yml)
+        if config is not None:
+            output_folder = os.path.realpath(config['output'])
+            if output_folder in outputs:
+                config = None
+                output += f'ERROR: Output folder of another site: ' \
+                          f'{config_yml}\n'
+            outputs.add(output_folder)
+        if config is None:
+            list_results.append((config_yml, 1, 0.0, output, None))
+            continue
+        if not config.get('image_cache'):
+            config['image_cache'] = args.image_cache
+        list_sites.append((config_yml, config))
+    for result in list_results:
+        print_result(result)
+
+    # Read once, forked workers start with them
+    read_package_data_files()
+    read_package_data_file(DATA_JS_SEARCH)
+
+    list_groups, shared = group_sites(list_sites)
+    tasks = [([list_sites[i] for i in list_indices], args, shared)
+             for list_indices in list_groups]
+    workers = min(args.sites, len(tasks))
+    if workers <= 1:
+        for task in tasks:
+            for result in build_group(task):
+                print_result(result)
+                list_results.append(result)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(build_group, task) for task in tasks]
+            for future in as_completed(futures):
+                for result in future.result():
+                    print_result(result)
+                    list_results.append(result)
+
+    # Summary in the order the sites were given
+    order = {config_yml: i for i, config_yml in enumerate(list_configs)}
+    list_results.sort(key=lambda result: order[result[0]])
+    if print_summary(list_results):
+        sys.exit(1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Build profile showing where the time of a build goes.
+
+With --profile, every stage of the build records its wall and CPU time,
+the bytes read and written, the files copied and the peak memory, and
+every rendered post its render time. The report is written as JSON. With
+--cprofile, the whole build also runs under cProfile and its stats are
+written for pstats or other viewers.
+
+Bytes read and written are counted by the operating system (Linux only)
+for the build process and the processes rendering posts.
+
+With --time_startup, the time taken to start the process and import the
+package, and to import the dependencies deferred until they are needed,
+is printed, to keep the startup of small rebuilds fast.
+"""
+# Standard libraries
+from contextlib import contextmanager
+from datetime import datetime
+import importlib
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_FILE = 'artblog-profile.json'
+REPORT_VERSION = 1
+
+# Dependencies imported when first needed, timed by --time_startup
+DEFERRED_IMPORTS = ('yaml', 'mistune')
+
+# Build stats reported per stage, see manifest.start_build()
+STAGE_STATS = {
+    'copied': 'files_copied',
+    'linked': 'files_linked',
+    'minified': 'minify_saved_bytes',
+    }
+
+
+def read_io_counters():
+    """Return (bytes read, bytes written) by this process, None if unknown."""
+    try:
+        with open('/proc/self/io', 'rt') as f:
+            counters = dict(line.split(':') for line in f)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def get_counters():
+    """Return (wall time, CPU time, bytes read, bytes written) so far."""
+    # Finished worker processes count in the children's CPU time
+    t = os.times()
+    io = read_io_counters() or (0, 0)
+    return (time.perf_counter(),
+            time.process_time() + t.children_user + t.children_system,
+            io[0], io[1])
+
+
+def reset_peak_rss():
+    """Reset the peak memory of this process if supported (Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'wt') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def get_peak_rss_mb(children=False):
+    """Return the peak memory in MB, since the last reset on Linux.
+
+    None if unknown, e.g. on Windows.
+    """
+    if not children:
+        try:
+            with open('/proc/self/status', 'rt') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    if resource is None:
+        return None
+    # In bytes on macOS and kB elsewhere
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def start_profile(args):
+    """Return the profile of a build, or None unless profiling."""
+    if not args.profile and not args.cprofile:
+        return None
+
+    profile = {
+        'args': args,
+        'start': get_counters(),
+        'stages': [],
+        'posts': [],
+        'worker_io': [0, 0],  # bytes read and written by other processes
+        'cprofile': None,
+        }
+    if args.cprofile:
+        import cProfile
+        profile['cprofile'] = cProfile.Profile()
+        profile['cprofile'].enable()
+    return profile
+
+
+@contextmanager
+def profile_stage(profile, name, manifest=None):
+    """Record the time, I/O, copies and peak memory of a build stage."""
+    if profile is None:
+        yield
+        return
+
+    stats = dict(manifest['stats']) if manifest is not None else {}
+    worker_io = list(profile['worker_io'])
+    reset_peak_rss()
+    start = get_counters()
+    yield
+    end = get_counters()
+
+    stage = {
+        'stage': name,
+        'wall_s': end[0] - start[0],
+        'cpu_s': end[1] - start[1],
+        'read_bytes': end[2] - start[2] +
+                      profile['worker_io'][0] - worker_io[0],
+        'written_bytes': end[3] - start[3] +
+                         profile['worker_io'][1] - worker_io[1],
+        'peak_rss_mb': get_peak_rss_mb(),
+        }
+    for k, name in STAGE_STATS.items():
+        stage[name] = \
+            manifest['stats'][k] - stats[k] if manifest is not None else 0
+    profile['stages'].append(stage)
+
+
+def post_record(filepath, start):
+    """Return the render time and I/O of a post since start counters."""
+    end = get_counters()
+    return {
+        'post': filepath,
+        'wall_s': end[0] - start[0],
+        'cpu_s': end[1] - start[1],
+        'read_bytes': end[2] - start[2],
+        'written_bytes': end[3] - start[3],
+        }
+
+
+def add_post_records(profile, records, pooled):
+    """Add render records of posts, rendered in other processes if pooled."""
+    if profile is None:
+        return
+    for record in records:
+        if record is None:
+            continue
+        profile['posts'].append(record)
+        if pooled:
+            profile['worker_io'][0] += record['read_bytes']
+            profile['worker_io'][1] += record['written_bytes']
+
+
+def max_peak_rss_mb(list_peaks):
+    """Return the largest known peak memory, None if none is known."""
+    list_peaks = [peak for peak in list_peaks if peak is not None]
+    return max(list_peaks) if list_peaks else None
+
+
+def make_report(profile, manifest):
+    """Return the JSON report of a profiled build."""
+    args = profile['args']
+    start = profile['start']
+    end = get_counters()
+    posts = sorted(profile['posts'], key=lambda r: r['wall_s'],
+                   reverse=True)
+    return {
+        'version': REPORT_VERSION,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'config': os.path.abspath(args.config_yml),
+        'incremental': args.incremental,
+        'jobs': args.jobs,
+        'io_counters': read_io_counters() is not None,
+        'total': {
+            'wall_s': end[0] - start[0],
+            'cpu_s': end[1] - start[1],
+            'read_bytes': end[2] - start[2] + profile['worker_io'][0],
+            'written_bytes': end[3] - start[3] + profile['worker_io'][1],
+            'files_copied': manifest['stats']['copied'],
+            'files_linked': manifest['stats']['linked'],
+            'minify_saved_bytes': manifest['stats']['minified'],
+            # Peak is reset before every stage
+            'peak_rss_mb': max_peak_rss_mb(
+                [get_peak_rss_mb()] +
+                [s['peak_rss_mb'] for s in profile['stages']]),
+            'peak_rss_children_mb': get_peak_rss_mb(children=True),
+            },
+        'stages': profile['stages'],
+        'posts': {
+            'rendered': len(posts),
+            'reused': manifest['stats']['reused'],
+            'render_s': sum(r['wall_s'] for r in posts),
+            'slowest': posts[:args.profile_top],
+            },
+        }
+
+
+def print_report(report):
+    """Print the stages of a profile report."""
+    print(f'{"stage":<18} {"wall s":>8} {"cpu s":>8} {"MB read":>8} '
+          f'{"MB written":>10} {"copied":>7} {"peak MB":>8}')
+    for s in report['stages'] + [dict(report['total'], stage='total')]:
+        peak = s['peak_rss_mb']
+        peak = '-' if peak is None else f'{peak:.0f}'
+        print(f"{s['stage']:<18} {s['wall_s']:>8.3f} {s['cpu_s']:>8.3f} "
+              f"{s['read_bytes'] / 1e6:>8.1f} "
+              f"{s['written_bytes'] / 1e6:>10.1f} "
+              f"{s['files_copied']:>7} {peak:>8}")
+
+
+def finish_profile(profile, manifest):
+    """Write the profile report and cProfile stats of a build."""
+    if profile is None:
+        return
+    args = profile['args']
+
+    if profile['cprofile'] is not None:
+        profile['cprofile'].disable()
+        profile['cprofile'].dump_stats(args.cprofile)
+        print(f'cProfile stats written to: {args.cprofile}')
+
+    if args.profile:
+        report = make_report(profile, manifest)
+        with open(args.profile, 'wt', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print_report(report)
+        print(f'Profile written to: {args.profile}')
+
+
+def process_age():
+    """Return the seconds since this process started, None if unknown."""
+    try:
+        with open('/proc/self/stat', 'rt') as f:
+            # Fields after the command name, starttime is the 22nd field
+            starttime = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'rt') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - starttime / os.sysconf('SC_CLK_TCK')
+
+
+def get_startup():
+    """Return (wall seconds since start or None, CPU seconds, modules)."""
+    return process_age(), time.process_time(), len(sys.modules)
+
+
+def print_startup_report(startup, deferred=True):
+    """Print the startup time, and the import time of deferred modules."""
+    wall, cpu, modules = startup
+    wall = 'unknown' if wall is None else f'{wall * 1000:.0f} ms'
+    print(f'Startup: {wall} since the process started, '
+          f'{cpu * 1000:.0f} ms CPU, {modules} modules imported')
+    if not deferred:
+        return
+    for name in DEFERRED_IMPORTS:
+        if name in sys.modules:
+            print(f'Import {name}: already imported')
+            continue
+        start = time.perf_counter()
+        importlib.import_module(name)
+        print(f'Import {name}: '
+              f'{(time.perf_counter() - start) * 1000:.1f} ms')
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Entry point of the artblog command.
+
+Commands other than building the site (e.g. "artblog serve config.yml")
+are run without importing the build modules, which import every feature
+of the build, so that e.g. "artblog daemon build" starts quickly.
+"""
+# Standard libraries
+import importlib
+import sys
+
+# Package modules
+from artblog.buildprofile import get_startup, print_startup_report
+
+COMMANDS = {
+    'batch': 'artblog.batch',
+    'daemon': 'artblog.daemon',
+    'deploy': 'artblog.deploy',
+    'index': 'artblog.metaindex',
+    'rollback': 'artblog.generations',
+    'serve': 'artblog.serve',
+    }
+
+STARTUP_OPTIONS = ('--time_startup', '--time-startup')
+
+
+def run_command(command, argv):
+    """Run a command of COMMANDS with its arguments."""
+    # Before parsing arguments, which may import deferred dependencies
+    if any(arg in STARTUP_OPTIONS for arg in argv):
+        print_startup_report(get_startup(), deferred=False)
+
+    module = importlib.import_module(COMMANDS[command])
+    module.main([arg for arg in argv if arg not in STARTUP_OPTIONS])
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command in COMMANDS:
+        run_command(command, sys.argv[2:])
+        return
+
+    from artblog.artblog import build_main
+    build_main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Precompressed copies of text outputs.
+
+When "precompress" is set in the config, a gzip (.gz) and/or brotli (.br)
+copy is written next to every HTML, CSS, XML and other text output, for web
+servers that serve such copies instead of compressing every response.
+Small files and files that don't get smaller are skipped. In incremental
+builds, only outputs whose content changed are compressed again. Brotli
+needs the optional brotli package.
+"""
+# Standard libraries
+import gzip
+import os
+import sys
+
+PRECOMPRESS_FORMATS = ('gzip', 'brotli')
+FILE_EXTENSION = {'gzip': '.gz', 'brotli': '.br'}
+
+# Outputs that are compressed
+TEXT_EXTENSIONS = ('.html', '.css', '.xml', '.txt', '.js', '.json', '.svg')
+
+# Smaller files gain little, and may get larger
+MIN_SIZE = 1024
+
+
+def get_precompress_formats(config):
+    """Return the formats of compressed copies, empty if disabled."""
+    if 'precompress' not in config:
+        return []
+    formats = config['precompress']
+    if isinstance(formats, str):
+        formats = [formats]
+    for fmt in formats:
+        if fmt not in PRECOMPRESS_FORMATS:
+            print(f'ERROR: Invalid precompress format: {fmt} '
+                  f'(use {", ".join(PRECOMPRESS_FORMATS)})')
+            sys.exit(1)
+    return [fmt for fmt in PRECOMPRESS_FORMATS if fmt in formats]
+
+
+def compress_data(data, fmt):
+    """Return data compressed at the highest level."""
+    if fmt == 'brotli':
+        import brotli
+        return brotli.compress(data, mode=brotli.MODE_TEXT)
+    # No timestamp in the header, same input gives the same output
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_file(task):
+    """Write compressed copies of a file, return (formats, error message)."""
+    filepath, formats = task
+    written = []
+    try:
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        st = os.stat(filepath)
+        for fmt in formats:
+            dstfile = filepath + FILE_EXTENSION[fmt]
+            compressed = compress_data(data, fmt)
+            if len(compressed) >= len(data):
+                if os.path.isfile(dstfile):
+                    os.remove(dstfile)
+                continue
+            tmpfile = dstfile + '.tmp'
+            with open(tmpfile, 'wb') as f:
+                f.write(compressed)
+            # Same modification time as the file it is a copy of
+            os.utime(tmpfile, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmpfile, dstfile)
+            written.append(fmt)
+    except Exception as e:
+        return None, f'{filepath}: {e}'
+    return written, None
+
+
+def compress_outputs(config, manifest, jobs=1):
+    """Write compressed copies of changed text outputs."""
+    formats = get_precompress_formats(config)
+    if not formats:
+        return
+    if 'brotli' in formats:
+        try:
+            import brotli
+        except ImportError:
+            print('WARN: Install brotli to create .br files (precompress)')
+            formats.remove('brotli')
+
+    output = config['output']
+    current = manifest['current']
+    previous = manifest['previous']
+
+    # Find outputs whose content or compressed copies changed
+    list_tasks = []
+    for section in ('pages', 'assets'):
+        for relpath, digest in sorted(current[section].items()):
+            if not relpath.lower().endswith(TEXT_EXTENSIONS):
+                continue
+            filepath = os.path.join(output, relpath)
+            if os.path.getsize(filepath) < MIN_SIZE:
+                continue
+
+            # Reuse copies of unchanged content made with the same formats
+            entry = previous['compressed'].get(relpath)
+            if manifest['incremental'] and entry is not None and \
+                    entry[:2] == [digest, formats] and \
+                    all(os.path.isfile(os.path.join(output, p))
+                        for p in entry[2]):
+                current['compressed'][relpath] = entry
+                continue
+            list_tasks.append((relpath, digest, (filepath, formats)))
+
+    # Compress files, in worker processes if requested
+    tasks = [t[2] for t in list_tasks]
+    if jobs == 1 or len(tasks) < 2:
+        results = list(map(compress_file, tasks))
+    else:
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(compress_file, tasks,
+                                        chunksize=chunksize))
+
+    for (relpath, digest, _), (written, error) in zip(list_tasks, results):
+        if error is not None:
+            print(f'WARN: Cannot compress {error}')
+            continue
+        compressed = [relpath + FILE_EXTENSION[fmt] for fmt in written]
+        current['compressed'][relpath] = [digest, formats, compressed]
+        manifest['stats']['compressed'] += 1
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Build daemon keeping a site warm between builds.
+
+Usage: artblog daemon start config.yml
+       artblog daemon build config.yml [build options, e.g. -i]
+       artblog daemon stop config.yml
+
+"start" runs a long-lived process serving builds of one site over a Unix
+socket. It keeps the imported modules, the config (reloaded when
+config.yml changes), the package templates and the last build manifest
+in memory, so a build only costs the work on the posts that changed.
+"build" sends a build request to it, prints the output of the build and
+exits with its status. The artblog command runs the client without
+importing the build modules or their dependencies (see artblog.cli), so
+it starts quickly.
+
+The socket is created in $XDG_RUNTIME_DIR (or /tmp), with a name derived
+from the path of config.yml, unless --socket is given. Requests and
+replies are JSON lines.
+"""
+# Standard libraries
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+
+ACTIONS = ('start', 'build', 'stop')
+
+
+def get_user_inputs(argv):
+    """Get user arguments of the daemon command.
+
+    Return the arguments and the build options to forward to the daemon.
+    """
+    parser = argparse.ArgumentParser(
+        prog='artblog daemon',
+        description='ArtBlog - build daemon keeping a site warm between '
+                    'builds',
+        epilog='other options of "build" are passed on to the daemon, see '
+               'artblog -h',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('action', choices=ACTIONS,
+                        help='start the daemon, request a build or stop it')
+    parser.add_argument('config_yml', help='YAML configuration file')
+    parser.add_argument('--socket',
+                        help='Unix socket of the daemon (default derived '
+                             'from the path of config.yml)')
+    args, build_argv = parser.parse_known_args(argv)
+    if build_argv and args.action != 'build':
+        parser.error('unrecognized arguments: ' + ' '.join(build_argv))
+    if args.socket is None:
+        args.socket = socket_path(args.config_yml)
+    return args, build_argv
+
+
+def socket_path(config_yml):
+    """Return the default socket of the daemon of a config file."""
+    folder = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    key = hashlib.sha256(os.path.abspath(config_yml).encode('utf-8'))
+    return os.path.join(folder, f'artblog-{os.getuid()}-'
+                                f'{key.hexdigest()[:12]}.sock')
+
+
+def send_line(conn, obj):
+    """Send a JSON line."""
+    conn.sendall(json.dumps(obj).encode('utf-8') + b'\n')
+
+
+class ReplyWriter:
+    """File-like object sending what is written as output lines."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, txt):
+        if txt:
+            send_line(self.conn, {'output': txt})
+        return len(txt)
+
+    def flush(self):
+        pass
+
+
+def load_warm_config(state):
+    """Return the config, loaded again only if config.yml changed."""
+    from artblog.artblog import load_config
+
+    # Relative paths in the config depend on the working folder
+    key = (os.stat(state['config_yml']).st_mtime_ns, os.getcwd())
+    if state.get('config_key') != key:
+        state['config'] = load_config(state['config_yml'])
+        state['config_key'] = key
+    return state['config']
+
+
+def run_build(state, build_argv):
+    """Build the site with command line options, return the exit status."""
+    import copy
+    from artblog.artblog import (CMDLINE_APP_NAME, add_build_arguments,
+                                 build_site, check_build_arguments)
+
+    parser = argparse.ArgumentParser(prog='artblog daemon build',
+                                     description=CMDLINE_APP_NAME)
+    add_build_arguments(parser)
+    try:
+        args = parser.parse_args([state['config_yml']] + build_argv)
+        check_build_arguments(args)
+        # Builds may update their config, e.g. the copyright year
+        config = copy.deepcopy(load_warm_config(state))
+        build_site(config, args)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code)
+        return 1
+    except Exception:
+        import traceback
+        traceback.print_exc(file=sys.stdout)
+        return 1
+    return 0
+
+
+def handle_request(state, conn):
+    """Serve one request, return False to stop the daemon."""
+    with conn.makefile('rb') as f:
+        line = f.readline()
+    if not line:
+        # Connection closed, e.g. to check that the daemon is running
+        return True
+    try:
+        request = json.loads(line)
+        action = request['action']
+    except (ValueError, KeyError, TypeError):
+        send_line(conn, {'output': 'ERROR: Invalid request\n', 'status': 1})
+        return True
+
+    if action == 'stop':
+        send_line(conn, {'output': 'Daemon stopped\n', 'status': 0})
+        return False
+    if action != 'build':
+        send_line(conn, {'output': f'ERROR: Unknown action: {action}\n',
+                         'status': 1})
+        return True
+
+    # Build in the working folder of the client, with its output
+    start = time.perf_counter()
+    cwd = os.getcwd()
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = ReplyWriter(conn)
+    try:
+        os.chdir(request.get('cwd', cwd))
+        status = run_build(state, request.get('argv', []))
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        os.chdir(cwd)
+    state['builds'] += 1
+    seconds = time.perf_counter() - start
+    send_line(conn, {'status': status, 'seconds': seconds})
+    print(f'Build {state["builds"]} ({" ".join(request.get("argv", []))}): '
+          f'status {status}, {seconds:.3f} s', flush=True)
+    return True
+
+
+def listen(path):
+    """Return a server socket, unless a daemon already listens there."""
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)  # left over by a daemon that was killed
+        else:
+            print(f'ERROR: A daemon is already listening on {path}')
+            sys.exit(1)
+        finally:
+            probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)  # only the user may connect
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    return server
+
+
+def start_daemon(args):
+    """Serve build requests until stopped."""
+    # Import the build modules and their dependencies once
+    import artblog.artblog
+    from artblog.renderers import get_markdown_renderer, render_markdown
+    import yaml
+
+    state = {'config_yml': os.path.abspath(args.config_yml), 'builds': 0}
+    render_markdown('', get_markdown_renderer(load_warm_config(state)))
+    server = listen(args.socket)
+    print(f'Daemon of {args.config_yml} listening on {args.socket} '
+          '(Ctrl+C to stop)', flush=True)
+    try:
+        running = True
+        while running:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    running = handle_request(state, conn)
+                except OSError as e:
+                    # Client gone, keep serving
+                    print(f'WARN: {e}', flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(args.socket)
+
+
+def send_request(args, request):
+    """Send a request to the daemon, print its output, return the status."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(args.socket)
+    except OSError:
+        print(f'ERROR: No daemon listening on {args.socket}, start one with: '
+              f'artblog daemon start {args.config_yml}')
+        return 1
+
+    with conn:
+        send_line(conn, request)
+        with conn.makefile('rb') as f:
+            for line in f:
+                reply = json.loads(line)
+                if 'output' in reply:
+                    sys.stdout.write(reply['output'])
+                    sys.stdout.flush()
+                if 'status' in reply:
+                    return reply['status']
+    print('ERROR: The daemon closed the connection')
+    return 1
+
+
+def main(argv):
+    args, build_argv = get_user_inputs(argv)
+    if args.action == 'start':
+        start_daemon(args)
+        return
+    request = {'action': args.action}
+    if args.action == 'build':
+        request['argv'] = build_argv
+        request['cwd'] = os.getcwd()
+    sys.exit(send_request(args, request))
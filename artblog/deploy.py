@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Deploy the output folder by transferring only what changed.
+
+Usage: artblog deploy config.yml TARGET [--tarball FILE]
+
+The content hash of every output file is compared with the hashes
+recorded at the last deploy to the same target, in the output's cache
+folder. Added and changed files are copied to the target folder (e.g. a
+mounted web host folder), pages last so they never refer to files not
+copied yet, and files no longer in the output are removed from it.
+
+With --tarball, the added and changed files are also written to a tar
+archive, for transfer to a host that can't be mounted. Files to remove
+are listed in it as .artblog-deleted.txt. Without TARGET, only the
+archive is written, with the changes since the last archive.
+"""
+# Standard libraries
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+
+# Package modules
+from artblog.manifest import CACHE_FOLDER, HASH_CHUNK_SIZE, remove_output
+
+DEPLOY_FILE = os.path.join(CACHE_FOLDER, 'deploy.json')
+DEPLOY_VERSION = 1
+
+# Key of the last deploy without target folder
+TARBALL_KEY = 'tarball'
+
+DELETED_LIST = '.artblog-deleted.txt'
+
+# Compression of the tarball by file extension
+TARBALL_MODES = (
+    ('.tar.gz', 'w:gz'),
+    ('.tgz', 'w:gz'),
+    ('.tar.bz2', 'w:bz2'),
+    ('.tar.xz', 'w:xz'),
+    ('.tar', 'w'),
+    )
+
+
+def get_user_inputs(argv):
+    """Get user arguments of the deploy command."""
+    from artblog.artblog import CMDLINE_APP_NAME
+
+    parser = argparse.ArgumentParser(
+        prog='artblog deploy',
+        description=f'{CMDLINE_APP_NAME} - copy the files changed since '
+                    'the last deploy',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('config_yml', help='YAML configuration file')
+    parser.add_argument('target', nargs='?',
+                        help='folder the site is deployed to')
+    parser.add_argument('--tarball', '-t', metavar='FILE',
+                        help='also write the added and changed files to a '
+                             '.tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz file')
+    parser.add_argument('--full',
+                        action='store_true',
+                        help='transfer every file, not only the changed ones')
+    parser.add_argument('--dry_run', '-n',
+                        action='store_true',
+                        help='only print what would be transferred')
+    args = parser.parse_args(argv)
+
+    if args.target is None and args.tarball is None:
+        parser.error('a target folder or --tarball is required')
+    if args.tarball is not None and tarball_mode(args.tarball) is None:
+        parser.error('--tarball must end with ' +
+                     ', '.join(ext for ext, _ in TARBALL_MODES))
+    return args
+
+
+def tarball_mode(filepath):
+    """Return the tarfile mode of a tarball name, or None."""
+    for ext, mode in TARBALL_MODES:
+        if filepath.lower().endswith(ext):
+            return mode
+    return None
+
+
+def load_deploys(output):
+    """Return the files recorded at the last deploy to every target."""
+    filepath = os.path.join(output, DEPLOY_FILE)
+    try:
+        with open(filepath, 'rt', encoding='utf-8') as f:
+            deploys = json.load(f)
+    except (OSError, ValueError):
+        deploys = {}
+    if deploys.get('version') != DEPLOY_VERSION:
+        deploys = {'version': DEPLOY_VERSION, 'targets': {}}
+    return deploys
+
+
+def save_deploys(output, deploys):
+    """Write the deploy records to the output's cache folder."""
+    os.makedirs(os.path.join(output, CACHE_FOLDER), exist_ok=True)
+    filepath = os.path.join(output, DEPLOY_FILE)
+    tmpfile = filepath + '.tmp'
+    with open(tmpfile, 'wt', encoding='utf-8') as f:
+        json.dump(deploys, f, separators=(',', ':'))
+    os.replace(tmpfile, filepath)
+
+
+def output_files(output, deployed):
+    """Return relative path -> [size, mtime_ns, hash] of the output files.
+
+    Files with the size and modification time recorded at the last deploy
+    are not hashed again.
+    """
+    files = {}
+    for root, dirs, names in os.walk(output):
+        if os.path.abspath(root) == os.path.abspath(output):
+            dirs[:] = [d for d in dirs if d != CACHE_FOLDER]
+        dirs.sort()
+        for name in sorted(names):
+            filepath = os.path.join(root, name)
+            relpath = os.path.relpath(filepath, output)
+            st = os.stat(filepath)
+            entry = deployed.get(relpath)
+            if entry is None or entry[:2] != [st.st_size, st.st_mtime_ns]:
+                h = hashlib.sha256()
+                with open(filepath, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                        h.update(chunk)
+                entry = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+            files[relpath] = entry
+    return files
+
+
+def compare_files(files, deployed, full=False):
+    """Return (added, changed, removed) relative paths."""
+    added = [p for p in files if p not in deployed]
+    changed = [p for p in files if p in deployed and
+               (full or files[p][2] != deployed[p][2])]
+    removed = sorted(p for p in deployed if p not in files)
+    return added, changed, removed
+
+
+def transfer_order(relpath):
+    """Sort key copying pages after the files they refer to."""
+    return relpath.lower().endswith('.html'), relpath
+
+
+def copy_files(output, target, list_relpaths):
+    """Copy files from the output folder to the target folder."""
+    for relpath in sorted(list_relpaths, key=transfer_order):
+        dstfile = os.path.join(target, relpath)
+        os.makedirs(os.path.dirname(dstfile), exist_ok=True)
+        tmpfile = dstfile + '.tmp'
+        shutil.copy2(os.path.join(output, relpath), tmpfile)
+        os.replace(tmpfile, dstfile)
+
+
+def write_tarball(output, filepath, list_relpaths, removed):
+    """Write the files and the list of files to remove to a tarball."""
+    tmpfile = filepath + '.tmp'
+    with tarfile.open(tmpfile, tarball_mode(filepath)) as tar:
+        for relpath in sorted(list_relpaths, key=transfer_order):
+            tar.add(os.path.join(output, relpath),
+                    arcname=relpath.replace(os.sep, '/'))
+        if removed:
+            tmplist = os.path.join(output, CACHE_FOLDER, DELETED_LIST)
+            with open(tmplist, 'wt', encoding='utf-8') as f:
+                f.writelines(p.replace(os.sep, '/') + '\n' for p in removed)
+            tar.add(tmplist, arcname=DELETED_LIST)
+            os.remove(tmplist)
+    os.replace(tmpfile, filepath)
+
+
+def deploy(output, target, tarball, full=False, dry_run=False):
+    """Transfer the changes since the last deploy.
+
+    Return (added, changed, removed) relative paths.
+    """
+    key = os.path.abspath(target) if target is not None else TARBALL_KEY
+    deploys = load_deploys(output)
+    deployed = deploys['targets'].get(key, {})
+    files = output_files(output, deployed)
+    added, changed, removed = compare_files(files, deployed, full)
+    if dry_run:
+        return added, changed, removed
+
+    if tarball is not None:
+        write_tarball(output, tarball, added + changed, removed)
+    if target is not None:
+        os.makedirs(target, exist_ok=True)
+        copy_files(output, target, added + changed)
+        for relpath in removed:
+            remove_output(target, relpath)
+
+    deploys['targets'][key] = files
+    save_deploys(output, deploys)
+    return added, changed, removed
+
+
+def main(argv):
+    from artblog.artblog import load_config
+
+    args = get_user_inputs(argv)
+    config = load_config(args.config_yml)
+    output = config['output']
+    if args.target is not None and \
+            os.path.abspath(args.target) == os.path.abspath(output):
+        print('ERROR: the target must not be the output folder')
+        sys.exit(1)
+
+    added, changed, removed = deploy(output, args.target, args.tarball,
+                                     full=args.full, dry_run=args.dry_run)
+    if args.dry_run:
+        for label, list_relpaths in (('add', added), ('change', changed),
+                                     ('remove', removed)):
+            for relpath in sorted(list_relpaths):
+                print(f'{label}: {relpath}')
+
+    nbytes = sum(os.path.getsize(os.path.join(output, relpath))
+                 for relpath in added + changed)
+    print(f'Added: {len(added)}, changed: {len(changed)}, '
+          f'removed: {len(removed)}, bytes transferred: {nbytes}')
+    if args.tarball is not None and not args.dry_run:
+        print(f'Tarball written to: {args.tarball}')
+    if args.target is not None and not args.dry_run:
+        print(f'Site deployed to: {args.target}')
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Discovery of the files of the post sources and the main page folder.
+
+Folders are walked with os.scandir in sorted order, without descending
+into version control and dependency folders (.git, .hg, node_modules), so
+their contents are neither read nor copied to the output. A .artblogignore
+file at the top of a folder lists more paths to skip, one pattern per
+line, as in .gitignore:
+
+- "drafts/" skips folders named drafts, "*.psd" files ending in .psd
+- patterns with a "/" are matched against the path relative to the
+  folder, e.g. "2019/old-*"
+- blank lines and lines starting with "#" are ignored
+
+With git_index set to true in the config, folders in a Git work tree are
+listed from the Git index instead (git ls-files), so only tracked files
+are published and no folder is walked.
+
+Post URLs are made of the name of the folder of the post, so posts in
+folders of the same name, or several .md files in one folder, would
+overwrite each other. These collisions are reported before building.
+"""
+# Standard libraries
+from collections import defaultdict
+import fnmatch
+import os
+import subprocess
+import sys
+
+# Package modules
+from artblog.metaindex import post_slug
+
+MARKDOWN_EXTENSIONS = ('.md')
+
+# Folders never walked
+PRUNED_FOLDERS = frozenset(('.git', '.hg', 'node_modules'))
+
+IGNORE_FILE = '.artblogignore'
+
+# Mode of submodules in the Git index
+GIT_SUBMODULE_MODE = '160000'
+
+
+def get_git_index(config):
+    """Return True if folders in Git work trees are listed from the index."""
+    value = config.get('git_index', 'false')
+    if value not in ('true', 'false'):
+        print('ERROR: git_index must be true or false')
+        sys.exit(1)
+    return value == 'true'
+
+
+def read_ignore_patterns(src_folder):
+    """Return (pattern, folders only, anchored) of the folder's ignore file."""
+    list_patterns = []
+    try:
+        with open(os.path.join(src_folder, IGNORE_FILE), 'rt',
+                  encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return list_patterns
+
+    for line in lines:
+        pattern = line.strip()
+        if not pattern or pattern.startswith('#'):
+            continue
+        folders_only = pattern.endswith('/')
+        pattern = pattern.strip('/')
+        if pattern:
+            list_patterns.append((pattern, folders_only, '/' in pattern))
+    return list_patterns
+
+
+def is_ignored(relpath, is_folder, list_patterns):
+    """Return True if a path relative to the folder is skipped.
+
+    relpath uses "/" as separator.
+    """
+    name = relpath.rsplit('/', 1)[-1]
+    if is_folder and name in PRUNED_FOLDERS:
+        return True
+    for pattern, folders_only, anchored in list_patterns:
+        if folders_only and not is_folder:
+            continue
+        if fnmatch.fnmatchcase(relpath if anchored else name, pattern):
+            return True
+    return False
+
+
+def scan_folder(src_folder, list_patterns):
+    """Return the paths of the files below a folder, relative to it.
+
+    Files of a folder come before those of its subfolders, each in sorted
+    order, as with a sorted os.walk().
+    """
+    list_files = []
+    stack = ['']
+    while stack:
+        relroot = stack.pop()
+        try:
+            with os.scandir(os.path.join(src_folder, relroot)) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        list_folders = []
+        for entry in entries:
+            relpath = relroot + '/' + entry.name if relroot else entry.name
+            is_folder = entry.is_dir()
+            if is_ignored(relpath, is_folder, list_patterns):
+                continue
+            if is_folder:
+                # Links to folders are not followed, as by os.walk()
+                if not entry.is_symlink():
+                    list_folders.append(relpath)
+            else:
+                list_files.append(relpath)
+        stack.extend(reversed(list_folders))
+    return list_files
+
+
+def walk_order(relpath):
+    """Sort key listing paths in the order of scan_folder()."""
+    parts = relpath.split('/')
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+
+def git_files(src_folder, list_patterns):
+    """Return the tracked files below a folder relative to it, or None.
+
+    None if the folder is not in a Git work tree or git is not installed.
+    """
+    def ls_files(*options):
+        result = subprocess.run(['git', 'ls-files', '-z'] + list(options),
+                                cwd=src_folder, capture_output=True,
+                                check=True)
+        return result.stdout.decode('utf-8').split('\0')[:-1]
+
+    try:
+        list_staged = ls_files('--stage')
+        deleted = set(ls_files('--deleted'))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    list_files = []
+    for line in list_staged:
+        info, relpath = line.split('\t', 1)
+        if info.split(' ', 1)[0] == GIT_SUBMODULE_MODE or relpath in deleted:
+            continue
+        parts = relpath.split('/')
+        if any(is_ignored('/'.join(parts[:i]), True, list_patterns)
+               for i in range(1, len(parts))):
+            continue
+        if not is_ignored(relpath, False, list_patterns):
+            list_files.append(relpath)
+    # Unmerged files are listed once per stage
+    return sorted(set(list_files), key=walk_order)
+
+
+def list_folder(config, src_folder):
+    """Return (markdown files, other files relative to folder)."""
+    list_patterns = read_ignore_patterns(src_folder)
+    list_files = None
+    if get_git_index(config):
+        list_files = git_files(src_folder, list_patterns)
+        if list_files is None:
+            print(f'WARN: {src_folder} is not in a Git work tree, '
+                  'listing its files from the folder')
+    if list_files is None:
+        list_files = scan_folder(src_folder, list_patterns)
+
+    list_markdown = []
+    list_other = []
+    for relpath in list_files:
+        parts = relpath.split('/')
+        name = parts[-1]
+        if name.endswith(MARKDOWN_EXTENSIONS):
+            # Same files a recursive glob would find
+            if not any(s.startswith('.') for s in parts):
+                list_markdown.append(os.path.join(src_folder, *parts))
+            continue
+        if relpath != IGNORE_FILE:
+            list_other.append(os.path.join(*parts))
+
+    return list_markdown, list_other
+
+
+def check_slug_collisions(list_markdown):
+    """Exit with an error if posts would be written to the same URL."""
+    dct_files = defaultdict(list)
+    for filepath in list_markdown:
+        dct_files[post_slug(filepath)].append(filepath)
+
+    list_collisions = [(slug, list_files)
+                       for slug, list_files in dct_files.items()
+                       if len(list_files) > 1]
+    if not list_collisions:
+        return
+    for slug, list_files in list_collisions:
+        print(f'ERROR: These posts have the same URL /{slug}: ' +
+              ', '.join(list_files))
+    print('ERROR: Rename the folders of the posts so each has one .md file '
+          'and a name not used in other sources')
+    sys.exit(1)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Sitemap and Atom feed of the site.
+
+Both are generated from the post metadata index, so they are rebuilt
+without rendering any post. The sitemap lists the main page, category
+pages and posts with the modification time of their sources. Above
+50,000 URLs, it is split into several sitemaps listed by a sitemap index.
+The Atom feed has the newest posts, by "date" metadata or else by
+modification time.
+"""
+# Standard libraries
+from datetime import datetime, timezone
+import os
+import sys
+
+# Package modules
+from artblog.template import escape
+
+SITEMAP_FILE = 'sitemap.xml'
+FEED_FILE = 'feed.xml'
+
+# Limit of the sitemap protocol
+SITEMAP_MAX_URLS = 50000
+
+# Default number of posts in the feed
+FEED_POSTS = 20
+
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+FEED_LINK = '<link rel="alternate" type="application/atom+xml" ' \
+    'title="{{title}}" href="/' + FEED_FILE + '">'
+
+
+def get_feed_posts(config):
+    """Return the number of posts in the feed, 0 if disabled."""
+    try:
+        feed_posts = int(config.get('feed_posts', FEED_POSTS))
+    except (TypeError, ValueError):
+        feed_posts = -1
+    if feed_posts < 0:
+        print('ERROR: feed_posts must be 0 (no feed) or a positive integer')
+        sys.exit(1)
+    return feed_posts
+
+
+def w3c_datetime(timestamp):
+    """Return a timestamp in the date format of sitemaps and feeds."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(
+        timespec='seconds')
+
+
+def post_date(meta):
+    """Return the timestamp of the "date" metadata, None if invalid."""
+    try:
+        date = datetime.fromisoformat(str(meta['date']).strip())
+    except (KeyError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def sitemap_urls(config, dct_meta, dct_pages):
+    """Return (URL, modification timestamp or None) of every page."""
+    base_url = config['base_url']
+    index_md = os.path.join(config['mainpage_folder'], 'index.md')
+    list_urls = [(base_url + '/', os.path.getmtime(index_md))]
+
+    # Category pages change with their posts
+    for page_slug, list_slugs in dct_pages.items():
+        mtime = max((dct_meta[slug]['mtime'] for slug in list_slugs),
+                    default=None)
+        list_urls.append((base_url + '/' + page_slug, mtime))
+
+    # Posts whose canonical URL is on another site are left out
+    for meta in dct_meta.values():
+        if meta['canonical'].startswith(base_url + '/'):
+            list_urls.append((meta['canonical'], meta['mtime']))
+
+    return list_urls
+
+
+def urlset_xml(list_urls):
+    """Return a sitemap of URLs."""
+    lines = [XML_HEAD, f'<urlset xmlns="{SITEMAP_XMLNS}">\n']
+    for url, mtime in list_urls:
+        lastmod = ''
+        if mtime is not None:
+            lastmod = f'<lastmod>{w3c_datetime(mtime)}</lastmod>'
+        lines.append(f'<url><loc>{escape(url)}</loc>{lastmod}</url>\n')
+    lines.append('</urlset>\n')
+    return ''.join(lines)
+
+
+def sitemap_files(config, dct_meta, dct_pages):
+    """Return the text of every sitemap file by its output path."""
+    list_urls = sitemap_urls(config, dct_meta, dct_pages)
+    if len(list_urls) <= SITEMAP_MAX_URLS:
+        return {SITEMAP_FILE: urlset_xml(list_urls)}
+
+    dct_files = {}
+    lines = [XML_HEAD, f'<sitemapindex xmlns="{SITEMAP_XMLNS}">\n']
+    for n, i in enumerate(range(0, len(list_urls), SITEMAP_MAX_URLS), 1):
+        shard = list_urls[i:i+SITEMAP_MAX_URLS]
+        filename = f'sitemap-{n}.xml'
+        dct_files[filename] = urlset_xml(shard)
+
+        mtime = max((m for _, m in shard if m is not None), default=None)
+        lastmod = ''
+        if mtime is not None:
+            lastmod = f'<lastmod>{w3c_datetime(mtime)}</lastmod>'
+        loc = escape(config['base_url'] + '/' + filename)
+        lines.append(f'<sitemap><loc>{loc}</loc>{lastmod}</sitemap>\n')
+    lines.append('</sitemapindex>\n')
+    dct_files[SITEMAP_FILE] = ''.join(lines)
+    return dct_files
+
+
+def feed_xml(config, dct_meta):
+    """Return the Atom feed of the newest posts, None if disabled."""
+    feed_posts = get_feed_posts(config)
+    if not feed_posts:
+        return None
+
+    # Newest first, by date metadata or else modification time
+    list_meta = sorted(
+        dct_meta.values(),
+        key=lambda meta: post_date(meta) or meta['mtime'],
+        reverse=True)[:feed_posts]
+
+    base_url = escape(config['base_url'] + '/')
+    title = escape(config.get('site_name', config['base_url']))
+    updated = max((meta['mtime'] for meta in list_meta), default=None)
+    if updated is None:
+        index_md = os.path.join(config['mainpage_folder'], 'index.md')
+        updated = os.path.getmtime(index_md)
+
+    lines = [XML_HEAD,
+             '<feed xmlns="http://www.w3.org/2005/Atom">\n',
+             f'<title>{title}</title>\n',
+             f'<id>{base_url}</id>\n',
+             f'<link rel="alternate" href="{base_url}"/>\n',
+             f'<link rel="self" href="{base_url}{FEED_FILE}"/>\n',
+             f'<updated>{w3c_datetime(updated)}</updated>\n']
+    if 'author' in config:
+        lines.append(f'<author><name>{escape(config["author"])}</name>'
+                     '</author>\n')
+
+    for meta in list_meta:
+        canonical = escape(meta['canonical'])
+        lines += ['<entry>\n',
+                  f'<title>{escape(meta["title"])}</title>\n',
+                  f'<id>{canonical}</id>\n',
+                  f'<link rel="alternate" href="{canonical}"/>\n']
+        published = post_date(meta)
+        if published is not None:
+            lines.append(f'<published>{w3c_datetime(published)}'
+                         '</published>\n')
+        lines.append(f'<updated>{w3c_datetime(meta["mtime"])}</updated>\n')
+        if meta.get('summary'):
+            lines.append(f'<summary>{escape(meta["summary"])}</summary>\n')
+        lines.append(f'<category term="{escape(meta["category"])}"/>\n')
+        lines.append('</entry>\n')
+    lines.append('</feed>\n')
+    return ''.join(lines)
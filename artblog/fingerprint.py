@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Content-hashed file names for long-lived browser caching.
+
+When "fingerprint" is enabled in the config, the stylesheet and images
+(site images, post and main page images and their resized copies) are
+written with a hash of their content in the file name, e.g.
+css/style.3f2a9c01b4.css, and references to them in HTML attributes of the
+generated pages are rewritten. As the content behind such a URL never
+changes, browsers can cache it for good.
+
+The cache manifest (cache-manifest.json) in the output lists the paths
+that can be cached as immutable, and the paths that browsers must
+revalidate, for configuring the headers of the web server.
+"""
+# Standard libraries
+import html
+import json
+import os
+import re
+import sys
+import urllib.parse
+
+# Package modules
+from artblog.template import escape
+
+# Outputs with content-hashed file names
+FINGERPRINT_EXTENSIONS = ('.css', '.jpg', '.jpeg', '.png', '.webp', '.gif',
+                          '.svg', '.ico', '.avif')
+
+# Characters of the content hash in file names
+HASH_LENGTH = 10
+
+CACHE_MANIFEST = 'cache-manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+URL_ATTR = re.compile(r'(\s(?:src|href|srcset)=")([^"]*)"', re.IGNORECASE)
+
+
+def get_fingerprint(config):
+    """Return True if outputs get content-hashed file names."""
+    value = config.get('fingerprint', 'false')
+    if value not in ('true', 'false'):
+        print('ERROR: fingerprint must be true or false')
+        sys.exit(1)
+    return value == 'true'
+
+
+def fingerprint_output(config, relpath, digest, manifest):
+    """Return the output path of a file, content-hashed if fingerprinting."""
+    if not get_fingerprint(config) or \
+            not relpath.lower().endswith(FINGERPRINT_EXTENSIONS):
+        return relpath
+    stem, ext = os.path.splitext(relpath)
+    hashed = f'{stem}.{digest[:HASH_LENGTH]}{ext}'
+    manifest['current']['fingerprints'][relpath] = hashed
+    return hashed
+
+
+def fingerprint_urls(manifest):
+    """Return the content-hashed URL of every fingerprinted URL."""
+    fingerprints = manifest['current']['fingerprints']
+    return {'/' + relpath.replace(os.sep, '/'):
+            '/' + hashed.replace(os.sep, '/')
+            for relpath, hashed in fingerprints.items()}
+
+
+def rewrite_asset_urls(txt, page_url, dct_urls):
+    """Refer to fingerprinted files by their content-hashed URLs."""
+    if not dct_urls:
+        return txt
+
+    def replace_url(url):
+        parts = urllib.parse.urlsplit(urllib.parse.urljoin(page_url, url))
+        if parts.scheme or parts.netloc:
+            return url
+        hashed = dct_urls.get(urllib.parse.unquote(parts.path))
+        if hashed is None:
+            return url
+        return urllib.parse.urlunsplit(
+            ('', '', urllib.parse.quote(hashed), parts.query, parts.fragment))
+
+    def replace(m):
+        value = html.unescape(m.group(2))
+        if m.group(1).lower().endswith('srcset="'):
+            # Comma separated "URL width" items
+            items = []
+            for item in value.split(','):
+                words = item.split()
+                if words:
+                    words[0] = replace_url(words[0])
+                items.append(' '.join(words))
+            new_value = ', '.join(items)
+        else:
+            new_value = replace_url(value)
+        if new_value == value:
+            return m.group(0)
+        return m.group(1) + escape(new_value) + '"'
+
+    return URL_ATTR.sub(replace, txt)
+
+
+def cache_manifest_text(manifest):
+    """Return the cache manifest of the outputs of the current build."""
+    current = manifest['current']
+    hashed = set(current['fingerprints'].values())
+    immutable = []
+    revalidate = []
+    for relpath in sorted(set(current['assets']) | set(current['pages'])):
+        url = '/' + relpath.replace(os.sep, '/')
+        if relpath in hashed:
+            immutable.append(url)
+        else:
+            revalidate.append(url)
+    revalidate.append('/' + CACHE_MANIFEST)
+
+    return json.dumps({
+        'immutable': {
+            'cache_control': IMMUTABLE_CACHE_CONTROL,
+            'paths': immutable,
+            },
+        'revalidate': {
+            'cache_control': REVALIDATE_CACHE_CONTROL,
+            'paths': revalidate,
+            },
+        'fingerprints': dict(sorted(fingerprint_urls(manifest).items())),
+        }, indent=1) + '\n'
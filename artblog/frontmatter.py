@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Front matter (post metadata) at the start of post markdown files.
+
+A post starts with YAML metadata between two "---" lines:
+
+    ---
+    title: My Post
+    category: Drawings
+    ---
+
+Almost all front matter is a flat list of "key: value" lines, which is
+parsed without YAML. Anything else falls back to the YAML loader (the
+libyaml based one when available). Both give the same result, with every
+value loaded as a string.
+"""
+# Standard libraries
+import re
+
+# Bytes read at a time when only the front matter is needed
+READ_SIZE = 4096
+
+# Metadata every post must have
+REQUIRED_KEYS = ('title', 'category')
+
+# The "---" line closing the front matter, after the opening "---" line
+FRONT_MATTER_END = re.compile(r'^---[ \t]*$', re.MULTILINE)
+FRONT_MATTER_START = 3
+
+# A "key: value" line where the value is a plain YAML string
+SIMPLE_LINE = re.compile(r'([A-Za-z_][A-Za-z0-9_-]*):(?: +(.*))?')
+
+# Characters that give a value a special meaning in YAML when first
+SPECIAL_FIRST = set('-?:,[]{}#&*!|>\'"%@`')
+
+
+def split_front_matter(txt):
+    """Return (front matter text, markdown text), or (None, txt)."""
+    m = FRONT_MATTER_END.search(txt, FRONT_MATTER_START)
+    if m is None:
+        return None, txt
+    # Markdown starts right after the closing "---"
+    return txt[:m.start()], txt[m.start()+3:]
+
+
+def read_front_matter(filepath):
+    """Return the front matter text of a file without reading the body."""
+    txt = ''
+    with open(filepath, 'rt', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            # Closing "---" line may start in the previous chunk
+            start = max(FRONT_MATTER_START, txt.rfind('\n') + 1)
+            txt += chunk
+            m = FRONT_MATTER_END.search(txt, start)
+            # Line must be complete, e.g. not "----" split over chunks
+            if m is not None and (m.end() < len(txt) or not chunk):
+                return txt[:m.start()]
+            if not chunk:
+                return None
+
+
+def parse_simple_front_matter(meta_txt):
+    """Parse flat "key: value" front matter, return None if not flat."""
+    meta = {}
+    for line in meta_txt.splitlines():
+        line = line.rstrip(' \r')
+        if not line or line == '---' or line.startswith('#'):
+            continue
+
+        m = SIMPLE_LINE.fullmatch(line)
+        if m is None:
+            return None
+        value = m.group(2) or ''
+        if value and (value[0] in SPECIAL_FIRST or
+                      value[-1] == ':' or
+                      ': ' in value or
+                      ' #' in value or
+                      not value.isprintable()):
+            return None
+        meta[m.group(1)] = value
+
+    return meta
+
+
+def parse_yaml_front_matter(meta_txt, loader=None):
+    """Parse front matter with a YAML loader."""
+    # Only imported for the rare front matter that needs it
+    import yaml
+
+    if loader is None:
+        # yaml.BaseLoader loads everything as string, the C version is faster
+        loader = getattr(yaml, 'CBaseLoader', yaml.BaseLoader)
+    return yaml.load(meta_txt, Loader=loader)
+
+
+def parse_front_matter(meta_txt):
+    """Return the metadata dict of front matter text."""
+    if meta_txt is None:
+        raise ValueError('Cannot find metadata')
+
+    meta = parse_simple_front_matter(meta_txt)
+    if meta is None:
+        meta = parse_yaml_front_matter(meta_txt)
+    if not isinstance(meta, dict):
+        raise ValueError('Cannot find metadata')
+    for k in REQUIRED_KEYS:
+        if k not in meta:
+            raise ValueError(f'Missing "{k}" in metadata')
+    return meta
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Staged builds into generations of the output folder.
+
+With --staged, the output folder is a symbolic link to the current
+generation, e.g. output -> output.generations/gen-000042. A build starts
+from a copy of the current generation in which every file is a hardlink,
+so it takes little time and space, and keeps the cache folder (manifest,
+image cache, indexes, deploy state). With --incremental, only what
+changed is regenerated; otherwise every page is generated again without
+reusing the manifest, and outputs no longer generated are removed. Every
+output is written under a temporary name and renamed, so the files of
+the current generation are never modified. When the build succeeds, the
+link is switched to the new generation in one rename and older
+generations beyond the number kept are removed. A failed build leaves
+the served site untouched.
+
+Usage: artblog rollback config.yml [--generation N]
+
+switches the link back to the previous (or given) kept generation.
+"""
+# Standard libraries
+import argparse
+import os
+import re
+import shutil
+import sys
+
+# Package modules
+from artblog.manifest import CACHE_FOLDER, MANIFEST_FILE
+
+GENERATIONS_SUFFIX = '.generations'
+GENERATION_NAME = 'gen-{:06d}'
+GENERATION_PATTERN = re.compile(r'gen-(\d+)')
+
+# Suffix of a generation being built
+BUILDING_SUFFIX = '.building'
+
+# Generations kept by default, including the current one
+KEEP_GENERATIONS = 3
+
+
+def generations_folder(output):
+    """Return the folder holding the generations of the output."""
+    parent, name = os.path.split(os.path.abspath(output).rstrip(os.sep))
+    return os.path.join(os.path.realpath(parent), name + GENERATIONS_SUFFIX)
+
+
+def list_generations(output):
+    """Return number -> folder of the complete generations, oldest first."""
+    folder = generations_folder(output)
+    dct_generations = {}
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            m = GENERATION_PATTERN.fullmatch(name)
+            if m:
+                dct_generations[int(m.group(1))] = os.path.join(folder, name)
+    return dict(sorted(dct_generations.items()))
+
+
+def current_generation(output):
+    """Return the folder the output links to, or None."""
+    if not os.path.islink(output):
+        return None
+    return os.path.realpath(output)
+
+
+def snapshot_folder(src_folder, dst_folder):
+    """Recreate a folder with hardlinks to its files.
+
+    Files directly in the cache folder (SQLite indexes etc.) are updated
+    in place by builds, so they are copied instead, except the manifest,
+    which is replaced by a new file when saved. Linking it lets a daemon
+    find the manifest it last saved in its cache (see load_manifest()).
+    """
+    cache_folder = os.path.join(src_folder, CACHE_FOLDER)
+    manifest_file = os.path.join(src_folder, MANIFEST_FILE)
+    for root, dirs, files in os.walk(src_folder):
+        dst_root = os.path.join(dst_folder,
+                                os.path.relpath(root, src_folder))
+        os.makedirs(dst_root, exist_ok=True)
+        for name in files:
+            srcfile = os.path.join(root, name)
+            dstfile = os.path.join(dst_root, name)
+            if root == cache_folder and srcfile != manifest_file:
+                shutil.copy2(srcfile, dstfile)
+                continue
+            try:
+                os.link(srcfile, dstfile, follow_symlinks=False)
+            except OSError:
+                shutil.copy2(srcfile, dstfile, follow_symlinks=False)
+
+
+def switch_generation(output, generation):
+    """Point the output link to a generation in one rename."""
+    tmplink = os.path.abspath(output).rstrip(os.sep) + '.artblog-tmp'
+    if os.path.lexists(tmplink):
+        os.remove(tmplink)
+    # Relative, so the output can be moved with its generations
+    os.symlink(os.path.relpath(generation,
+                               os.path.dirname(os.path.abspath(output))),
+               tmplink)
+    os.replace(tmplink, output)
+
+
+def start_generation(output, snapshot=True):
+    """Create the folder of the next generation and return it.
+
+    With snapshot, it starts as a copy of the current generation.
+    """
+    folder = generations_folder(output)
+    os.makedirs(folder, exist_ok=True)
+
+    # Left over by failed builds
+    for name in os.listdir(folder):
+        if name.endswith(BUILDING_SUFFIX):
+            shutil.rmtree(os.path.join(folder, name))
+
+    dct_generations = list_generations(output)
+    number = max(dct_generations, default=0) + 1
+
+    # An output folder of unstaged builds becomes the first generation
+    if os.path.isdir(output) and not os.path.islink(output):
+        if os.listdir(output):
+            generation = os.path.join(folder, GENERATION_NAME.format(number))
+            os.rename(output, generation)
+            switch_generation(output, generation)
+            number += 1
+        else:
+            os.rmdir(output)
+
+    building = os.path.join(folder, GENERATION_NAME.format(number)) + \
+        BUILDING_SUFFIX
+    current = current_generation(output)
+    if snapshot and current is not None and os.path.isdir(current):
+        snapshot_folder(current, building)
+    else:
+        os.makedirs(building)
+    return building
+
+
+def finish_generation(output, building, keep=KEEP_GENERATIONS):
+    """Make a built generation the current one and remove old ones."""
+    generation = building[:-len(BUILDING_SUFFIX)]
+    os.rename(building, generation)
+    switch_generation(output, generation)
+
+    current = current_generation(output)
+    list_folders = list(list_generations(output).values())
+    for folder in list_folders[:-keep]:
+        if folder != current:
+            shutil.rmtree(folder)
+
+
+def get_user_inputs(argv):
+    """Get user arguments of the rollback command."""
+    from artblog.artblog import CMDLINE_APP_NAME
+
+    parser = argparse.ArgumentParser(
+        prog='artblog rollback',
+        description=f'{CMDLINE_APP_NAME} - serve a previous generation of '
+                    'a staged build',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('config_yml', help='YAML configuration file')
+    parser.add_argument('--generation', '-g',
+                        type=int,
+                        help='number of the generation to serve, instead of '
+                             'the one before the current one')
+    parser.add_argument('--list', '-l',
+                        action='store_true',
+                        help='only list the kept generations')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    from artblog.artblog import load_config
+
+    args = get_user_inputs(argv)
+    config = load_config(args.config_yml)
+    output = config['output']
+    current = current_generation(output)
+    dct_generations = list_generations(output)
+    if current is None or not dct_generations:
+        print(f'ERROR: {output} is not the output of a staged build')
+        sys.exit(1)
+
+    if args.list:
+        for number, folder in dct_generations.items():
+            mark = ' (current)' if folder == current else ''
+            print(f'{number}: {folder}{mark}')
+        return
+
+    if args.generation is None:
+        numbers = [number for number, folder in dct_generations.items()
+                   if folder == current]
+        older = [number for number in dct_generations
+                 if numbers and number < numbers[0]]
+        if not older:
+            print('ERROR: No generation older than the current one')
+            sys.exit(1)
+        args.generation = older[-1]
+    if args.generation not in dct_generations:
+        print(f'ERROR: Generation not found: {args.generation}')
+        sys.exit(1)
+
+    switch_generation(output, dct_generations[args.generation])
+    print(f'{output} now serves generation {args.generation}: '
+          f'{dct_generations[args.generation]}')
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Intrinsic sizes of images for lazy loading without layout shift.
+
+When "lazy_images" is enabled in the config, the size of every image in
+the output is read from its file header (PNG, JPEG, GIF, WebP), without
+decoding any pixels, and cached by image hash in the manifest. Image tags
+in posts, category pages and the main page then get "width" and "height"
+attributes, so browsers reserve their space before they are loaded, and
+loading="lazy" and decoding="async", so images out of view are only
+downloaded when scrolled to.
+
+With "image_placeholders" set to N, the images of the first N posts on
+every category page are loaded right away instead, as they are in view,
+with a tiny blurred copy of the image inlined as background until it is
+shown. Placeholders need the optional Pillow package and are cached by
+image hash too.
+"""
+# Standard libraries
+import base64
+import io
+import os
+import re
+import struct
+import sys
+
+# Package modules
+from artblog.images import IMG_TAG, img_url
+from artblog.template import escape
+
+PROBED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Width in pixels of placeholders, scaled up (and so blurred) by browsers
+PLACEHOLDER_WIDTH = 16
+
+# Part of the cache key of placeholders, changed with how they are made
+PLACEHOLDER_VERSION = 2
+
+# JPEG start of frame markers, which hold the image size
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers without a length and content
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | {0x01}
+
+# EXIF orientations of images rotated by 90 degrees
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+ATTR_NAME = re.compile(r'\s(width|height|loading|decoding|style)\s*=',
+                       re.IGNORECASE)
+
+
+def get_lazy_images(config):
+    """Return True if image tags get their size and lazy loading."""
+    value = config.get('lazy_images', 'false')
+    if value not in ('true', 'false'):
+        print('ERROR: lazy_images must be true or false')
+        sys.exit(1)
+    return value == 'true'
+
+
+def get_image_placeholders(config):
+    """Return the number of posts per category page with placeholders."""
+    try:
+        count = int(config.get('image_placeholders', '0'))
+    except (TypeError, ValueError):
+        count = -1
+    if count < 0:
+        print('ERROR: image_placeholders must be 0 or a positive integer')
+        sys.exit(1)
+    return count
+
+
+def exif_orientation(data):
+    """Return the orientation tag of JPEG EXIF data, or None."""
+    tiff = data[6:]  # after b'Exif\0\0'
+    if tiff[:2] == b'II':
+        order = '<'
+    elif tiff[:2] == b'MM':
+        order = '>'
+    else:
+        return None
+    try:
+        offset = struct.unpack(order + 'I', tiff[4:8])[0]
+        count = struct.unpack(order + 'H', tiff[offset:offset+2])[0]
+        for i in range(count):
+            entry = tiff[offset+2+12*i:offset+14+12*i]
+            tag, _, _, value = struct.unpack(order + 'HHIH', entry[:10])
+            if tag == 0x0112:
+                return value
+    except struct.error:
+        pass
+    return None
+
+
+def jpeg_size(f):
+    """Return (width, height) of a JPEG file after its SOI marker."""
+    orientation = None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS or marker == 0:
+            continue
+        data = f.read(2)
+        if len(data) < 2:
+            return None
+        length = struct.unpack('>H', data)[0] - 2
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            if orientation in ROTATED_ORIENTATIONS:
+                width, height = height, width
+            return width, height
+        if marker == 0xE1 and orientation is None:
+            data = f.read(length)
+            if data.startswith(b'Exif\0\0'):
+                orientation = exif_orientation(data)
+        else:
+            f.seek(length, os.SEEK_CUR)
+
+
+def image_size(filepath):
+    """Return (width, height) of an image from its header, or None.
+
+    The size is as displayed, e.g. swapped for JPEG photos taken in
+    portrait orientation.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(32)
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and \
+                    head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                chunk = head[12:16]
+                if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+                    w, h = struct.unpack('<HH', head[26:30])
+                    return w & 0x3fff, h & 0x3fff
+                if chunk == b'VP8L' and head[20:21] == b'\x2f':
+                    bits = int.from_bytes(head[21:25], 'little')
+                    return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+                if chunk == b'VP8X':
+                    return (int.from_bytes(head[24:27], 'little') + 1,
+                            int.from_bytes(head[27:30], 'little') + 1)
+                return None
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                return jpeg_size(f)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def probe_images(config, manifest):
+    """Return the size of the images in the output by URL.
+
+    Each entry is {'width', 'height', 'digest', 'relpath'} where relpath
+    is the output file of the image.
+    """
+    if not get_lazy_images(config):
+        return {}
+
+    current = manifest['current']
+    previous = manifest['previous']
+    originals = {v: k for k, v in current['fingerprints'].items()}
+    dct_dimensions = {}
+    for output_relpath, digest in sorted(current['assets'].items()):
+        relpath = originals.get(output_relpath, output_relpath)
+        if not relpath.lower().endswith(PROBED_EXTENSIONS):
+            continue
+        size = current['dimensions'].get(digest) or \
+            previous['dimensions'].get(digest)
+        if size is None:
+            size = image_size(os.path.join(config['output'], output_relpath))
+            if size is None:
+                print(f'WARN: Cannot read the size of image {relpath}')
+                continue
+            size = list(size)
+        current['dimensions'][digest] = size
+        dct_dimensions['/' + relpath.replace(os.sep, '/')] = {
+            'width': size[0], 'height': size[1], 'digest': digest,
+            'relpath': output_relpath}
+    return dct_dimensions
+
+
+def make_placeholder(filepath):
+    """Return the data URI of a tiny copy of an image, or ''.
+
+    Images with transparency get none, as it would show through.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        print('WARN: Install Pillow to create image placeholders '
+              '(image_placeholders)')
+        return ''
+
+    try:
+        with Image.open(filepath) as img:
+            if img.mode in ('RGBA', 'LA', 'PA') or \
+                    'transparency' in img.info:
+                return ''
+            img.draft('RGB', (PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            img.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG', optimize=True)
+    except Exception as e:
+        print(f'WARN: Cannot create placeholder of {filepath}: {e}')
+        return ''
+    return 'data:image/png;base64,' + \
+        base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def image_placeholder(config, manifest, entry):
+    """Return the data URI of the placeholder of an image, or ''."""
+    digest = f"{entry['digest']}-v{PLACEHOLDER_VERSION}"
+    current = manifest['current']['placeholders']
+    uri = current.get(digest)
+    if uri is None:
+        uri = manifest['previous']['placeholders'].get(digest)
+    if uri is None:
+        uri = make_placeholder(os.path.join(config['output'],
+                                            entry['relpath']))
+    current[digest] = uri
+    return uri
+
+
+def add_image_dimensions(txt, page_url, dct_dimensions, placeholder=None):
+    """Add size and loading attributes to the image tags of a page.
+
+    placeholder, if given, returns the placeholder of an image from its
+    entry in dct_dimensions: images with one are loaded right away.
+    """
+    def replace(m):
+        tag = m.group(0)
+        url = img_url(tag, page_url)
+        entry = dct_dimensions.get(url) if url is not None else None
+        if entry is None:
+            return tag
+
+        present = {name.lower() for name in ATTR_NAME.findall(tag)}
+        attrs = ''
+        if not present & {'width', 'height'}:
+            attrs += f'width="{entry["width"]}" height="{entry["height"]}" '
+        if placeholder is not None:
+            # In view when the page is opened
+            uri = placeholder(entry)
+            if uri and 'style' not in present:
+                attrs += (f'style="background: url({escape(uri)}) center / '
+                          f'cover no-repeat" ')
+        elif 'loading' not in present:
+            attrs += 'loading="lazy" '
+        if 'decoding' not in present:
+            attrs += 'decoding="async" '
+        return re.sub(r'^<img\s', '<img ' + attrs, tag, flags=re.IGNORECASE)
+
+    return IMG_TAG.sub(replace, txt)
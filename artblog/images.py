@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Resized copies of post images for responsive pages.
+
+When "image_widths" is set in the config, a WebP copy and a JPEG (or PNG)
+copy of every post image is created for each width smaller than the
+original, plus a WebP copy of the full width, so browsers choosing WebP
+get the same widths as the others. Copies are turned upright according to
+the EXIF orientation of the original. The copies are cached by source
+hash and parameters in the output's cache folder, or the folder set as
+"image_cache" (which several sites can share), so an unchanged image is
+never encoded again. Image tags in posts and category pages are then
+given "srcset" attributes referring to the copies, so that browsers
+download the smallest suitable file. This needs the optional Pillow
+package.
+"""
+# Standard libraries
+import html
+import os
+import re
+import sys
+import urllib.parse
+
+# Package modules
+from artblog.assets import sync_file
+from artblog.manifest import CACHE_FOLDER
+from artblog.template import escape
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Output folders whose images are not resized
+SKIP_FOLDERS = ('site_images',)
+
+IMAGE_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'images')
+
+# Encoder settings, part of the cache key of every resized copy
+QUALITY = {'webp': 80, 'jpeg': 85, 'png': None}
+FILE_EXTENSION = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+PARAMS_VERSION = 2
+
+# Width of the copies as wide as the original, in formats of other sources
+FULL_WIDTH = 'full'
+
+# Displayed image widths, see img.post-image and img in style.css
+CARD_IMAGE_SIZES = '250px'
+BODY_IMAGE_SIZES = '95vw'
+
+IMG_TAG = re.compile(r'<img\s[^>]*>', re.IGNORECASE)
+SRC_ATTR = re.compile(r'\ssrc="([^"]*)"', re.IGNORECASE)
+
+
+def get_image_widths(config):
+    """Return the sorted widths of resized images, empty if disabled."""
+    if 'image_widths' not in config:
+        return []
+    try:
+        widths = sorted({int(w) for w in config['image_widths']})
+    except (TypeError, ValueError):
+        widths = []
+    if not widths or widths[0] <= 0:
+        print('ERROR: image_widths must be a list of positive integers')
+        sys.exit(1)
+    return widths
+
+
+def get_image_cache(config):
+    """Return the folder where resized copies are cached."""
+    if config.get('image_cache'):
+        return os.path.abspath(os.path.expanduser(config['image_cache']))
+    return os.path.join(config['output'], IMAGE_CACHE_FOLDER)
+
+
+def image_formats(relpath):
+    """Return the formats of resized copies, fallback format last."""
+    if relpath.lower().endswith('.png'):
+        # Keep transparency in the fallback
+        return ('webp', 'png')
+    return ('webp', 'jpeg')
+
+
+def full_width_formats(relpath):
+    """Return the formats of copies as wide as the original image."""
+    return [fmt for fmt in image_formats(relpath)[:-1]
+            if not relpath.lower().endswith('.' + FILE_EXTENSION[fmt])]
+
+
+def cache_file(cache_folder, digest, width, fmt):
+    """Return the cache file of a resized copy of an image."""
+    quality = QUALITY[fmt]
+    name = f'{digest}-{width}-q{quality}-v{PARAMS_VERSION}.' \
+        f'{FILE_EXTENSION[fmt]}'
+    return os.path.join(cache_folder, digest[:2], name)
+
+
+def make_variants(task):
+    """Create resized copies of an image, return (size, error message).
+
+    The size is as displayed, e.g. swapped for JPEG photos taken in
+    portrait orientation, and the copies are rotated accordingly.
+    """
+    from PIL import Image, ImageOps
+
+    srcfile, variants = task
+    try:
+        with Image.open(srcfile) as img:
+            img = ImageOps.exif_transpose(img)
+            size = img.size
+            resized_widths = [width for width, _, _ in variants
+                              if width != FULL_WIDTH and width < size[0]]
+            for width, fmt, cachefile in variants:
+                if os.path.isfile(cachefile):
+                    continue
+                if width == FULL_WIDTH:
+                    # Only needed next to smaller copies
+                    if not resized_widths:
+                        continue
+                    resized = img
+                elif width >= size[0]:
+                    continue
+                else:
+                    height = max(1, round(size[1] * width / size[0]))
+                    resized = img.resize((width, height), Image.LANCZOS)
+                if fmt == 'jpeg' and resized.mode != 'RGB':
+                    resized = resized.convert('RGB')
+                elif resized.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                    resized = resized.convert('RGBA')
+
+                os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+                # Unique, as other builds may share the cache
+                tmpfile = f'{cachefile}.{os.getpid()}.tmp'
+                kwargs = {}
+                if QUALITY[fmt] is not None:
+                    kwargs['quality'] = QUALITY[fmt]
+                resized.save(tmpfile, format=fmt.upper(), **kwargs)
+                os.replace(tmpfile, cachefile)
+    except Exception as e:
+        return None, f'{srcfile}: {e}'
+    return list(size), None
+
+
+def generate_image_variants(config, manifest, jobs=1):
+    """Create resized copies of post images, return them by image URL."""
+    widths = get_image_widths(config)
+    if not widths:
+        return {}
+    try:
+        import PIL
+    except ImportError:
+        print('WARN: Install Pillow to create resized images (image_widths)')
+        return {}
+
+    output = config['output']
+    cache_folder = get_image_cache(config)
+    current = manifest['current']
+    previous = manifest['previous']
+
+    # Find images whose resized copies are not all cached yet
+    list_images = []
+    list_tasks = []
+    originals = {v: k for k, v in current['fingerprints'].items()}
+    for output_relpath, digest in sorted(current['assets'].items()):
+        relpath = originals.get(output_relpath, output_relpath)
+        if not relpath.lower().endswith(IMAGE_EXTENSIONS) or \
+                relpath.split(os.sep)[0] in SKIP_FOLDERS:
+            continue
+        size = current['images'].get(digest) or \
+            previous['images'].get(digest)
+        variants = [(w, fmt, cache_file(cache_folder, digest, w, fmt))
+                    for w in widths if size is None or w < size[0]
+                    for fmt in image_formats(relpath)]
+        if variants:
+            variants += [(FULL_WIDTH, fmt,
+                          cache_file(cache_folder, digest, FULL_WIDTH, fmt))
+                         for fmt in full_width_formats(relpath)]
+        list_images.append((relpath, digest))
+        if size is not None and \
+                all(os.path.isfile(v[2]) for v in variants):
+            current['images'][digest] = size
+            continue
+        list_tasks.append((relpath, digest,
+                           (os.path.join(output, output_relpath), variants)))
+
+    # Resize images, in worker processes if requested
+    tasks = [t[2] for t in list_tasks]
+    if jobs == 1 or len(tasks) < 2:
+        results = list(map(make_variants, tasks))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(make_variants, tasks))
+
+    for (relpath, digest, _), (size, error) in zip(list_tasks, results):
+        if error is not None:
+            print(f'WARN: Cannot resize image {error}')
+            continue
+        current['images'][digest] = size
+
+    # Copy resized images next to the originals
+    dct_images = {}
+    for relpath, digest in list_images:
+        size = current['images'].get(digest)
+        if size is None:
+            continue
+        url = '/' + relpath.replace(os.sep, '/')
+        stem = os.path.splitext(relpath)[0]
+        entry = {'width': size[0], 'height': size[1], 'variants': {}}
+        for fmt in image_formats(relpath):
+            entry['variants'][fmt] = []
+            for w in widths:
+                if w >= size[0]:
+                    break
+                dst = f'{stem}-{w}w.{FILE_EXTENSION[fmt]}'
+                sync_file(config, cache_file(cache_folder, digest, w, fmt),
+                          os.path.join(output, dst), manifest)
+                entry['variants'][fmt].append(
+                    (w, '/' + dst.replace(os.sep, '/')))
+
+            # Every format up to the width of the original
+            if not entry['variants'][fmt] or fmt == image_formats(relpath)[-1]:
+                continue
+            if fmt not in full_width_formats(relpath):
+                entry['variants'][fmt].append((size[0], url))
+                continue
+            dst = f'{stem}-{size[0]}w.{FILE_EXTENSION[fmt]}'
+            sync_file(config,
+                      cache_file(cache_folder, digest, FULL_WIDTH, fmt),
+                      os.path.join(output, dst), manifest)
+            entry['variants'][fmt].append(
+                (size[0], '/' + dst.replace(os.sep, '/')))
+        dct_images[url] = entry
+
+    return dct_images
+
+
+def group_images_by_folder(dct_images):
+    """Return the image URLs in every folder and its subfolders."""
+    by_folder = {}
+    for url in dct_images:
+        parts = url.split('/')
+        for i in range(2, len(parts)):
+            folder_url = '/'.join(parts[:i]) + '/'
+            by_folder.setdefault(folder_url, []).append(url)
+    return by_folder
+
+
+def picture_html(tag, url, entry, sizes):
+    """Turn an image tag into a picture with resized sources."""
+    formats = list(entry['variants'])
+    fallback = formats.pop()
+
+    # Original image is the largest fallback
+    srcset = entry['variants'][fallback] + [(entry['width'], url)]
+    srcset = ', '.join(f'{escape(u)} {w}w' for w, u in srcset)
+    tag = re.sub(r'^<img\s', f'<img srcset="{srcset}" sizes="{sizes}" ',
+                 tag, flags=re.IGNORECASE)
+
+    sources = []
+    for fmt in formats:
+        variants = entry['variants'][fmt]
+        if not variants:
+            continue
+        s = ', '.join(f'{escape(u)} {w}w' for w, u in variants)
+        sources.append(f'<source type="image/{fmt}" srcset="{s}" '
+                       f'sizes="{sizes}">')
+
+    return '<picture>' + ''.join(sources) + tag + '</picture>'
+
+
+def img_url(tag, page_url):
+    """Return the root-relative URL of the image of a tag, or None."""
+    src = SRC_ATTR.search(tag)
+    if src is None:
+        return None
+    url = urllib.parse.urljoin(page_url, html.unescape(src.group(1)))
+    return urllib.parse.unquote(urllib.parse.urlsplit(url).path)
+
+
+def rewrite_img_tags(txt, page_url, dct_images, sizes):
+    """Add resized sources to image tags of a page."""
+    def replace(m):
+        tag = m.group(0)
+        url = img_url(tag, page_url)
+        entry = dct_images.get(url) if url is not None else None
+        if entry is None or not any(entry['variants'].values()):
+            return tag
+        return picture_html(tag, url, entry, sizes)
+
+    return IMG_TAG.sub(replace, txt)
@@ -0,0 +1,161 @@
+/* ArtBlog search: loads only the index shards needed by a query. */
+(function () {
+  'use strict';
+
+  var INDEX_URL = '/search/index/';
+  var MAX_RESULTS = 50;
+
+  var form = document.querySelector('form.search-page');
+  var input = document.getElementById('search-query');
+  var status = document.getElementById('search-status');
+  var results = document.getElementById('search-results');
+  var cache = {};
+  var searchId = 0;
+
+  function fetchJson(name) {
+    if (!(name in cache)) {
+      cache[name] = fetch(INDEX_URL + name).then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.status + ' ' + response.url);
+        }
+        return response.json();
+      });
+    }
+    return cache[name];
+  }
+
+  /* Same terms as tokenize() in search.py */
+  function tokenize(query, meta) {
+    var words = query.normalize('NFC').toLowerCase()
+      .match(/[\p{L}\p{N}]+/gu) || [];
+    return words.filter(function (word, i) {
+      return Array.from(word).length >= meta.min_length &&
+        meta.stopwords.indexOf(word) < 0 && words.indexOf(word) === i;
+    });
+  }
+
+  /* Same names as shard_name() in search.py */
+  function shardName(term, meta) {
+    var prefix = Array.from(term).slice(0, meta.prefix_length).join('');
+    if (/^[a-z0-9]+$/.test(prefix)) {
+      return prefix;
+    }
+    return 'x' + Array.from(new TextEncoder().encode(prefix), function (b) {
+      return b.toString(16).padStart(2, '0');
+    }).join('');
+  }
+
+  /* Post ids -> number of words matched as whole terms, for words typed
+     in full or in part */
+  async function findTerm(word, meta) {
+    var found = new Map();
+    var name = shardName(word, meta);
+    if (meta.shards.indexOf(name) < 0) {
+      return found;
+    }
+    var shard = await fetchJson('terms-' + name + '.json');
+    Object.keys(shard).forEach(function (term) {
+      if (term.lastIndexOf(word, 0) !== 0) {
+        return;
+      }
+      var exact = term === word ? 1 : 0;
+      var id = 0;
+      shard[term].forEach(function (delta) {
+        id += delta;
+        found.set(id, Math.max(found.get(id) || 0, exact));
+      });
+    });
+    return found;
+  }
+
+  async function findPosts(query) {
+    var meta = await fetchJson('meta.json');
+    var words = tokenize(query, meta);
+    if (!words.length) {
+      return null;
+    }
+
+    // Posts matching every word, best matches first
+    var matches = await Promise.all(words.map(function (word) {
+      return findTerm(word, meta);
+    }));
+    matches.sort(function (a, b) { return a.size - b.size; });
+    var scores = [];
+    matches[0].forEach(function (exact, id) {
+      var score = exact;
+      for (var i = 1; i < matches.length; i++) {
+        if (!matches[i].has(id)) {
+          return;
+        }
+        score += matches[i].get(id);
+      }
+      scores.push([score, id]);
+    });
+    scores.sort(function (a, b) { return b[0] - a[0] || a[1] - b[1]; });
+
+    var shown = scores.slice(0, MAX_RESULTS);
+    var docs = await Promise.all(shown.map(function (item) {
+      var n = Math.floor(item[1] / meta.docs_per_file);
+      return fetchJson('docs-' + n + '.json').then(function (list) {
+        return list[item[1] % meta.docs_per_file];
+      });
+    }));
+    return {total: scores.length, docs: docs};
+  }
+
+  function showPosts(found) {
+    results.textContent = '';
+    found.docs.forEach(function (doc) {
+      var div = document.createElement('div');
+      div.className = 'column-text';
+      var h3 = document.createElement('h3');
+      h3.className = 'post-title';
+      var a = document.createElement('a');
+      a.href = doc[0];
+      a.textContent = doc[1];
+      h3.appendChild(a);
+      var p = document.createElement('p');
+      p.className = 'post-summary';
+      p.textContent = doc[2];
+      div.appendChild(h3);
+      div.appendChild(p);
+      results.appendChild(div);
+    });
+    status.textContent = found.total === 1 ? '1 post found' :
+      found.total + ' posts found';
+    if (found.total > found.docs.length) {
+      status.textContent += ', showing the best ' + found.docs.length;
+    }
+  }
+
+  async function search() {
+    var id = ++searchId;
+    var query = input.value;
+    try {
+      var found = await findPosts(query);
+      if (id !== searchId) {
+        return;
+      }
+      if (found === null) {
+        results.textContent = '';
+        status.textContent = '';
+      } else {
+        showPosts(found);
+      }
+    } catch (e) {
+      if (id === searchId) {
+        status.textContent = 'Search failed: ' + e.message;
+      }
+    }
+  }
+
+  form.addEventListener('submit', function (event) {
+    event.preventDefault();
+    history.replaceState(null, '', '?q=' + encodeURIComponent(input.value));
+    search();
+  });
+  input.addEventListener('input', search);
+
+  input.value = new URLSearchParams(location.search).get('q') || '';
+  search();
+})();
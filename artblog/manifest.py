@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Build manifest used for incremental builds.
+
+The manifest is stored in the output folder and records the hash of every
+input file, the metadata of every rendered post and the hash of every
+generated output, so that a rebuild only has to touch what changed.
+"""
+# Standard libraries
+import hashlib
+import json
+import os
+
+CACHE_FOLDER = '.artblog'
+MANIFEST_FILE = os.path.join(CACHE_FOLDER, 'manifest.json')
+MANIFEST_VERSION = 7
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# [file key, manifest] of the manifest last saved or loaded, so the builds
+# of a daemon don't parse it again
+_last_manifest = [None, None]
+
+
+def new_manifest():
+    """Return an empty manifest."""
+    return {
+        'version': MANIFEST_VERSION,
+        'site': '',     # hash of config and templates shared by all pages
+        'files': {},    # input path -> [size, mtime_ns, hash]
+        'posts': {},    # post markdown path -> hash of its inputs
+        'assets': {},   # output path (relative) -> hash of source file
+        'pages': {},    # output path (relative) -> hash of generated text
+        'images': {},   # image hash -> [width, height]
+        'dimensions': {},   # image hash -> [width, height] as displayed
+        'placeholders': {},     # image hash -> data URI of placeholder
+        'compressed': {},   # output path -> [hash, formats, compressed paths]
+        'fingerprints': {},  # output path -> content-hashed output path
+        'search': '',   # hash of the posts in the search index
+        }
+
+
+def manifest_key(st):
+    """Return what identifies a version of a manifest file from its stat.
+
+    The file itself (device and inode) rather than its path, so that a
+    process building several sites never mixes up their manifests, while
+    staged builds still find it: the snapshot of a new generation links
+    to the manifest file of the current one (see snapshot_folder()).
+    """
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def load_manifest(output):
+    """Load manifest from the output folder, or return an empty one."""
+    filepath = os.path.join(output, MANIFEST_FILE)
+    try:
+        st = os.stat(filepath)
+        if _last_manifest[0] == manifest_key(st):
+            return _last_manifest[1]
+        with open(filepath, 'rt', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return new_manifest()
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return new_manifest()
+    _last_manifest[:] = [manifest_key(st), manifest]
+    return manifest
+
+
+def save_manifest(output, manifest):
+    """Write manifest to the output folder."""
+    folder = os.path.join(output, CACHE_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    filepath = os.path.join(output, MANIFEST_FILE)
+    tmpfile = filepath + '.tmp'
+    with open(tmpfile, 'wt', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmpfile, filepath)
+    _last_manifest[:] = [manifest_key(os.stat(filepath)), manifest]
+
+
+def start_build(output, incremental, prune=None):
+    """Return build state holding the previous and current manifests.
+
+    With prune (by default if incremental), outputs of the previous
+    manifest that are not generated again are removed by finish_build().
+    """
+    return {
+        'incremental': incremental,
+        'prune': incremental if prune is None else prune,
+        'previous': load_manifest(output),
+        'current': new_manifest(),
+        'stored': {},   # hash -> output file, to store identical files once
+        'terms': {},    # post markdown path -> search terms, if rendered
+        'stats': {'rendered': 0, 'reused': 0, 'copied': 0, 'linked': 0,
+                  'compressed': 0, 'removed': 0,
+                  'minified': 0},   # bytes saved by minifying
+        }
+
+
+def finish_build(output, manifest):
+    """Remove outputs that are no longer generated and save the manifest."""
+    if manifest['prune']:
+        stale = manifest_outputs(manifest['previous']) - \
+            manifest_outputs(manifest['current'])
+        for relpath in sorted(stale):
+            remove_output(output, relpath)
+            manifest['stats']['removed'] += 1
+
+    save_manifest(output, manifest['current'])
+
+
+def manifest_outputs(manifest):
+    """Return the set of output paths recorded in a manifest."""
+    outputs = set(manifest['assets']) | set(manifest['pages'])
+    for entry in manifest['compressed'].values():
+        outputs.update(entry[2])
+    return outputs
+
+
+def remove_output(output, relpath):
+    """Remove a generated file and any folders left empty by it."""
+    filepath = os.path.join(output, relpath)
+    if os.path.isfile(filepath):
+        os.remove(filepath)
+
+    folder = os.path.dirname(filepath)
+    while os.path.abspath(folder) != os.path.abspath(output):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break
+        folder = os.path.dirname(folder)
+
+
+def hash_text(txt):
+    """Return the hash of a string."""
+    return hashlib.sha256(txt.encode('utf-8')).hexdigest()
+
+
+def hash_file(filepath, manifest):
+    """Return the hash of a file, reusing the previous one if unmodified."""
+    st = os.stat(filepath)
+    key = os.path.abspath(filepath)
+    entry = manifest['current']['files'].get(key)
+    if entry is None:
+        entry = manifest['previous']['files'].get(key)
+    if entry is not None and entry[:2] == [st.st_size, st.st_mtime_ns]:
+        manifest['current']['files'][key] = entry
+        return entry[2]
+
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    manifest['current']['files'][key] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
+
+
+def is_unchanged(output, relpath, digest, manifest, section):
+    """Return True if an output exists and was built from the same input."""
+    if not manifest['incremental']:
+        return False
+    if manifest['previous'][section].get(relpath) != digest:
+        return False
+    return os.path.isfile(os.path.join(output, relpath))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Persistent index of post metadata.
+
+The index is a SQLite database in the output's cache folder with the front
+matter of every post, keyed by source path. An entry is only refreshed when
+the size or modification time of its post changes, and then only the front
+matter is read, not the post body. Category pages and other listings are
+generated from the index.
+
+Builds keep the metadata of each post as a PostRecord, with only the
+fields the listings, sitemap, feed and search index use, so the memory
+they take stays small for large sites.
+
+Usage: artblog index config.yml
+"""
+# Standard libraries
+import argparse
+from collections import OrderedDict
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+# Package modules
+from artblog.frontmatter import parse_front_matter, read_front_matter
+from artblog.manifest import CACHE_FOLDER
+
+INDEX_FILE = os.path.join(CACHE_FOLDER, 'metadata.sqlite')
+INDEX_VERSION = 1
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS posts (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    meta TEXT NOT NULL
+)
+'''
+
+EXPORT_FORMATS = ('table', 'json', 'csv')
+
+# Columns of the table and csv formats
+EXPORT_COLUMNS = ('slug', 'category', 'title', 'tags', 'source')
+
+
+class PostRecord:
+    """Metadata of a post used by the listings, read like a dict.
+
+    A field missing from the front matter is None and not "in" the
+    record. sort_value holds the value of the sort_posts_by key, if any.
+    """
+    __slots__ = ('slug', 'title', 'category', 'summary', 'image', 'tags',
+                 'date', 'canonical', 'source', 'mtime', 'sort_value')
+
+    def __init__(self, meta, sort_key=None):
+        for name in self.__slots__[:-1]:
+            setattr(self, name, meta.get(name))
+        self.sort_value = meta.get(sort_key) if sort_key else None
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+
+def post_slug(filepath):
+    """Return the root-relative URL of a post."""
+    post_folder = os.path.split(filepath)[0]
+    post_folder = os.path.split(post_folder)[1]
+    return 'posts/' + post_folder + '/'
+
+
+def post_outfile(output, slug):
+    """Return the generated page of a post."""
+    return os.path.join(output, slug.strip('/'), 'index.html')
+
+
+def open_index(output):
+    """Open the index database in the output folder."""
+    folder = os.path.join(output, CACHE_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    db = sqlite3.connect(os.path.join(output, INDEX_FILE))
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    if version != INDEX_VERSION:
+        db.execute('DROP TABLE IF EXISTS posts')
+        db.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+    db.execute(INDEX_SCHEMA)
+    return db
+
+
+def update_metadata_index(config, list_markdown, records=False):
+    """Update the index, return (metadata by slug, error messages).
+
+    Metadata are in the order of list_markdown and include the slug,
+    canonical URL, source file and its modification time. With records,
+    they are PostRecord instead of dicts.
+    """
+    sort_key = config.get('sort_posts_by')
+    db = open_index(config['output'])
+    dct_rows = {path: (size, mtime_ns, meta) for path, size, mtime_ns, meta
+                in db.execute('SELECT path, size, mtime_ns, meta FROM posts')}
+
+    dct_meta = OrderedDict()
+    list_errors = []
+    list_updates = []
+    seen = set()
+    for filepath in list_markdown:
+        key = os.path.abspath(filepath)
+        seen.add(key)
+        st = os.stat(filepath)
+        row = dct_rows.get(key)
+        if row is not None and row[:2] == (st.st_size, st.st_mtime_ns):
+            meta = json.loads(row[2])
+        else:
+            try:
+                meta = parse_front_matter(read_front_matter(filepath))
+            except Exception as e:
+                list_errors.append(f'{filepath}: {e}')
+                continue
+            list_updates.append(
+                (key, st.st_size, st.st_mtime_ns, json.dumps(meta)))
+
+        meta['slug'] = post_slug(filepath)
+        if 'canonical' not in meta:
+            meta['canonical'] = config['base_url'] + '/' + meta['slug']
+        meta['source'] = key
+        meta['mtime'] = st.st_mtime
+        if records:
+            meta = PostRecord(meta, sort_key)
+        dct_meta[meta['slug']] = meta
+
+    with db:
+        db.executemany('INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?)',
+                       list_updates)
+        db.executemany('DELETE FROM posts WHERE path = ?',
+                       [(k,) for k in dct_rows if k not in seen])
+    db.close()
+
+    return dct_meta, list_errors
+
+
+def export_index(dct_meta, fmt, f):
+    """Write the metadata index to an open file."""
+    if fmt == 'json':
+        json.dump(list(dct_meta.values()), f, indent=2)
+        f.write('\n')
+        return
+
+    rows = [[str(meta.get(k, '')) for k in EXPORT_COLUMNS]
+            for meta in dct_meta.values()]
+    if fmt == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(rows)
+        return
+
+    widths = [max([len(k)] + [len(row[i]) for row in rows])
+              for i, k in enumerate(EXPORT_COLUMNS)]
+    for row in [list(EXPORT_COLUMNS)] + rows:
+        line = '  '.join(s.ljust(w) for s, w in zip(row, widths))
+        f.write(line.rstrip() + '\n')
+
+
+def get_user_inputs(argv):
+    """Get user arguments of the index command."""
+    from artblog.artblog import CMDLINE_APP_NAME
+
+    parser = argparse.ArgumentParser(
+        prog='artblog index',
+        description=f'{CMDLINE_APP_NAME} - update and print the post '
+                    'metadata index',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('config_yml', help='YAML configuration file')
+    parser.add_argument('--format', '-f',
+                        choices=EXPORT_FORMATS, default='table',
+                        help='output format')
+    parser.add_argument('--output', '-o',
+                        help='file to write to instead of the console')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    from artblog.artblog import find_posts, load_config
+
+    args = get_user_inputs(argv)
+    config = load_config(args.config_yml)
+    dct_meta, list_errors = update_metadata_index(config, find_posts(config))
+    for error in list_errors:
+        print(f'WARN: {error}', file=sys.stderr)
+
+    if args.output is None:
+        export_index(dct_meta, args.format, sys.stdout)
+    else:
+        with open(args.output, 'wt', encoding='utf-8', newline='') as f:
+            export_index(dct_meta, args.format, f)
+        print(f'{len(dct_meta)} posts written to {args.output}')
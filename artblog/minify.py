@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Minification of generated HTML and CSS.
+
+When "minify" is enabled in the config, pages are written without
+comments and indentation, and the stylesheet without comments and
+unneeded whitespace. The minifiers are generators of output pieces,
+written to the file as they are produced, so no minified copy of a page
+is built in memory. Only changes that don't affect rendering are made:
+
+- HTML: whitespace runs between and in text become one space or newline,
+  and comments are removed. <pre>, <code>, <textarea>, <script> and
+  <style> elements, and tags themselves, are kept as they are.
+- CSS: comments are removed, whitespace runs become one space, and
+  whitespace around { } ; , and > is removed. Strings are kept.
+"""
+# Standard libraries
+import os
+import re
+import sys
+
+# Package modules
+from artblog.manifest import hash_text
+
+# Part of the hash of minified outputs, change when output changes
+MINIFY_VERSION = '1'
+
+HTML_TOKEN = re.compile(
+    r'<!--.*?-->'
+    r'|<(pre|code|textarea|script|style)\b[^>]*>.*?</\1\s*>'
+    r'|<[^>]*>'
+    r'|[^<]+'
+    r'|<',
+    re.DOTALL | re.IGNORECASE)
+
+# Whitespace as defined by HTML, other spaces (e.g. &nbsp;) are content
+HTML_WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+
+CSS_TOKEN = re.compile(
+    r'/\*.*?\*/'
+    r'|"(?:\\.|[^"\\])*"'
+    r"|'(?:\\.|[^'\\])*'"
+    r'|[ \t\n\r\f]+'
+    r'|[{};,>]'
+    r'|[^ \t\n\r\f{};,>"\'/]+'
+    r'|.',
+    re.DOTALL)
+
+# Whitespace around these is removed
+CSS_PUNCTUATION = set('{};,>')
+
+
+def get_minify(config):
+    """Return True if HTML and CSS outputs are minified."""
+    value = config.get('minify', 'false')
+    if value not in ('true', 'false'):
+        print('ERROR: minify must be true or false')
+        sys.exit(1)
+    return value == 'true'
+
+
+def minify_html(txt):
+    """Yield minified pieces of HTML, return the bytes saved."""
+    saved = 0
+    for m in HTML_TOKEN.finditer(txt):
+        token = m.group(0)
+        if token.startswith('<!--') and not token.startswith('<!--['):
+            # Comment, other than conditional comments
+            saved += len(token.encode('utf-8'))
+            continue
+        if token[0] != '<':
+            # Text: keep a newline if the whitespace had one
+            minified = HTML_WHITESPACE.sub(
+                lambda w: '\n' if '\n' in w.group(0) else ' ', token)
+            saved += len(token) - len(minified)
+            token = minified
+        yield token
+    return saved
+
+
+def minify_css(txt):
+    """Yield minified pieces of CSS, return the bytes saved."""
+    saved = 0
+    space = False   # whitespace seen since the last piece
+    previous = '{'  # last piece, as if at the start of a block
+    for m in CSS_TOKEN.finditer(txt):
+        token = m.group(0)
+        if token.startswith('/*'):
+            saved += len(token.encode('utf-8'))
+            continue
+        if token[0] in ' \t\n\r\f':
+            space = True
+            saved += len(token)
+            continue
+        if space:
+            space = False
+            if token not in CSS_PUNCTUATION and \
+                    previous not in CSS_PUNCTUATION:
+                saved -= 1
+                yield ' '
+        previous = token
+        yield token
+    return saved
+
+
+# Minifier of each output file type
+MINIFIERS = {
+    '.html': minify_html,
+    '.css': minify_css,
+    }
+
+
+def get_minifier(config, filepath):
+    """Return the minifier of an output file, or None."""
+    if not get_minify(config):
+        return None
+    return MINIFIERS.get(os.path.splitext(filepath)[1].lower())
+
+
+def output_digest(digest, minifier):
+    """Return the hash of an output from the hash of its text."""
+    if minifier is None:
+        return digest
+    return hash_text(f'{digest}-min{MINIFY_VERSION}')
+
+
+def write_minified(f, txt, minifier):
+    """Write to an open file, minified if requested, return bytes saved."""
+    if minifier is None:
+        f.write(txt)
+        return 0
+    pieces = minifier(txt)
+    while True:
+        try:
+            f.write(next(pieces))
+        except StopIteration as e:
+            return e.value
+
+
+def write_output(filepath, txt, minifier):
+    """Write text to a file, minified if requested, return bytes saved.
+
+    The file is written under a temporary name and then renamed, so an
+    output hardlinked to another build generation is never modified.
+    """
+    tmpfile = filepath + '.artblog-tmp'
+    with open(tmpfile, 'wt', encoding='utf-8') as f:
+        saved = write_minified(f, txt, minifier)
+    os.replace(tmpfile, filepath)
+    return saved
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Markdown renderers that posts and the main page can be converted with.
+
+"markdown_renderer" in the config selects one of:
+
+- mistune (default): mistune.html, with tables, footnotes and
+  strikethrough
+- markdown: Python-Markdown, with tables, footnotes and fenced code
+- markdown-it: markdown-it-py (CommonMark), with tables and strikethrough
+- mistletoe: mistletoe (CommonMark), with tables
+- cmark-gfm: cmarkgfm, the C library of GitHub Flavored Markdown
+
+All of them pass raw HTML in posts through. Other renderers than mistune
+must be installed separately, e.g. python -m pip install markdown-it-py.
+They don't give exactly the same HTML for every post, compare them on
+the posts of a site with benchmarks/bench_markdown.py before switching.
+"""
+# Standard libraries
+import importlib.util
+import sys
+
+DEFAULT_RENDERER = 'mistune'
+
+
+def make_mistune():
+    """Return the mistune renderer."""
+    import mistune
+    return mistune.html
+
+
+def make_python_markdown():
+    """Return the Python-Markdown renderer."""
+    import markdown
+    md = markdown.Markdown(extensions=['tables', 'footnotes', 'fenced_code'])
+
+    def render(txt):
+        md.reset()
+        return md.convert(txt) + '\n'
+    return render
+
+
+def make_markdown_it():
+    """Return the markdown-it-py renderer."""
+    from markdown_it import MarkdownIt
+    md = MarkdownIt('commonmark', {'html': True})
+    md.enable(['table', 'strikethrough'])
+    return md.render
+
+
+def make_mistletoe():
+    """Return the mistletoe renderer."""
+    import mistletoe
+    return mistletoe.markdown
+
+
+def make_cmark_gfm():
+    """Return the cmarkgfm renderer."""
+    import cmarkgfm
+    from cmarkgfm.cmark import Options
+
+    def render(txt):
+        return cmarkgfm.github_flavored_markdown_to_html(
+            txt, options=Options.CMARK_OPT_UNSAFE)
+    return render
+
+
+# Name -> (module, package to install, function returning the renderer)
+RENDERERS = {
+    'mistune': ('mistune', 'mistune', make_mistune),
+    'markdown': ('markdown', 'Markdown', make_python_markdown),
+    'markdown-it': ('markdown_it', 'markdown-it-py', make_markdown_it),
+    'mistletoe': ('mistletoe', 'mistletoe', make_mistletoe),
+    'cmark-gfm': ('cmarkgfm', 'cmarkgfm', make_cmark_gfm),
+    }
+
+# Renderers made in this process, by name
+_renderers = {}
+
+
+def is_installed(name):
+    """Return True if the module of a renderer can be imported."""
+    return importlib.util.find_spec(RENDERERS[name][0]) is not None
+
+
+def available_renderers():
+    """Return the names of the installed renderers."""
+    return [name for name in RENDERERS if is_installed(name)]
+
+
+def get_markdown_renderer(config):
+    """Return the name of the markdown renderer of the site."""
+    name = config.get('markdown_renderer', DEFAULT_RENDERER)
+    if name not in RENDERERS:
+        print('ERROR: markdown_renderer must be one of ' +
+              ', '.join(RENDERERS))
+        sys.exit(1)
+    if not is_installed(name):
+        print(f'ERROR: Install {RENDERERS[name][1]} to render markdown with '
+              f'{name}: python -m pip install {RENDERERS[name][1]}')
+        sys.exit(1)
+    return name
+
+
+def render_markdown(txt, renderer=DEFAULT_RENDERER):
+    """Return the HTML of markdown text."""
+    render = _renderers.get(renderer)
+    if render is None:
+        render = _renderers[renderer] = RENDERERS[renderer][2]()
+    return render(txt)
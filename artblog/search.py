@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""Client-side search of the posts.
+
+When "search" is enabled in the config, the title, summary, tags and body
+text of every post are split into terms, and an inverted index (term ->
+posts) is written to the output as static JSON files:
+
+- search/index/meta.json: number of posts, shard names and stopwords
+- search/index/terms-<prefix>.json: terms starting with a two-character
+  prefix, each with the ids of its posts, delta encoded
+- search/index/docs-<n>.json: URL, title and summary of 1000 posts
+
+The search page (search/index.html) and its script (search/search.js)
+fetch meta.json, then only the term shards of the words typed and the
+post shards of the results shown, so a search loads little of the index
+even for large sites.
+
+Terms of the posts rendered in a build are collected by the post workers
+and cached by post hash in the output's cache folder, so unchanged posts
+are not read again. The index is only rewritten when a post changed.
+"""
+# Standard libraries
+from array import array
+from collections import defaultdict
+import html
+from itertools import chain
+import json
+import os
+import re
+import sqlite3
+import sys
+import unicodedata
+import zlib
+
+# Package modules
+from artblog.manifest import CACHE_FOLDER, hash_text, is_unchanged
+from artblog.metaindex import post_outfile
+
+SEARCH_FOLDER = 'search'
+INDEX_FOLDER = os.path.join(SEARCH_FOLDER, 'index')
+SEARCH_SCRIPT = os.path.join(SEARCH_FOLDER, 'search.js')
+
+# Part of the hash of the index, change when its format changes
+SEARCH_VERSION = '1'
+
+TERMS_FILE = os.path.join(CACHE_FOLDER, 'search.sqlite')
+TERMS_VERSION = 1
+
+TERMS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS terms (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    terms BLOB NOT NULL
+)
+'''
+
+# Terms are sharded by their first characters
+PREFIX_LENGTH = 2
+
+# Shorter terms are not indexed, longer ones are mostly noise (hashes, etc.)
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 32
+
+# Posts per docs-<n>.json file
+DOCS_PER_FILE = 1000
+
+# Letters and digits, the same as [\p{L}\p{N}]+ in search.js
+TOKEN = re.compile(r'[^\W_]+')
+TAG = re.compile(r'<[^>]*>')
+MAIN = re.compile(r'<main>(.*)</main>', re.DOTALL)
+SHARD_NAME = re.compile(r'[a-z0-9]+')
+
+# Words too common to find anything with
+STOPWORDS = frozenset('''
+a about after all also am an and any are as at be because been before
+being but by can could did do does doing down during each for from had
+has have having he her here hers him his how i if in into is it its just
+me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their theirs them
+then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your
+yours
+'''.split())
+
+SEARCH_FORM = '''
+<li class="search">
+  <form action="/search/" role="search">
+    <input type="search" name="q" placeholder="Search" aria-label="Search">
+  </form>
+</li>
+'''.strip()
+
+SEARCH_PAGE = '''
+<h2>Search</h2>
+<form class="search-page" action="/search/" role="search">
+  <input type="search" name="q" id="search-query" placeholder="Search posts"
+         aria-label="Search posts" autofocus>
+</form>
+<p id="search-status"></p>
+<div id="search-results"></div>
+<script src="/search/search.js"></script>
+'''.lstrip()
+
+
+def get_search(config):
+    """Return True if the search index and page are generated."""
+    value = config.get('search', 'false')
+    if value not in ('true', 'false'):
+        print('ERROR: search must be true or false')
+        sys.exit(1)
+    return value == 'true'
+
+
+def tokenize(txt):
+    """Return the indexed terms of a text."""
+    txt = unicodedata.normalize('NFC', txt).lower()
+    return {term for term in TOKEN.findall(txt)
+            if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH and
+            term not in STOPWORDS}
+
+
+def post_terms(meta, content_html):
+    """Return the sorted terms of a post from its metadata and HTML."""
+    body = html.unescape(TAG.sub(' ', content_html))
+    txt = ' '.join([meta.get('title', ''), meta.get('summary', ''),
+                    meta.get('tags', ''), body])
+    return sorted(tokenize(txt))
+
+
+def shard_name(term):
+    """Return the name of the shard of a term, as computed by search.js."""
+    prefix = term[:PREFIX_LENGTH]
+    if SHARD_NAME.fullmatch(prefix):
+        return prefix
+    return 'x' + prefix.encode('utf-8').hex()
+
+
+def open_terms_cache(output):
+    """Open the cache of post terms in the output folder."""
+    folder = os.path.join(output, CACHE_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    db = sqlite3.connect(os.path.join(output, TERMS_FILE))
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    if version != TERMS_VERSION:
+        db.execute('DROP TABLE IF EXISTS terms')
+        db.execute(f'PRAGMA user_version = {TERMS_VERSION}')
+    db.execute(TERMS_SCHEMA)
+    return db
+
+
+def read_output_terms(meta, outfile):
+    """Return the terms of a post from its generated page."""
+    with open(outfile, 'rt', encoding='utf-8') as f:
+        m = MAIN.search(f.read())
+    return post_terms(meta, m.group(1) if m else '')
+
+
+def collect_terms(config, dct_meta, manifest):
+    """Return the terms of every post, in the order of dct_meta.
+
+    Terms come from the posts rendered in this build, else the cache,
+    else the generated page of the post.
+    """
+    posts = manifest['current']['posts']
+    db = open_terms_cache(config['output'])
+    dct_rows = {path: (digest, blob) for path, digest, blob
+                in db.execute('SELECT path, hash, terms FROM terms')}
+
+    list_terms = []
+    list_updates = []
+    for meta in dct_meta.values():
+        key = meta['source']
+        digest = posts[key]
+        terms = manifest['terms'].get(key)
+        row = dct_rows.get(key)
+        if row is not None and row[0] == digest:
+            if terms is None:
+                terms = zlib.decompress(row[1]).decode('utf-8').split()
+        else:
+            if terms is None:
+                terms = read_output_terms(
+                    meta, post_outfile(config['output'], meta['slug']))
+            blob = zlib.compress(' '.join(terms).encode('utf-8'))
+            list_updates.append((key, digest, blob))
+        list_terms.append(terms)
+
+    seen = {meta['source'] for meta in dct_meta.values()}
+    with db:
+        db.executemany('INSERT OR REPLACE INTO terms VALUES (?, ?, ?)',
+                       list_updates)
+        db.executemany('DELETE FROM terms WHERE path = ?',
+                       [(k,) for k in dct_rows if k not in seen])
+    db.close()
+
+    return list_terms
+
+
+def index_digest(dct_meta, manifest):
+    """Return the hash of everything the index is generated from."""
+    posts = manifest['current']['posts']
+    return hash_text(SEARCH_VERSION + repr(
+        [(meta['slug'], posts[meta['source']])
+         for meta in dct_meta.values()]))
+
+
+def reuse_index(config, digest, manifest):
+    """Keep the index of the previous build if generated from the same."""
+    previous = manifest['previous']
+    if not manifest['incremental'] or previous.get('search') != digest:
+        return False
+
+    folder = INDEX_FOLDER + os.sep
+    dct_pages = {relpath: page_digest
+                 for relpath, page_digest in previous['pages'].items()
+                 if relpath.startswith(folder)}
+    if not all(is_unchanged(config['output'], relpath, page_digest,
+                            manifest, 'pages')
+               for relpath, page_digest in dct_pages.items()):
+        return False
+    manifest['current']['pages'].update(dct_pages)
+    return True
+
+
+def index_files(dct_meta, list_terms):
+    """Return the text of every index file by its output path."""
+    # Posts are numbered in order, so the postings are sorted
+    postings = defaultdict(lambda: array('I'))
+    for doc_id, terms in enumerate(list_terms):
+        for term in terms:
+            postings[term].append(doc_id)
+
+    shards = defaultdict(dict)
+    for term in sorted(postings):
+        doc_ids = postings.pop(term)
+        shards[shard_name(term)][term] = [
+            doc_id - previous for previous, doc_id
+            in zip(chain((0,), doc_ids), doc_ids)]
+
+    def dump(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    dct_files = {}
+    for name, shard in shards.items():
+        dct_files[os.path.join(INDEX_FOLDER, f'terms-{name}.json')] = \
+            dump(shard)
+
+    list_docs = [['/' + meta['slug'], meta.get('title', ''),
+                  meta.get('summary', '')] for meta in dct_meta.values()]
+    for n, i in enumerate(range(0, len(list_docs), DOCS_PER_FILE)):
+        dct_files[os.path.join(INDEX_FOLDER, f'docs-{n}.json')] = \
+            dump(list_docs[i:i+DOCS_PER_FILE])
+
+    dct_files[os.path.join(INDEX_FOLDER, 'meta.json')] = dump({
+        'version': SEARCH_VERSION,
+        'docs': len(list_docs),
+        'docs_per_file': DOCS_PER_FILE,
+        'prefix_length': PREFIX_LENGTH,
+        'min_length': MIN_TERM_LENGTH,
+        'shards': sorted(shards),
+        'stopwords': sorted(STOPWORDS),
+        })
+    return dct_files
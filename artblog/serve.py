@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Preview server that rebuilds the site whenever its inputs change.
+
+Usage: artblog serve config.yml
+
+The watched inputs are the post sources, the main page folder, the logo,
+the favicon, the config file and the package templates. File system events
+from the optional "watchdog" package are used when it is installed,
+otherwise the inputs are polled for changes in size or modification time.
+Each rebuild is incremental, so only the affected pages are regenerated.
+"""
+# Standard libraries
+import argparse
+from collections import OrderedDict
+import email.utils
+import gzip
+import http.server
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+# Package modules
+from artblog.artblog import (CMDLINE_APP_NAME, CONFIG_TEMPLATE,
+                             DATA_CSS_STYLE, DATA_HTML_BASE,
+                             DATA_HTML_LICENSE, DATA_JS_SEARCH,
+                             add_build_arguments,
+                             build_site, check_build_arguments, load_config,
+                             package_data_file)
+from artblog.discovery import PRUNED_FOLDERS
+
+POLL_INTERVAL = 0.5  # seconds between two scans of the inputs
+SETTLE_TIME = 0.1    # seconds to wait for more changes before rebuilding
+
+# Compress responses of these content types when the client accepts gzip
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/xml', 'application/atom+xml',
+                      'image/svg+xml')
+MIN_COMPRESS_SIZE = 256
+
+# Watchdog events of changes, "closed" is a file closed after writing.
+# Files opened and read, e.g. by the builds, are not changes.
+CHANGE_EVENTS = frozenset(('created', 'modified', 'deleted', 'moved',
+                           'closed'))
+
+# Bytes of gzip compressed files kept in memory by the preview server
+GZIP_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def get_user_inputs(argv):
+    """Get user arguments of the serve command."""
+    parser = argparse.ArgumentParser(
+        prog='artblog serve',
+        description=f'{CMDLINE_APP_NAME} - preview server',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    add_build_arguments(parser)
+    parser.add_argument('--bind', '-b',
+                        default='127.0.0.1',
+                        help='address the server listens on')
+    parser.add_argument('--port',
+                        type=int, default=8000,
+                        help='port the server listens on')
+    args = parser.parse_args(argv)
+    check_build_arguments(args)
+
+    # Every rebuild after the first one only touches what changed
+    args.incremental = True
+    return args
+
+
+def watched_paths(config_yml, config):
+    """Return the files and folders that are inputs of the site."""
+    paths = [config_yml, config['mainpage_folder']] + config['sources']
+    for k in ('logo', 'favicon'):
+        if k in config:
+            paths.append(config[k])
+    for filepath in (DATA_HTML_BASE, DATA_HTML_LICENSE, DATA_CSS_STYLE,
+                     DATA_JS_SEARCH, CONFIG_TEMPLATE):
+        paths.append(package_data_file(filepath))
+    return [os.path.abspath(path) for path in paths]
+
+
+def snapshot(paths):
+    """Return size and modification time of every file below the paths."""
+    state = {}
+    stack = list(paths)
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in PRUNED_FOLDERS:
+                            stack.append(entry.path)
+                    else:
+                        st = entry.stat()
+                        state[entry.path] = (st.st_size, st.st_mtime_ns)
+        except NotADirectoryError:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state[path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            continue
+    return state
+
+
+def poll_for_changes(get_paths, changed, stop):
+    """Set the changed event whenever a watched file changes."""
+    previous = snapshot(get_paths())
+    while not stop.wait(POLL_INTERVAL):
+        current = snapshot(get_paths())
+        if current != previous:
+            previous = current
+            changed.set()
+
+
+def is_input_change(event, output):
+    """Return True if a watchdog event changes an input of the site.
+
+    output is the real path of the output folder, written by the builds.
+    """
+    if event.event_type not in CHANGE_EVENTS:
+        return False
+    # Changes of its files are reported too
+    if event.is_directory and event.event_type == 'modified':
+        return False
+    paths = [str(event.src_path)]
+    if getattr(event, 'dest_path', ''):
+        paths.append(str(event.dest_path))
+    for path in paths:
+        # Changes in .git etc. (e.g. a commit) are not site inputs
+        if set(path.split(os.sep)[:-1]) & PRUNED_FOLDERS:
+            continue
+        path = os.path.realpath(path)
+        if path != output and not path.startswith(output + os.sep):
+            return True
+    return False
+
+
+def start_watching(get_paths, changed, stop, get_output):
+    """Start watching the inputs, return a function updating the paths.
+
+    get_output returns the real path of the output folder, whose changes
+    are ignored.
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        print('Watching for changes by polling '
+              '(install "watchdog" to use file system events)')
+        thread = threading.Thread(
+            target=poll_for_changes, args=(get_paths, changed, stop),
+            daemon=True)
+        thread.start()
+        return lambda: None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if is_input_change(event, get_output()):
+                changed.set()
+
+    observer = Observer()
+    handler = Handler()
+
+    def schedule():
+        observer.unschedule_all()
+        for path in get_paths():
+            if os.path.isdir(path):
+                observer.schedule(handler, path, recursive=True)
+            elif os.path.exists(path):
+                # Files are watched through their folder
+                observer.schedule(handler, os.path.dirname(path))
+
+    schedule()
+    observer.daemon = True
+    observer.start()
+    return schedule
+
+
+class PreviewRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve the output folder with gzip and conditional GET."""
+
+    # path -> (size, mtime, gzip compressed content), least recently used
+    # first, shared by the request threads
+    gzip_cache = OrderedDict()
+    gzip_cache_bytes = 0
+    gzip_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def gzip_body(self, path, st, f):
+        """Return the gzip compressed content of an open file."""
+        cls = PreviewRequestHandler
+        with cls.gzip_lock:
+            entry = cls.gzip_cache.get(path)
+            if entry is not None and entry[:2] == (st.st_size,
+                                                   st.st_mtime_ns):
+                cls.gzip_cache.move_to_end(path)
+                return entry[2]
+
+        body = gzip.compress(f.read(), compresslevel=6)
+        with cls.gzip_lock:
+            # Replaces the content of an older version of the file
+            old = cls.gzip_cache.pop(path, None)
+            if old is not None:
+                cls.gzip_cache_bytes -= len(old[2])
+            cls.gzip_cache[path] = (st.st_size, st.st_mtime_ns, body)
+            cls.gzip_cache_bytes += len(body)
+            while cls.gzip_cache_bytes > GZIP_CACHE_BYTES:
+                _, (_, _, dropped) = cls.gzip_cache.popitem(last=False)
+                cls.gzip_cache_bytes -= len(dropped)
+        return body
+
+    def send_head(self):
+        """Send headers of a file, return the file to send or None."""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            parts = urllib.parse.urlsplit(self.path)
+            if not parts.path.endswith('/'):
+                self.send_response(http.HTTPStatus.MOVED_PERMANENTLY)
+                new_parts = (parts[0], parts[1], parts[2] + '/',
+                             parts[3], parts[4])
+                self.send_header('Location',
+                                 urllib.parse.urlunsplit(new_parts))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            path = os.path.join(path, 'index.html')
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(http.HTTPStatus.NOT_FOUND, 'File not found')
+            return None
+
+        with f:
+            st = os.fstat(f.fileno())
+            ctype = self.guess_type(path)
+            use_gzip = (
+                'gzip' in self.headers.get('Accept-Encoding', '') and
+                ctype.startswith(COMPRESSIBLE_TYPES) and
+                st.st_size >= MIN_COMPRESS_SIZE)
+            etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}' + \
+                ('-gz"' if use_gzip else '"')
+            last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+
+            if self.is_not_modified(etag, st.st_mtime):
+                self.send_response(http.HTTPStatus.NOT_MODIFIED)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return None
+
+            if use_gzip:
+                body = self.gzip_body(path, st, f)
+            else:
+                body = f.read()
+
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        return body
+
+    def is_not_modified(self, etag, mtime):
+        """Return True if the client's cached copy is still valid."""
+        if 'If-None-Match' in self.headers:
+            tags = [s.strip() for s in
+                    self.headers['If-None-Match'].split(',')]
+            return etag in tags or '*' in tags
+
+        if 'If-Modified-Since' in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(
+                    self.headers['If-Modified-Since'])
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since.timestamp()
+
+        return False
+
+    def do_GET(self):
+        body = self.send_head()
+        if body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_head()
+
+
+def rebuild(config_yml, args):
+    """Rebuild the site, return the config or None if the build failed."""
+    start = time.perf_counter()
+    try:
+        config = load_config(config_yml)
+        build_site(config, args)
+    except SystemExit:
+        print('ERROR: Build failed, waiting for changes')
+        return None
+    except Exception as e:
+        print(f'ERROR: {e}')
+        print('ERROR: Build failed, waiting for changes')
+        return None
+    print(f'Rebuilt in {time.perf_counter() - start:.2f} s')
+    return config
+
+
+def main(argv):
+    args = get_user_inputs(argv)
+    config_yml = os.path.abspath(args.config_yml)
+
+    config = rebuild(config_yml, args)
+    if config is None:
+        sys.exit(1)
+    state = {'paths': watched_paths(config_yml, config),
+             'output': os.path.realpath(config['output'])}
+
+    changed = threading.Event()
+    stop = threading.Event()
+    reschedule = start_watching(lambda: state['paths'], changed, stop,
+                                lambda: state['output'])
+
+    handler = lambda *a, **kw: PreviewRequestHandler(
+        *a, directory=config['output'], **kw)
+    server = http.server.ThreadingHTTPServer((args.bind, args.port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f'Serving {config["output"]} at http://{args.bind}:{args.port}/ '
+          f'(Ctrl+C to stop)')
+
+    try:
+        while True:
+            changed.wait()
+            # Let editors finish writing before rebuilding
+            time.sleep(SETTLE_TIME)
+            changed.clear()
+            new_config = rebuild(config_yml, args)
+            if new_config is not None:
+                state['paths'] = watched_paths(config_yml, new_config)
+                state['output'] = os.path.realpath(new_config['output'])
+                reschedule()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.shutdown()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Page weight report of the generated site, checked against budgets.
+
+With --size_report, every HTML page of the output is weighed once the
+site is built: the page itself, plus every local image (the "src" of
+image tags, i.e. the largest copy a browser downloads, and icons) and
+stylesheet it refers to, each counted once per page. Files on other
+sites, such as web fonts, are not counted. The report lists the heaviest
+pages, images and categories (a category weighs its listing pages and
+posts) and is written as JSON.
+
+"page_budget" and "image_budget" in the config set the largest weight of
+a page and size of an image, in kB (1024 bytes). Pages and images over
+budget are listed in the report, and with --strict_budgets the build
+exits with status 1, e.g. to fail a CI job. A staged build over budget
+is then not switched to, so it is never served.
+"""
+# Standard libraries
+from datetime import datetime
+import html
+import json
+import os
+import re
+import sys
+import urllib.parse
+
+# Package modules
+from artblog.manifest import CACHE_FOLDER
+
+SIZE_REPORT_FILE = 'artblog-sizes.json'
+REPORT_VERSION = 1
+
+KB = 1024
+
+# Tags referring to images and stylesheets
+RESOURCE_TAG = re.compile(r'<(?:img|link)\s[^>]*>', re.IGNORECASE)
+TAG_ATTR = re.compile(r'\s(src|href|rel)\s*=\s*"([^"]*)"', re.IGNORECASE)
+
+# Largest pages over budget printed after the build
+PRINTED_OVER_BUDGET = 10
+
+
+def get_size_budget(config, key):
+    """Return a budget of the config in bytes, None if not set."""
+    if key not in config:
+        return None
+    try:
+        budget = float(config[key])
+    except (TypeError, ValueError):
+        budget = 0
+    if budget <= 0:
+        print(f'ERROR: {key} must be a positive number of kB')
+        sys.exit(1)
+    return int(budget * KB)
+
+
+def get_size_budgets(config):
+    """Return (page budget, image budget) in bytes, None if not set."""
+    return (get_size_budget(config, 'page_budget'),
+            get_size_budget(config, 'image_budget'))
+
+
+def page_url(relpath):
+    """Return the root-relative URL of an HTML file of the output."""
+    url = '/' + relpath.replace(os.sep, '/')
+    if url.endswith('/index.html'):
+        url = url[:-len('index.html')]
+    return url
+
+
+def page_resources(txt, url):
+    """Return the URLs of the local images and stylesheets of a page."""
+    images = set()
+    stylesheets = set()
+    for m in RESOURCE_TAG.finditer(txt):
+        tag = m.group(0)
+        attrs = {name.lower(): value for name, value in TAG_ATTR.findall(tag)}
+        if tag[1:4].lower() == 'img':
+            target = images
+            value = attrs.get('src')
+        else:
+            rel = attrs.get('rel', '').lower().split()
+            if 'stylesheet' in rel:
+                target = stylesheets
+            elif 'icon' in rel:
+                target = images
+            else:
+                continue
+            value = attrs.get('href')
+        if not value:
+            continue
+        parts = urllib.parse.urlsplit(
+            urllib.parse.urljoin(url, html.unescape(value)))
+        if parts.scheme or parts.netloc:
+            continue
+        target.add(urllib.parse.unquote(parts.path))
+    return images, stylesheets
+
+
+def url_file(output, url):
+    """Return the output file of a root-relative URL."""
+    relpath = url.strip('/')
+    if url.endswith('/'):
+        relpath = os.path.join(relpath, 'index.html')
+    return os.path.join(output, *relpath.split('/'))
+
+
+def weigh_pages(output):
+    """Return the weight of every page and the size of every resource.
+
+    Return ({page URL: entry}, {resource URL: size or None if missing}).
+    """
+    dct_sizes = {}
+
+    def size(url):
+        if url not in dct_sizes:
+            try:
+                dct_sizes[url] = os.path.getsize(url_file(output, url))
+            except OSError:
+                dct_sizes[url] = None
+        return dct_sizes[url]
+
+    dct_pages = {}
+    for root, folders, files in os.walk(output):
+        if root == output:
+            folders[:] = [s for s in folders if s != CACHE_FOLDER]
+        folders.sort()
+        for name in sorted(files):
+            if not name.endswith('.html'):
+                continue
+            filepath = os.path.join(root, name)
+            url = page_url(os.path.relpath(filepath, output))
+            with open(filepath, 'rt', encoding='utf-8') as f:
+                txt = f.read()
+            images, stylesheets = page_resources(txt, url)
+            image_bytes = sum(size(u) or 0 for u in images)
+            stylesheet_bytes = sum(size(u) or 0 for u in stylesheets)
+            html_bytes = os.path.getsize(filepath)
+            dct_pages[url] = {
+                'url': url,
+                'weight': html_bytes + image_bytes + stylesheet_bytes,
+                'html': html_bytes,
+                'images': image_bytes,
+                'stylesheets': stylesheet_bytes,
+                'image_urls': sorted(images),
+                'stylesheet_urls': sorted(stylesheets),
+                }
+    return dct_pages, dct_sizes
+
+
+def weigh_categories(dct_pages, dct_category_pages, cat2slug):
+    """Return the weight of the listing pages and posts of each category."""
+    list_categories = []
+    for category, slug in cat2slug.items():
+        listings = [page_slug for page_slug in dct_category_pages
+                    if page_slug == slug or
+                    page_slug.startswith(slug + 'page/')]
+        posts = {post_slug for page_slug in listings
+                 for post_slug in dct_category_pages[page_slug]}
+        entries = [dct_pages[url] for url in
+                   ['/' + s for s in listings] + ['/' + s for s in posts]
+                   if url in dct_pages]
+        largest = max(entries, key=lambda e: e['weight'], default=None)
+        list_categories.append({
+            'category': category,
+            'url': '/' + slug,
+            'listing_pages': len(listings),
+            'posts': len(posts),
+            'weight': sum(e['weight'] for e in entries),
+            'largest_page': largest['url'] if largest else None,
+            })
+    list_categories.sort(key=lambda e: e['weight'], reverse=True)
+    return list_categories
+
+
+def make_size_report(config, dct_category_pages, cat2slug, top):
+    """Weigh the pages of the output, return the JSON size report.
+
+    dct_category_pages has the post slugs of every category page, as
+    returned by generate_category_pages().
+    """
+    page_budget, image_budget = get_size_budgets(config)
+    dct_pages, dct_sizes = weigh_pages(config['output'])
+
+    # Pages referring to each image
+    dct_image_pages = {}
+    for entry in dct_pages.values():
+        for url in entry['image_urls']:
+            dct_image_pages[url] = dct_image_pages.get(url, 0) + 1
+    list_images = [{'url': url, 'bytes': dct_sizes[url], 'pages': n}
+                   for url, n in dct_image_pages.items()
+                   if dct_sizes[url] is not None]
+    list_images.sort(key=lambda e: (-e['bytes'], e['url']))
+
+    list_pages = sorted(
+        ({k: v for k, v in entry.items() if not k.endswith('_urls')}
+         for entry in dct_pages.values()),
+        key=lambda e: (-e['weight'], e['url']))
+    stylesheets = {url for entry in dct_pages.values()
+                   for url in entry['stylesheet_urls']}
+    missing = sorted(url for url, size in dct_sizes.items() if size is None)
+
+    over_pages = [e for e in list_pages
+                  if page_budget is not None and e['weight'] > page_budget]
+    over_images = [e for e in list_images
+                   if image_budget is not None and e['bytes'] > image_budget]
+
+    return {
+        'version': REPORT_VERSION,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'budgets': {'page_bytes': page_budget, 'image_bytes': image_budget},
+        'total': {
+            'pages': len(list_pages),
+            'html_bytes': sum(e['html'] for e in list_pages),
+            'images': len(list_images),
+            'image_bytes': sum(e['bytes'] for e in list_images),
+            'stylesheets': len(stylesheets),
+            'stylesheet_bytes': sum(dct_sizes[url] or 0
+                                    for url in stylesheets),
+            'mean_page_weight': round(
+                sum(e['weight'] for e in list_pages) / len(list_pages))
+                if list_pages else 0,
+            },
+        'largest_pages': list_pages[:top],
+        'largest_images': list_images[:top],
+        'largest_categories': weigh_categories(
+            dct_pages, dct_category_pages, cat2slug)[:top],
+        'over_budget': {'pages': over_pages, 'images': over_images},
+        'missing': missing,
+        }
+
+
+def is_over_budget(report):
+    """Return True if pages or images of the report are over budget."""
+    return bool(report['over_budget']['pages'] or
+                report['over_budget']['images'])
+
+
+def kb(n_bytes):
+    """Return a size in kB for printing."""
+    return f'{n_bytes / KB:.1f} kB'
+
+
+def finish_size_report(report, args):
+    """Write and summarize the size report."""
+    if args.size_report:
+        with open(args.size_report, 'wt', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    total = report['total']
+    print(f"Size report: {total['pages']} pages, mean weight "
+          f"{kb(total['mean_page_weight'])}", end='')
+    if report['largest_pages']:
+        largest = report['largest_pages'][0]
+        print(f", largest {largest['url']} ({kb(largest['weight'])})", end='')
+    print()
+    for url in report['missing']:
+        print(f'WARN: Referenced file not found in the output: {url}')
+
+    over_pages = report['over_budget']['pages']
+    over_images = report['over_budget']['images']
+    level = 'ERROR' if args.strict_budgets else 'WARN'
+    budgets = report['budgets']
+    if over_pages:
+        print(f'{level}: {len(over_pages)} page(s) over the page budget of '
+              f"{kb(budgets['page_bytes'])}:")
+        for e in over_pages[:PRINTED_OVER_BUDGET]:
+            print(f"  {kb(e['weight']):>9}  {e['url']}")
+    if over_images:
+        print(f'{level}: {len(over_images)} image(s) over the image budget '
+              f"of {kb(budgets['image_bytes'])}:")
+        for e in over_images[:PRINTED_OVER_BUDGET]:
+            print(f"  {kb(e['bytes']):>9}  {e['url']}")
+    if args.size_report:
+        print(f'Size report written to: {args.size_report}')
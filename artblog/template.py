@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Templates compiled once into literal text and slots.
+
+A compiled template is a list where even indices hold literal text and odd
+indices hold slot names, e.g. "<p>{{title}}</p>" is compiled to
+['<p>', 'title', '</p>']. Rendering replaces all slots in a single join,
+so text inserted into one slot is never scanned for other slots.
+"""
+# Standard libraries
+import html
+import re
+
+# Slots in the HTML templates, e.g. {{content}}
+SLOT = re.compile(r'\{\{(\w+)\}\}')
+
+# Slots in the HTML fragments, e.g. [TITLE]
+BRACKET_SLOT = re.compile(r'\[([A-Z]+)\]')
+
+
+def compile_template(txt, pattern=SLOT):
+    """Split template text into literal text and slot names."""
+    return pattern.split(txt)
+
+
+def render_template(segments, values):
+    """Return template text with every slot replaced by its value."""
+    parts = list(segments)
+    parts[1::2] = [values[name] for name in segments[1::2]]
+    return ''.join(parts)
+
+
+def split_template(segments, name):
+    """Split a template at a slot into the templates before and after it.
+
+    Used to write the text of a slot piece by piece between them.
+    """
+    i = segments.index(name)
+    return segments[:i], segments[i+1:]
+
+
+def escape(s):
+    """Escape text for use in HTML content and attribute values."""
+    return html.escape(s, quote=True)
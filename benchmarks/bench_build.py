@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Time the build stages of artblog on generated sites of different sizes.
+
+For every number of posts, a site is generated with
+exampledata/genexampledata.py (kept in the work folder for later runs) and
+built in a separate process, first from scratch (without the output
+folder and its cache, so the build is cold) and then incrementally
+without changes. For every build stage (see profile_stage() in
+artblog/buildprofile.py), the wall time, CPU time, peak memory and files
+written are recorded. Results are written as JSON, which
+can be compared with the results of an earlier run to catch regressions.
+
+Usage:
+    python benchmarks/bench_build.py --sizes 1000 10000 --results new.json
+    python benchmarks/bench_build.py --sizes 1000 --compare old.json
+"""
+# Standard libraries
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+RESULTS_VERSION = 2
+
+# Builds timed for every site size
+BUILDS = ('full', 'incremental')
+
+# Stages faster than this are too noisy to compare
+MIN_COMPARE_SECONDS = 0.05
+
+
+def get_user_inputs():
+    """Get user arguments."""
+    parser = argparse.ArgumentParser(
+        description='Time the build stages of artblog',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--sizes', '-n',
+                        type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of posts of the generated sites')
+    parser.add_argument('--sources', '-m',
+                        type=int, default=10,
+                        help='number of content folders of the sites')
+    parser.add_argument('--images',
+                        choices=('pillow', 'placeholder', 'none'),
+                        default='placeholder',
+                        help='images of the generated posts')
+    parser.add_argument('--work', '-w',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'artblog-bench'),
+                        help='folder for the generated sites')
+    parser.add_argument('--jobs', '-j',
+                        type=int, default=1,
+                        help='build option --jobs')
+    parser.add_argument('--results', '-r',
+                        help='JSON file to write the results to')
+    parser.add_argument('--compare', '-c',
+                        help='JSON results of an earlier run to compare to')
+    parser.add_argument('--tolerance', '-t',
+                        type=float, default=0.25,
+                        help='relative slowdown of a stage that fails '
+                             'the comparison')
+    # Internal: build one site and write its measurements
+    parser.add_argument('--measure', nargs=3,
+                        metavar=('CONFIG', 'BUILD', 'RESULT'),
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def generate_site(args, num_posts):
+    """Generate a site unless generated before, return its config file."""
+    sys.path.insert(0, os.path.join(ROOT_FOLDER, 'exampledata'))
+    import genexampledata
+
+    folder = os.path.join(args.work, f'posts-{num_posts}')
+    config_yml = os.path.join(folder, 'config.yml')
+    params = {'posts': num_posts, 'sources': args.sources,
+              'images': args.images}
+    stamp = os.path.join(folder, 'corpus.json')
+    if os.path.isfile(config_yml) and os.path.isfile(stamp):
+        with open(stamp, 'rt', encoding='utf-8') as f:
+            if json.load(f) == params:
+                return config_yml
+
+    print(f'Generating {num_posts} posts in {folder}')
+    gen_args = argparse.Namespace(
+        folder=folder, paragraphs=(1, 20), images_per_post=1,
+        image_size=(400, 1600), seed=1, **params)
+    config_yml = genexampledata.generate_corpus(gen_args)
+    with open(stamp, 'wt', encoding='utf-8') as f:
+        json.dump(params, f)
+    return config_yml
+
+
+def snapshot(folder):
+    """Return (inode, change time, size) of every file in a folder."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(folder):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            files[filepath] = (st.st_ino, st.st_ctime_ns, st.st_size)
+    return files
+
+
+def measure_build(config_yml, build, result_json, jobs):
+    """Build a site, write the measurements of every stage."""
+    sys.path.insert(0, ROOT_FOLDER)
+    import artblog.artblog as ab
+    from artblog.buildprofile import (get_peak_rss_mb, max_peak_rss_mb,
+                                      reset_peak_rss)
+
+    config = ab.load_config(config_yml)
+    output = config['output']
+
+    # Cold, without the manifest, indexes and image cache of earlier builds
+    if build == 'full':
+        shutil.rmtree(output, ignore_errors=True)
+        os.makedirs(output)
+
+    # Same options as the command line, defaults for those not given, with
+    # the optional size report so that every stage is measured
+    parser = argparse.ArgumentParser()
+    ab.add_build_arguments(parser)
+    size_json = os.path.join(os.path.dirname(result_json), 'sizes.json')
+    build_args = parser.parse_args(
+        [config_yml, '--jobs', str(jobs), '--generations', '1',
+         '--size_report', size_json] +
+        (['--incremental'] if build == 'incremental' else []))
+    ab.check_build_arguments(build_args)
+    stages = {}
+    files = [snapshot(output)]
+    profile_stage = ab.profile_stage
+
+    @contextmanager
+    def timed_stage(profile, name, manifest=None):
+        reset_peak_rss()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        with profile_stage(profile, name, manifest):
+            yield
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        peak = get_peak_rss_mb()
+
+        # Files created or changed since the previous stage
+        after = snapshot(output)
+        written = [k for k, v in after.items() if files[0].get(k) != v]
+        files[0] = after
+
+        stage = stages.setdefault(name, {
+            'stage': name, 'wall_s': 0.0, 'cpu_s': 0.0,
+            'peak_rss_mb': None, 'files_written': 0, 'bytes_written': 0})
+        stage['wall_s'] += wall
+        stage['cpu_s'] += cpu
+        stage['peak_rss_mb'] = max_peak_rss_mb([stage['peak_rss_mb'], peak])
+        stage['files_written'] += len(written)
+        stage['bytes_written'] += sum(after[k][2] for k in written)
+
+    # build_site() looks up profile_stage() in its module, so every stage
+    # it runs is timed
+    ab.profile_stage = timed_stage
+
+    ab.build_site(config, build_args)
+
+    result = {
+        'build': build,
+        # Without the time taken to find the files written
+        'wall_s': sum(s['wall_s'] for s in stages.values()),
+        # Peak memory is reset before every stage
+        'peak_rss_mb': max_peak_rss_mb(
+            [get_peak_rss_mb()] +
+            [s['peak_rss_mb'] for s in stages.values()]),
+        'stages': list(stages.values()),
+        }
+    with open(result_json, 'wt', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_build(args, config_yml, build):
+    """Build a site in a new process, return its measurements."""
+    result_json = os.path.join(args.work, 'result.json')
+    subprocess.run([sys.executable, os.path.abspath(__file__),
+                    '--jobs', str(args.jobs),
+                    '--measure', config_yml, build, result_json],
+                   check=True, stdout=subprocess.DEVNULL)
+    with open(result_json, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_mb(peak):
+    """Return a peak memory in MB for printing, "-" if unknown."""
+    return '-' if peak is None else f'{peak:.0f}'
+
+
+def print_run(run):
+    """Print the measurements of a build."""
+    print(f"\n{run['posts']} posts, {run['build']} build: "
+          f"{run['wall_s']:.2f} s, peak {format_mb(run['peak_rss_mb'])} MB")
+    print(f'{"stage":<26} {"wall s":>8} {"cpu s":>8} {"peak MB":>8} '
+          f'{"files":>8} {"MB written":>10}')
+    for s in run['stages']:
+        print(f"{s['stage']:<26} {s['wall_s']:>8.3f} {s['cpu_s']:>8.3f} "
+              f"{format_mb(s['peak_rss_mb']):>8} {s['files_written']:>8} "
+              f"{s['bytes_written'] / 1e6:>10.1f}")
+
+
+def compare_results(results, baseline, tolerance):
+    """Print stages slower than in the baseline, return True if any."""
+    old_stages = {(run['posts'], run['build'], s['stage']): s
+                  for run in baseline['runs'] for s in run['stages']}
+    regressed = False
+    print(f'\nCompared to {baseline["date"]} (tolerance {tolerance:.0%})')
+    for run in results['runs']:
+        for s in run['stages']:
+            old = old_stages.get((run['posts'], run['build'], s['stage']))
+            if old is None:
+                continue
+            label = f"{run['posts']} posts, {run['build']}, {s['stage']}"
+            if s['files_written'] != old['files_written']:
+                print(f"{label}: files written {old['files_written']} -> "
+                      f"{s['files_written']}")
+            if s['wall_s'] < MIN_COMPARE_SECONDS:
+                continue
+            ratio = s['wall_s'] / max(old['wall_s'], 1e-9)
+            if ratio > 1 + tolerance:
+                regressed = True
+                print(f"{label}: {old['wall_s']:.3f} s -> "
+                      f"{s['wall_s']:.3f} s ({ratio:.2f}x) REGRESSION")
+    return regressed
+
+
+def main():
+    args = get_user_inputs()
+    if args.measure:
+        measure_build(*args.measure, args.jobs)
+        return
+
+    os.makedirs(args.work, exist_ok=True)
+    results = {
+        'version': RESULTS_VERSION,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'jobs': args.jobs,
+        'runs': [],
+        }
+    for num_posts in args.sizes:
+        config_yml = generate_site(args, num_posts)
+        for build in BUILDS:
+            run = {'posts': num_posts}
+            run.update(run_build(args, config_yml, build))
+            results['runs'].append(run)
+            print_run(run)
+
+    if args.results:
+        with open(args.results, 'wt', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'\nResults written to {args.results}')
+
+    if args.compare:
+        with open(args.compare, 'rt', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('version') != RESULTS_VERSION:
+            print(f'ERROR: Cannot compare to results of version '
+                  f'{baseline.get("version")}')
+            sys.exit(1)
+        if compare_results(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Compare the front matter parsing paths of artblog.
+
+Parses the same front matter with yaml.BaseLoader, yaml.CBaseLoader (if
+PyYAML was built with libyaml) and artblog's parse_front_matter(), checks
+that all of them give identical metadata and prints the time per post.
+
+Usage:
+    python benchmarks/bench_frontmatter.py --posts 10000
+    python benchmarks/bench_frontmatter.py --config path/to/config.yml
+"""
+# Standard libraries
+import argparse
+import os
+import random
+import sys
+import time
+
+# Installed packages
+import yaml
+
+# Run from a source checkout without installing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from artblog.frontmatter import (parse_front_matter, parse_yaml_front_matter,
+                                 read_front_matter)
+
+WORDS = '''lorem ipsum dolor sit amet consectetur adipiscing elit sed do
+eiusmod tempor incididunt ut labore et dolore magna aliqua'''.split()
+
+FLAT = '''---
+title: {title}
+category: {category}
+tags: blogging, artblog, static site generation
+summary: {summary}
+image: image{n}.jpg
+date: 2021-03-{day:02d}
+'''
+
+# Front matter that needs the YAML loader
+NOT_FLAT = '''---
+title: "{title}: the sequel"
+category: {category}
+tags: [blogging, artblog]
+summary: >
+  {summary}
+image: image{n}.jpg
+'''
+
+
+def sentence(rng, n_words):
+    """Return random words."""
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words)).capitalize()
+
+
+def synthetic_front_matter(num_posts, not_flat_ratio, seed=1):
+    """Return front matter texts similar to the example data."""
+    rng = random.Random(seed)
+    list_txt = []
+    for n in range(num_posts):
+        template = NOT_FLAT if rng.random() < not_flat_ratio else FLAT
+        list_txt.append(template.format(
+            title=sentence(rng, rng.randint(2, 8)),
+            category=rng.choice(['Category One', 'Category Two', 'Other']),
+            summary=sentence(rng, rng.randint(9, 20)),
+            n=n,
+            day=n % 28 + 1))
+    return list_txt
+
+
+def corpus_front_matter(config_yml):
+    """Return front matter texts of the posts of a site."""
+    from artblog.artblog import find_posts, load_config
+
+    config = load_config(config_yml)
+    list_txt = []
+    for filepath in find_posts(config):
+        meta_txt = read_front_matter(filepath)
+        if meta_txt is not None:
+            list_txt.append(meta_txt)
+    return list_txt
+
+
+def time_path(parse, list_txt, repeat):
+    """Return (best time in seconds, results) of parsing all texts."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [parse(txt) for txt in list_txt]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare front matter parsing paths',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--posts', '-n',
+                        type=int, default=10000,
+                        help='number of synthetic posts')
+    parser.add_argument('--not_flat',
+                        type=float, default=0.05,
+                        help='ratio of synthetic posts that need YAML')
+    parser.add_argument('--config', '-c',
+                        help='use the posts of this site instead')
+    parser.add_argument('--repeat', '-r',
+                        type=int, default=3,
+                        help='best of this many runs is reported')
+    args = parser.parse_args()
+
+    if args.config:
+        list_txt = corpus_front_matter(args.config)
+    else:
+        list_txt = synthetic_front_matter(args.posts, args.not_flat)
+
+    paths = [('yaml.BaseLoader',
+              lambda txt: parse_yaml_front_matter(txt, yaml.BaseLoader))]
+    if hasattr(yaml, 'CBaseLoader'):
+        paths.append(('yaml.CBaseLoader',
+                      lambda txt: parse_yaml_front_matter(
+                          txt, yaml.CBaseLoader)))
+    else:
+        print('yaml.CBaseLoader not available (PyYAML without libyaml)')
+    paths.append(('parse_front_matter', parse_front_matter))
+
+    print(f'{len(list_txt)} posts, best of {args.repeat} runs')
+    print(f'{"path":<20} {"total s":>9} {"us/post":>9} {"speedup":>8}  '
+          f'mismatches')
+    baseline_time = None
+    baseline_results = None
+    failed = False
+    for name, parse in paths:
+        elapsed, results = time_path(parse, list_txt, args.repeat)
+        if baseline_results is None:
+            baseline_time, baseline_results = elapsed, results
+        mismatches = sum(a != b for a, b in zip(results, baseline_results))
+        failed = failed or mismatches > 0
+        us_per_post = elapsed / max(1, len(list_txt)) * 1e6
+        print(f'{name:<20} {elapsed:>9.3f} {us_per_post:>9.1f} '
+              f'{baseline_time / elapsed:>7.1f}x  {mismatches}')
+
+    if failed:
+        print('ERROR: Parsing paths give different metadata')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Compare the markdown renderers of artblog.
+
+Converts the same posts with every installed renderer (see
+artblog/renderers.py) and prints the time per post. The HTML of each
+renderer is compared with that of mistune, the default: posts are counted
+as identical, equivalent (same tags, attributes and text once whitespace
+and attribute order are normalized) or different, and the first
+differences are printed as diffs.
+
+Usage:
+    python benchmarks/bench_markdown.py --posts 2000
+    python benchmarks/bench_markdown.py --config path/to/config.yml
+    python benchmarks/bench_markdown.py --renderers mistune markdown-it
+"""
+# Standard libraries
+import argparse
+import difflib
+from html.parser import HTMLParser
+import os
+import random
+import re
+import sys
+import time
+
+# Run from a source checkout without installing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from artblog.frontmatter import split_front_matter
+from artblog.renderers import (DEFAULT_RENDERER, RENDERERS,
+                               available_renderers, render_markdown)
+
+WORDS = '''lorem ipsum dolor sit amet consectetur adipiscing elit sed do
+eiusmod tempor incididunt ut labore et dolore magna aliqua'''.split()
+
+# Tags without an end tag, <br> and <br /> are the same
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                       'input', 'link', 'meta', 'source', 'track', 'wbr'))
+
+
+def sentence(rng, n_words):
+    """Return random words."""
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words)).capitalize()
+
+
+def synthetic_post(rng, n):
+    """Return the markdown of a post similar to the example data."""
+    parts = [f'# {sentence(rng, 4)}',
+             f'![{sentence(rng, 2)}](image{n}.jpg)']
+    for _ in range(rng.randint(2, 6)):
+        words = sentence(rng, rng.randint(20, 60)).split()
+        i = rng.randrange(len(words))
+        words[i] = f'**{words[i]}**'
+        i = rng.randrange(len(words))
+        words[i] = f'[{words[i]}](https://example.com/{n})'
+        parts.append(' '.join(words) + '.')
+    if rng.random() < 0.5:
+        parts.append('\n'.join(f'- {sentence(rng, 5)}'
+                               for _ in range(rng.randint(2, 5))))
+    if rng.random() < 0.2:
+        parts.append('| Size | Medium |\n| --- | --- |\n'
+                     '| 30 x 40 cm | Oil on canvas |')
+    if rng.random() < 0.2:
+        parts.append('```\nartblog config.yml\n```')
+    if rng.random() < 0.1:
+        parts.append('<div class="gallery"><img src="detail.jpg" '
+                     'alt="Detail"></div>')
+    return '\n\n'.join(parts) + '\n'
+
+
+def synthetic_posts(num_posts, seed=1):
+    """Return the markdown of synthetic posts."""
+    rng = random.Random(seed)
+    return [synthetic_post(rng, n) for n in range(num_posts)]
+
+
+def corpus_posts(config_yml):
+    """Return the markdown of the posts of a site, without front matter."""
+    from artblog.artblog import find_posts, load_config
+
+    config = load_config(config_yml)
+    list_txt = []
+    for filepath in find_posts(config):
+        with open(filepath, 'rt', encoding='utf-8') as f:
+            _, md_txt = split_front_matter(f.read())
+        list_txt.append(md_txt)
+    return list_txt
+
+
+class Normalizer(HTMLParser):
+    """Tokens of HTML that don't depend on how it is formatted."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tokens.append(('start', tag, tuple(sorted(
+            (name, value or '') for name, value in attrs))))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_TAGS:
+            self.tokens.append(('end', tag))
+
+    def handle_data(self, data):
+        text = re.sub(r'\s+', ' ', data).strip()
+        if text:
+            self.tokens.append(('text', text))
+
+
+def normalize_html(html):
+    """Return the tokens of HTML to compare renderers with."""
+    parser = Normalizer()
+    parser.feed(html)
+    parser.close()
+    return parser.tokens
+
+
+def time_renderer(name, list_txt, repeat):
+    """Return (best time in seconds, HTML of the posts)."""
+    render_markdown('', name)  # import and set up the renderer
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [render_markdown(txt, name) for txt in list_txt]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def compare(results, baseline_results):
+    """Return (identical, equivalent, indices of different posts)."""
+    identical = equivalent = 0
+    list_different = []
+    for i, (html, baseline) in enumerate(zip(results, baseline_results)):
+        if html == baseline:
+            identical += 1
+        elif normalize_html(html) == normalize_html(baseline):
+            equivalent += 1
+        else:
+            list_different.append(i)
+    return identical, equivalent, list_different
+
+
+def print_diff(name, i, html, baseline):
+    """Print how a renderer's HTML of a post differs from mistune's."""
+    print(f'--- post {i}: {DEFAULT_RENDERER} vs {name}')
+    sys.stdout.writelines(difflib.unified_diff(
+        baseline.splitlines(keepends=True), html.splitlines(keepends=True),
+        DEFAULT_RENDERER, name, n=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare markdown renderers',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--posts', '-n',
+                        type=int, default=2000,
+                        help='number of synthetic posts')
+    parser.add_argument('--config', '-c',
+                        help='use the posts of this site instead')
+    parser.add_argument('--renderers',
+                        nargs='+', choices=list(RENDERERS),
+                        help='renderers to compare (default: all installed)')
+    parser.add_argument('--repeat', '-r',
+                        type=int, default=3,
+                        help='best of this many runs is reported')
+    parser.add_argument('--diffs',
+                        type=int, default=3,
+                        help='number of differing posts printed per renderer')
+    args = parser.parse_args()
+
+    installed = available_renderers()
+    if DEFAULT_RENDERER not in installed:
+        print(f'ERROR: {DEFAULT_RENDERER} is not installed')
+        sys.exit(1)
+    names = args.renderers or installed
+    for name in names:
+        if name not in installed:
+            print(f'WARN: {name} is not installed: '
+                  f'python -m pip install {RENDERERS[name][1]}')
+    names = [DEFAULT_RENDERER] + [name for name in names
+                                  if name in installed and
+                                  name != DEFAULT_RENDERER]
+
+    if args.config:
+        list_txt = corpus_posts(args.config)
+    else:
+        list_txt = synthetic_posts(args.posts)
+
+    print(f'{len(list_txt)} posts, best of {args.repeat} runs')
+    print(f'{"renderer":<12} {"total s":>9} {"posts/s":>9} {"speedup":>8}  '
+          f'{"identical":>9} {"equivalent":>10} {"different":>9}')
+    baseline_time = None
+    baseline_results = None
+    list_diffs = []
+    for name in names:
+        elapsed, results = time_renderer(name, list_txt, args.repeat)
+        if baseline_results is None:
+            baseline_time, baseline_results = elapsed, results
+        identical, equivalent, list_different = compare(results,
+                                                        baseline_results)
+        posts_per_s = len(list_txt) / elapsed if elapsed else 0
+        print(f'{name:<12} {elapsed:>9.3f} {posts_per_s:>9.0f} '
+              f'{baseline_time / elapsed:>7.1f}x  {identical:>9} '
+              f'{equivalent:>10} {len(list_different):>9}')
+        list_diffs += [(name, i, results[i])
+                       for i in list_different[:args.diffs]]
+
+    for name, i, html in list_diffs:
+        print()
+        print_diff(name, i, html, baseline_results[i])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,26 @@
 #!/usr/bin/env python3
+"""Generate example data for artblog, from a small example to large corpora.
+
+The defaults generate the example site: 140 articles in 2 sources, each
+with a Pillow image. For scale testing, e.g.:
+
+    python genexampledata.py --posts 100000 --sources 10 --images placeholder
+
+Placeholder images are tiny PNG files written without Pillow.
+"""
 # Standard libraries
+import argparse
 import os
 import random
+import re
 import shutil
-
-# Installed packages
-import lorem
-from PIL import Image, ImageDraw, ImageFont
-import slugify
+import struct
+import zlib
 
 BASE_FOLDER = '~/Documents/exampledata'
-BASE_FOLDER = BASE_FOLDER.replace('~', os.path.expanduser('~'))
 
-# For 1st set of data
-RANDOM_SEED_1 = 1
-FIRST_ARTICLE_1 = 0
-NUM_ARTICLES_1 = 101
-CONTENT_FOLDER_1 = os.path.join(BASE_FOLDER, 'content1')
-
-# For 2nd set of data
-RANDOM_SEED_2 = 99
-FIRST_ARTICLE_2 = 200
-NUM_ARTICLES_2 = 39
-CONTENT_FOLDER_2 = os.path.join(BASE_FOLDER, 'content2')
-
-# Don't edit below this
+# Folders next to this script copied into the example data
+SITE_FOLDERS = ('favicon', 'logo', 'mainpage')
 
 HEAD = '''
 ---
@@ -33,6 +29,7 @@ category: {{CATEGORY}}
 tags: blogging, artblog, static site generation
 summary: {{SUMMARY}}
 image: {{FILENAME}}
+date: {{DATE}}
 ---
 
 '''.lstrip()
@@ -44,6 +41,70 @@ MD_IMG_INSERT = '''
 
 CATEGORIES = ['Category One', 'Category Two', 'Category Three', 'Junk', 'Other']
 
+CONFIG_YML = '''
+sources:
+{{SOURCES}}
+mainpage_folder: {{BASE_FOLDER}}/mainpage/
+menu:
+  - Category One
+  - Category Two
+  - Category Three
+output: {{BASE_FOLDER}}/output
+logo: {{BASE_FOLDER}}/logo/example_art_blog.png
+favicon: {{BASE_FOLDER}}/favicon/favicon-32x32.png
+author: Artsy Fartsy
+site_name: My Awesome Art Blog
+base_url: https://myartblog.com
+'''.lstrip()
+
+IMAGE_MODES = ('pillow', 'placeholder', 'none')
+
+WORDS = '''
+lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor
+incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud
+exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute
+irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur
+excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt
+mollit anim id est laborum
+'''.split()
+
+
+def get_user_inputs():
+    """Get user arguments."""
+    parser = argparse.ArgumentParser(
+        description='Generate example data for artblog',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--folder', '-f',
+                        default=BASE_FOLDER,
+                        help='folder to generate the data in')
+    parser.add_argument('--posts', '-n',
+                        type=int, default=140,
+                        help='total number of articles')
+    parser.add_argument('--sources', '-m',
+                        type=int, default=2,
+                        help='number of content folders (sources)')
+    parser.add_argument('--paragraphs',
+                        type=int, nargs=2, default=(1, 20),
+                        metavar=('MIN', 'MAX'),
+                        help='range of paragraphs in an article body')
+    parser.add_argument('--images',
+                        choices=IMAGE_MODES, default='pillow',
+                        help='images drawn with Pillow, tiny placeholder '
+                             'PNG files, or no image files')
+    parser.add_argument('--images_per_post',
+                        type=int, default=1,
+                        help='number of images in each article')
+    parser.add_argument('--image_size',
+                        type=int, nargs=2, default=(400, 1600),
+                        metavar=('MIN', 'MAX'),
+                        help='range of width and height of Pillow images')
+    parser.add_argument('--seed',
+                        type=int, default=1,
+                        help='random seed, same seed gives the same data')
+    args = parser.parse_args()
+    args.folder = os.path.expanduser(args.folder)
+    return args
+
 
 def get_complementary_color(color):
     """Given RGB color tuple, return complementary color tuple."""
@@ -55,6 +116,8 @@ def get_complementary_color(color):
 
 def gen_image(filepath, rgb_color, width_height_pixels=(640,400)):
     """Generate color block with filename as text inside the color block."""
+    from PIL import Image, ImageDraw, ImageFont
+
     # Generate rectangular color block
     #img = Image.new('RGB', width_height_pixels, color=rgb_color)
     # Skip provided color and just let background be black
@@ -72,19 +135,60 @@ def gen_image(filepath, rgb_color, width_height_pixels=(640,400)):
     two_points = [left_up_point, right_down_point]
     draw.ellipse(two_points, fill=complementary_color, width=10)
 
-    # Insert filename text of complementary color inside the color block
+    # Insert filename text of complementary color inside the color block,
+    # Pillow's built-in font avoids depending on fonts of the system
     filename = os.path.basename(filepath)
-    font = ImageFont.truetype("arial.ttf", 60)
+    try:
+        font = ImageFont.load_default(size=60)
+    except TypeError:
+        font = ImageFont.load_default()  # Pillow < 10.1
     draw.text((10,10), filename, font=font, fill=complementary_color)
 
     # Save file
     img.save(filepath)
 
 
-def generate_data(random_seed, content_folder, first_article, num_articles):
-    # Fix the seed so that the random data is reproducible
-    random.seed(random_seed)
+def gen_placeholder_image(filepath, rgb_color, width_height_pixels=(8, 8)):
+    """Write a tiny single color PNG file without Pillow."""
+    width, height = width_height_pixels
+    row = b'\x00' + bytes(rgb_color) * width
+    data = zlib.compress(row * height)
+
+    def chunk(kind, payload):
+        crc = zlib.crc32(kind + payload) & 0xffffffff
+        return struct.pack('>I', len(payload)) + kind + payload + \
+            struct.pack('>I', crc)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    with open(filepath, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+                chunk(b'IDAT', data) + chunk(b'IEND', b''))
 
+
+def get_sentence(rng, word_range):
+    """Return a random sentence."""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(*word_range))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def get_paragraphs(rng, count):
+    """Return random paragraphs separated by blank lines."""
+    paragraphs = []
+    for _ in range(count):
+        sentences = [get_sentence(rng, (4, 8))
+                     for _ in range(rng.randint(5, 10))]
+        paragraphs.append(' '.join(sentences))
+    return '\n\n'.join(paragraphs) + '\n'
+
+
+def slugify(txt):
+    """Return lowercase words of text joined by dashes."""
+    words = re.findall(r'[a-z0-9]+', txt.lower())
+    return '-'.join(w for w in words if w not in ('the', 'a'))
+
+
+def generate_data(rng, content_folder, first_article, num_articles, args):
+    """Generate articles in a content folder."""
     # Create content folder
     shutil.rmtree(content_folder, ignore_errors=True)
     os.makedirs(content_folder)
@@ -92,53 +196,101 @@ def generate_data(random_seed, content_folder, first_article, num_articles):
     # Create articles
     for n in range(first_article, first_article + num_articles):
         # Create folder
-        folder = os.path.join(content_folder, 'article%04d' % n)
+        folder = os.path.join(content_folder, 'article%06d' % n)
         os.mkdir(folder)
 
-        # Generate image for article
-        rgb_color = (random.randint(0,255), random.randint(0,255), random.randint(0,255))
-        width = random.randint(400, 1600)
-        height = random.randint(400, 1600)
-        imgfilename = f'image{n}.jpg'
-        imgfilepath = os.path.join(folder, imgfilename)
-        gen_image(imgfilepath, rgb_color, width_height_pixels=(width, height))
+        # Generate images for article
+        list_images = []
+        for i in range(args.images_per_post):
+            rgb_color = (rng.randint(0,255), rng.randint(0,255),
+                         rng.randint(0,255))
+            imgfilename = f'image{n}.jpg' if i == 0 else f'image{n}_{i}.jpg'
+            imgfilepath = os.path.join(folder, imgfilename)
+            if args.images == 'pillow':
+                width = rng.randint(*args.image_size)
+                height = rng.randint(*args.image_size)
+                gen_image(imgfilepath, rgb_color,
+                          width_height_pixels=(width, height))
+            elif args.images == 'placeholder':
+                imgfilename = imgfilename.replace('.jpg', '.png')
+                imgfilepath = os.path.join(folder, imgfilename)
+                gen_placeholder_image(imgfilepath, rgb_color)
+            else:
+                # No file written, so no image to refer to
+                continue
+            list_images.append(imgfilename)
 
         # Generate text for article
-        title = lorem.get_sentence(count=1, sep=' ', comma=(0, 2), word_range=(2, 8))
+        title = get_sentence(rng, (2, 8)).rstrip('.')
         txt = HEAD.replace('{{TITLE}}', title)
 
-        summary = lorem.get_sentence(count=1, sep=' ', comma=(0, 2), word_range=(9, 20))
+        summary = get_sentence(rng, (9, 20))
         txt = txt.replace('{{SUMMARY}}', summary)
 
-        txt = txt.replace('{{CATEGORY}}', random.choice(CATEGORIES))
+        txt = txt.replace('{{CATEGORY}}', rng.choice(CATEGORIES))
 
-        txt = txt.replace('{{FILENAME}}', imgfilename)
+        date = f'20{10 + n // 336 % 90:02d}-{n // 28 % 12 + 1:02d}-' \
+            f'{n % 28 + 1:02d}'
+        txt = txt.replace('{{DATE}}', date)
 
-        txt += MD_IMG_INSERT.replace('{{FILENAME}}', imgfilename)
+        if list_images:
+            txt = txt.replace('{{FILENAME}}', list_images[0])
+        else:
+            txt = txt.replace('image: {{FILENAME}}\n', '')
+
+        for imgfilename in list_images:
+            txt += MD_IMG_INSERT.replace('{{FILENAME}}', imgfilename)
         txt += summary + '\n\n'
 
-        txt += lorem.get_paragraph(
-                count=random.randint(1,20),
-                sep=os.linesep,
-                comma=(0, 2),
-                word_range=(4, 8),
-                sentence_range=(5, 10))
+        txt += get_paragraphs(rng, rng.randint(*args.paragraphs))
 
         # Write to markdown file
-        mdfilename = slugify.slugify(title, stopwords=['the', 'a']) + '.md'
+        mdfilename = slugify(title) + '.md'
         mdfilepath = os.path.join(folder, mdfilename)
         with open(mdfilepath, 'wt', encoding='utf-8') as f:
             f.write(txt)
 
     print(f'{num_articles} generated in {content_folder}')
 
-def main():
-    generate_data(RANDOM_SEED_1, CONTENT_FOLDER_1, FIRST_ARTICLE_1, NUM_ARTICLES_1)
-    generate_data(RANDOM_SEED_2, CONTENT_FOLDER_2, FIRST_ARTICLE_2, NUM_ARTICLES_2)
 
-    shutil.copytree('favicon', os.path.join(BASE_FOLDER, 'favicon'), dirs_exist_ok=True)
-    shutil.copytree('logo', os.path.join(BASE_FOLDER, 'logo'), dirs_exist_ok=True)
-    shutil.copytree('mainpage', os.path.join(BASE_FOLDER, 'mainpage'), dirs_exist_ok=True)
+def generate_corpus(args):
+    """Generate sources, site files and config.yml, return config path."""
+    # Fix the seed so that the random data is reproducible
+    rng = random.Random(args.seed)
+
+    list_sources = []
+    first_article = 0
+    for m in range(args.sources):
+        # Spread articles evenly over the sources
+        num_articles = args.posts // args.sources + \
+            (1 if m < args.posts % args.sources else 0)
+        content_folder = os.path.join(args.folder, f'content{m + 1}')
+        generate_data(rng, content_folder, first_article, num_articles, args)
+        list_sources.append(content_folder)
+        first_article += num_articles
+
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    for folder in SITE_FOLDERS:
+        shutil.copytree(os.path.join(script_folder, folder),
+                        os.path.join(args.folder, folder),
+                        dirs_exist_ok=True)
+
+    # artblog expects the output folder to exist
+    os.makedirs(os.path.join(args.folder, 'output'), exist_ok=True)
+
+    config_yml = os.path.join(args.folder, 'config.yml')
+    txt = CONFIG_YML.replace(
+        '{{SOURCES}}', ''.join(f'- {s}\n' for s in list_sources).rstrip())
+    txt = txt.replace('{{BASE_FOLDER}}', args.folder)
+    with open(config_yml, 'wt', encoding='utf-8') as f:
+        f.write(txt)
+    print(f'Config file: {config_yml}')
+    return config_yml
+
+
+def main():
+    args = get_user_inputs()
+    generate_corpus(args)
 
 if __name__ == "__main__":
     main()
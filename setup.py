@@ -10,21 +10,29 @@ setuptools.setup(
     packages=['artblog'],
     package_dir={'artblog': 'artblog'},
     package_data={
-        'artblog': ['html/*.html', 'css/*.css', 'config/*.yml'],
+        'artblog': ['html/*.html', 'css/*.css', 'config/*.yml',
+                    'js/*.js'],
         },
 
     entry_points={
         'console_scripts': [
-            'artblog=artblog.artblog:main'
+            'artblog=artblog.cli:main'
         ],
     },
 
     python_requires=">=3.6",
     install_requires=[
-        "requests",
         "pyyaml",
         "mistune==2.0.0rc1"
     ],
+    extras_require={
+        "images": ["Pillow"],
+        "brotli": ["brotli"],
+        "markdown": ["Markdown"],
+        "markdown-it": ["markdown-it-py"],
+        "mistletoe": ["mistletoe"],
+        "cmark-gfm": ["cmarkgfm"],
+    },
 
     author="Ravi Chandran",
     description="Static site generator for simple personal art/picture/photo blogs.",
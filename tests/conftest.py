@@ -0,0 +1,96 @@
+"""Fixtures building small sites in temporary folders."""
+# Standard libraries
+import argparse
+import os
+
+# Installed packages
+import pytest
+
+# Package modules
+from artblog.artblog import (add_build_arguments, build_site,
+                             check_build_arguments, load_config)
+from artblog.manifest import CACHE_FOLDER
+
+CATEGORIES = ('Drawings', 'Paintings')
+
+
+class Site:
+    """Sources, config and output of a site in a folder."""
+
+    def __init__(self, folder):
+        self.folder = str(folder)
+        self.content = os.path.join(self.folder, 'content')
+        self.output = os.path.join(self.folder, 'output')
+        self.config_yml = os.path.join(self.folder, 'config.yml')
+        self.settings = {}
+
+        mainpage = os.path.join(self.folder, 'mainpage')
+        os.makedirs(mainpage)
+        os.makedirs(self.content)
+        os.makedirs(self.output)
+        with open(os.path.join(mainpage, 'index.md'), 'wt') as f:
+            f.write('# Main\n\nWelcome.\n')
+
+    def write_post(self, name, title, category=CATEGORIES[0],
+                   body='Some text.\n', **meta):
+        """Write the markdown of a post in its own folder, return its path."""
+        folder = os.path.join(self.content, name)
+        os.makedirs(folder, exist_ok=True)
+        lines = ['---', f'title: {title}', f'category: {category}']
+        lines += [f'{k}: {v}' for k, v in meta.items()]
+        filepath = os.path.join(folder, 'post.md')
+        with open(filepath, 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n---\n\n' + body)
+        return filepath
+
+    def write_config(self):
+        """Write the config file with the settings, return its path."""
+        lines = ['sources:', f'- {self.content}',
+                 f'mainpage_folder: {os.path.join(self.folder, "mainpage")}',
+                 'menu:'] + [f'  - {c}' for c in CATEGORIES]
+        lines += [f'output: {self.output}',
+                  'author: Me',
+                  'site_name: Test',
+                  'base_url: https://example.com']
+        lines += [f'{k}: {v}' for k, v in self.settings.items()]
+        with open(self.config_yml, 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return self.config_yml
+
+    def build(self, *options):
+        """Build the site with command line options, return the stats."""
+        parser = argparse.ArgumentParser()
+        add_build_arguments(parser)
+        args = parser.parse_args([self.write_config()] + list(options))
+        check_build_arguments(args)
+        return build_site(load_config(self.config_yml), args)
+
+    def read(self, relpath):
+        """Return the text of an output file."""
+        with open(os.path.join(self.output, relpath), 'rt',
+                  encoding='utf-8') as f:
+            return f.read()
+
+    def outputs(self):
+        """Return (inode, change time) of the output files, by path.
+
+        Paths are relative to the output, with "/" as separator. Files of
+        the cache folder are left out.
+        """
+        dct_files = {}
+        for root, folders, files in os.walk(self.output):
+            if root == self.output:
+                folders[:] = [s for s in folders if s != CACHE_FOLDER]
+            for name in files:
+                filepath = os.path.join(root, name)
+                st = os.stat(filepath)
+                relpath = os.path.relpath(filepath, self.output)
+                dct_files[relpath.replace(os.sep, '/')] = \
+                    (st.st_ino, st.st_ctime_ns)
+        return dct_files
+
+
+@pytest.fixture
+def site(tmp_path):
+    """An empty site, with posts and settings added by the test."""
+    return Site(tmp_path)
@@ -0,0 +1,46 @@
+"""Copies of post attachments to the output folder."""
+# Standard libraries
+import os
+
+
+def write_attachment(site, name, txt):
+    """Write a post with an attachment, return the attachment's output."""
+    site.write_post(name, name.title(), body='[File](file.txt)\n')
+    with open(os.path.join(site.content, name, 'file.txt'), 'wt') as f:
+        f.write(txt)
+    return os.path.join(site.output, 'posts', name, 'file.txt')
+
+
+def test_identical_files_are_stored_once(site):
+    first = write_attachment(site, 'cats', 'Same text\n')
+    second = write_attachment(site, 'dogs', 'Same text\n')
+    other = write_attachment(site, 'trees', 'Other text\n')
+
+    stats = site.build()
+
+    assert os.path.samefile(first, second)
+    assert not os.path.samefile(first, other)
+    assert stats['copied'] + stats['linked'] == 3
+
+
+def test_copy_mode_writes_separate_files(site):
+    first = write_attachment(site, 'cats', 'Same text\n')
+    second = write_attachment(site, 'dogs', 'Same text\n')
+    site.settings['asset_copy'] = 'copy'
+
+    stats = site.build()
+
+    assert not os.path.samefile(first, second)
+    assert stats['copied'] == 2
+
+
+def test_changed_attachment_is_copied_again(site):
+    outfile = write_attachment(site, 'cats', 'Old text\n')
+    site.build()
+
+    write_attachment(site, 'cats', 'New, longer text\n')
+    stats = site.build('--incremental')
+
+    with open(outfile, 'rt') as f:
+        assert f.read() == 'New, longer text\n'
+    assert stats['copied'] + stats['linked'] == 1
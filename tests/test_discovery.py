@@ -0,0 +1,131 @@
+"""Discovery of source files, ignore rules and post URL collisions."""
+# Standard libraries
+import os
+import shutil
+import subprocess
+
+# Installed packages
+import pytest
+
+# Package modules
+from artblog.discovery import (IGNORE_FILE, check_slug_collisions,
+                               list_folder, scan_folder)
+
+
+def write_files(folder, *relpaths):
+    """Create empty files in a folder."""
+    for relpath in relpaths:
+        filepath = os.path.join(folder, *relpath.split('/'))
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wt') as f:
+            f.write('')
+
+
+def write_ignore_file(folder, *lines):
+    """Write the ignore file of a folder."""
+    with open(os.path.join(folder, IGNORE_FILE), 'wt') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def test_files_are_listed_in_walk_order(tmp_path):
+    write_files(tmp_path, 'b.txt', 'a/z.txt', 'a/b/c.txt', 'a/a.txt', 'c.txt')
+    assert scan_folder(str(tmp_path), []) == \
+        ['b.txt', 'c.txt', 'a/a.txt', 'a/z.txt', 'a/b/c.txt']
+
+
+def test_vcs_and_dependency_folders_are_skipped(tmp_path):
+    write_files(tmp_path, '.git/config', '.hg/store', 'node_modules/x.js',
+                'post/.git/HEAD', 'post/post.md', '.gitignore',
+                'post/node_modules')
+    assert scan_folder(str(tmp_path), []) == \
+        ['.gitignore', 'post/node_modules', 'post/post.md']
+
+
+def test_ignore_file_patterns(tmp_path):
+    write_ignore_file(tmp_path, '# Work in progress', '', 'drafts/',
+                      '*.psd', '  2019/old-*  ', '/')
+    write_files(tmp_path, 'drafts/post.md', 'posts/drafts/post.md',
+                'posts/drafts.md', 'posts/cat.psd', 'posts/cat.jpg',
+                '2019/old-post/post.md', '2019/new-post/post.md',
+                '2020/2019/old-post/post.md')
+
+    list_markdown, list_other = list_folder({}, str(tmp_path))
+
+    found = sorted(os.path.relpath(p, tmp_path).replace(os.sep, '/')
+                   for p in list_markdown)
+    assert found == ['2019/new-post/post.md', '2020/2019/old-post/post.md',
+                     'posts/drafts.md']
+    assert list_other == [os.path.join('posts', 'cat.jpg')]
+
+
+def test_hidden_markdown_files_are_not_posts(tmp_path):
+    write_files(tmp_path, 'post/post.md', '.hidden/post.md', 'post/.old.md')
+    list_markdown, list_other = list_folder({}, str(tmp_path))
+    assert list_markdown == [os.path.join(str(tmp_path), 'post', 'post.md')]
+    # Nor copied as other files
+    assert list_other == []
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='git not installed')
+def test_git_index_lists_tracked_files(tmp_path):
+    write_ignore_file(tmp_path, '*.psd')
+    write_files(tmp_path, 'post/post.md', 'post/cat.jpg', 'post/cat.psd',
+                'post/untracked.jpg', 'deleted/post.md')
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    subprocess.run(['git', 'add', IGNORE_FILE, 'post/post.md', 'post/cat.jpg',
+                    'post/cat.psd', 'deleted/post.md'],
+                   cwd=tmp_path, check=True)
+    os.remove(os.path.join(tmp_path, 'deleted', 'post.md'))
+
+    list_markdown, list_other = list_folder({'git_index': 'true'},
+                                            str(tmp_path))
+
+    assert list_markdown == [os.path.join(str(tmp_path), 'post', 'post.md')]
+    assert list_other == [os.path.join('post', 'cat.jpg')]
+
+
+def test_git_index_outside_a_work_tree(tmp_path, capsys, monkeypatch):
+    monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(tmp_path))
+    write_files(tmp_path, 'post/post.md')
+    list_markdown, _ = list_folder({'git_index': 'true'}, str(tmp_path))
+    assert list_markdown == [os.path.join(str(tmp_path), 'post', 'post.md')]
+    assert 'WARN:' in capsys.readouterr().out
+
+
+def test_posts_with_different_urls():
+    check_slug_collisions([os.path.join('a', 'cats', 'post.md'),
+                           os.path.join('a', 'dogs', 'post.md'),
+                           os.path.join('b', 'trees', 'post.md')])
+
+
+@pytest.mark.parametrize('list_markdown', [
+    # Folders of the same name in two sources
+    [os.path.join('a', 'cats', 'post.md'), os.path.join('b', 'cats', 'x.md')],
+    # Two posts in one folder
+    [os.path.join('a', 'cats', 'post.md'), os.path.join('a', 'cats', 'x.md')],
+    ])
+def test_posts_with_the_same_url(list_markdown, capsys):
+    with pytest.raises(SystemExit) as e:
+        check_slug_collisions(list_markdown + [
+            os.path.join('a', 'dogs', 'post.md')])
+    assert e.value.code == 1
+    out = capsys.readouterr().out
+    assert 'ERROR: These posts have the same URL /posts/cats/: ' + \
+        ', '.join(list_markdown) in out
+    assert 'dogs' not in out
+
+
+def test_build_skips_ignored_sources(site):
+    site.write_post('cats', 'Cats')
+    site.write_post('drafts', 'Draft')
+    site.write_post('.git', 'Git')
+    write_ignore_file(site.content, 'drafts/', '*.psd')
+    write_files(site.content, 'cats/cat.psd', 'cats/cat.txt')
+
+    site.build()
+
+    outputs = site.outputs()
+    assert 'posts/cats/index.html' in outputs
+    assert 'posts/cats/cat.txt' in outputs
+    assert not any('drafts' in p or '.git' in p or p.endswith('.psd')
+                   or IGNORE_FILE in p for p in outputs)
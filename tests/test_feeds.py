@@ -0,0 +1,128 @@
+"""Sitemap and Atom feed generated from the post metadata."""
+# Standard libraries
+import xml.etree.ElementTree as ET
+
+# Package modules
+from artblog import feeds
+from artblog.feeds import SITEMAP_FILE, feed_xml, sitemap_files
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+BASE_URL = 'https://example.com'
+
+
+def post(name, mtime, **meta):
+    """Return the metadata record of a post."""
+    meta.setdefault('title', name.title())
+    meta.setdefault('category', 'Drawings')
+    meta.setdefault('canonical', f'{BASE_URL}/posts/{name}/')
+    meta['mtime'] = mtime
+    return meta
+
+
+def make_config(tmp_path, **settings):
+    """Return a config with a main page folder."""
+    (tmp_path / 'index.md').write_text('# Main\n')
+    config = {'base_url': BASE_URL, 'mainpage_folder': str(tmp_path),
+              'site_name': 'Test'}
+    config.update(settings)
+    return config
+
+
+def test_feed_has_newest_posts_first(tmp_path):
+    config = make_config(tmp_path, feed_posts='2')
+    dct_meta = {
+        'posts/old/': post('old', 3000, date='2020-01-01'),
+        'posts/new/': post('new', 1000, date='2021-06-01'),
+        # Without date, by modification time (May 2020)
+        'posts/undated/': post('undated', 1590000000),
+        }
+
+    feed = ET.fromstring(feed_xml(config, dct_meta))
+
+    entries = feed.findall(f'{ATOM}entry')
+    assert [e.find(f'{ATOM}title').text for e in entries] == \
+        ['New', 'Undated']
+    assert entries[0].find(f'{ATOM}id').text == f'{BASE_URL}/posts/new/'
+    assert entries[0].find(f'{ATOM}published').text == \
+        '2021-06-01T00:00:00+00:00'
+    assert entries[1].find(f'{ATOM}published') is None
+
+
+def test_feed_escapes_metadata(tmp_path):
+    config = make_config(tmp_path, site_name='Me & <You>')
+    dct_meta = {'posts/cats/': post(
+        'cats', 1000, title='Cats & "Dogs" <b>', summary='1 < 2',
+        category='Ink & Paper')}
+
+    txt = feed_xml(config, dct_meta)
+
+    feed = ET.fromstring(txt)
+    entry = feed.find(f'{ATOM}entry')
+    assert feed.find(f'{ATOM}title').text == 'Me & <You>'
+    assert entry.find(f'{ATOM}title').text == 'Cats & "Dogs" <b>'
+    assert entry.find(f'{ATOM}summary').text == '1 < 2'
+    assert entry.find(f'{ATOM}category').get('term') == 'Ink & Paper'
+    assert '<b>' not in txt
+
+
+def test_feed_disabled(tmp_path):
+    config = make_config(tmp_path, feed_posts='0')
+    assert feed_xml(config, {'posts/a/': post('a', 1000)}) is None
+
+
+def test_sitemap_lists_pages_of_the_site(tmp_path):
+    config = make_config(tmp_path)
+    dct_meta = {
+        'posts/cats/': post('cats', 1000),
+        'posts/moved/': post('moved', 2000,
+                             canonical='https://other.org/moved/'),
+        }
+    dct_pages = {'menu/drawings/': ['posts/cats/'], 'menu/other/': []}
+
+    dct_files = sitemap_files(config, dct_meta, dct_pages)
+
+    assert list(dct_files) == [SITEMAP_FILE]
+    urlset = ET.fromstring(dct_files[SITEMAP_FILE])
+    urls = {u.find(f'{SITEMAP}loc').text: u.find(f'{SITEMAP}lastmod')
+            for u in urlset}
+    assert list(urls) == [BASE_URL + '/', BASE_URL + '/menu/drawings/',
+                          BASE_URL + '/menu/other/',
+                          BASE_URL + '/posts/cats/']
+    assert urls[BASE_URL + '/menu/drawings/'].text == \
+        '1970-01-01T00:16:40+00:00'
+    assert urls[BASE_URL + '/menu/other/'] is None
+
+
+def test_large_sitemap_is_split(tmp_path, monkeypatch):
+    monkeypatch.setattr(feeds, 'SITEMAP_MAX_URLS', 2)
+    config = make_config(tmp_path)
+    dct_meta = {f'posts/p{n}/': post(f'p{n}', 1000 + n) for n in range(4)}
+
+    dct_files = sitemap_files(config, dct_meta, {})
+
+    # Main page and 4 posts
+    assert sorted(dct_files) == ['sitemap-1.xml', 'sitemap-2.xml',
+                                 'sitemap-3.xml', SITEMAP_FILE]
+    index = ET.fromstring(dct_files[SITEMAP_FILE])
+    assert index.tag == f'{SITEMAP}sitemapindex'
+    assert [s.find(f'{SITEMAP}loc').text for s in index] == \
+        [f'{BASE_URL}/sitemap-{n}.xml' for n in (1, 2, 3)]
+    assert len(ET.fromstring(dct_files['sitemap-3.xml'])) == 1
+
+
+def test_built_feed_and_sitemap(site):
+    site.write_post('cats', 'Cats & <Dogs>', summary='Cats.')
+    site.write_post('trees', 'Trees', category='Paintings')
+
+    site.build()
+
+    feed = ET.fromstring(site.read('feed.xml'))
+    assert sorted(e.find(f'{ATOM}title').text
+                  for e in feed.findall(f'{ATOM}entry')) == \
+        ['Cats & <Dogs>', 'Trees']
+    urlset = ET.fromstring(site.read('sitemap.xml'))
+    assert f'{BASE_URL}/posts/trees/' in \
+        [u.find(f'{SITEMAP}loc').text for u in urlset]
+    assert 'href="/feed.xml"' in site.read('index.html')
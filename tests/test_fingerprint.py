@@ -0,0 +1,70 @@
+"""Content-hashed file names and the references to them."""
+# Standard libraries
+import json
+import os
+import re
+
+# Package modules
+from artblog.fingerprint import HASH_LENGTH, rewrite_asset_urls
+
+DCT_URLS = {
+    '/css/style.css': '/css/style.0123456789.css',
+    '/posts/cats/cat.jpg': '/posts/cats/cat.abcdef0123.jpg',
+    '/posts/cats/cat-300.jpg': '/posts/cats/cat-300.9876543210.jpg',
+    }
+
+
+def test_rewrite_src_and_href():
+    txt = ('<link rel="stylesheet" href="/css/style.css">'
+           '<img src="cat.jpg" alt="Cat">')
+    assert rewrite_asset_urls(txt, '/posts/cats/', DCT_URLS) == (
+        '<link rel="stylesheet" href="/css/style.0123456789.css">'
+        '<img src="/posts/cats/cat.abcdef0123.jpg" alt="Cat">')
+
+
+def test_rewrite_srcset():
+    txt = '<img srcset="cat-300.jpg 300w, /posts/cats/cat.jpg 600w">'
+    assert rewrite_asset_urls(txt, '/posts/cats/', DCT_URLS) == (
+        '<img srcset="/posts/cats/cat-300.9876543210.jpg 300w, '
+        '/posts/cats/cat.abcdef0123.jpg 600w">')
+
+
+def test_query_and_fragment_are_kept():
+    txt = '<a href="/css/style.css?v=1#top">'
+    assert rewrite_asset_urls(txt, '/', DCT_URLS) == \
+        '<a href="/css/style.0123456789.css?v=1#top">'
+
+
+def test_other_urls_are_unchanged():
+    txt = ('<a href="https://example.com/css/style.css">'
+           '<img src="/posts/dogs/cat.jpg">'
+           '<a href="/posts/cats/">')
+    assert rewrite_asset_urls(txt, '/', DCT_URLS) == txt
+    assert rewrite_asset_urls(txt, '/', {}) == txt
+
+
+def test_fingerprinted_build(site):
+    site.write_post('cats', 'Cats', body='![Cat](cat.png)\n')
+    with open(os.path.join(site.content, 'cats', 'cat.png'), 'wb') as f:
+        f.write(b'not really a PNG file')
+    site.settings['fingerprint'] = 'true'
+
+    site.build()
+
+    outputs = site.outputs()
+    hashed = '[0-9a-f]{%d}' % HASH_LENGTH
+    [css] = [p for p in outputs if re.fullmatch(f'css/style.{hashed}.css', p)]
+    [png] = [p for p in outputs
+             if re.fullmatch(f'posts/cats/cat.{hashed}.png', p)]
+    assert 'css/style.css' not in outputs
+    assert 'posts/cats/cat.png' not in outputs
+
+    page = site.read('posts/cats/index.html')
+    assert f'href="/{css}"' in page
+    assert f'src="/{png}"' in page
+
+    cache_manifest = json.loads(site.read('cache-manifest.json'))
+    assert f'/{css}' in cache_manifest['immutable']['paths']
+    assert f'/{png}' in cache_manifest['immutable']['paths']
+    assert '/posts/cats/index.html' in cache_manifest['revalidate']['paths']
+    assert cache_manifest['fingerprints']['/posts/cats/cat.png'] == f'/{png}'
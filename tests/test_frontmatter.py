@@ -0,0 +1,128 @@
+"""Front matter parsing without YAML, checked against yaml.BaseLoader."""
+# Installed packages
+import pytest
+import yaml
+
+# Package modules
+from artblog import frontmatter
+from artblog.frontmatter import (parse_front_matter,
+                                 parse_simple_front_matter,
+                                 read_front_matter, split_front_matter)
+
+HEAD = 'title: Cats\ncategory: Drawings\n'
+
+# Front matter parsed without YAML
+SIMPLE = [
+    'title: My Post\ncategory: Drawings\n',
+    HEAD + 'summary: Sketches, ink and paper.\ntags: a, b, c\n',
+    HEAD + 'date: 2021-06-01\nimage: cat_1.jpg\n',
+    HEAD + 'time: 10:30 sketch\nurl: https://example.com/a?b=c#d\n',
+    HEAD + "summary: The artist's day, 50% done!\nlanguage: C# and C++\n",
+    HEAD + 'summary: Café, naïve, 日本\n',
+    HEAD + 'summary:\nempty:\n',
+    HEAD + 'summary:   extra spaces   \n',
+    HEAD + '# A comment\n\nsort-key: 3\nsort_key2: x\n',
+    'title: Cats\r\ncategory: Drawings\r\n',
+    '---\n' + HEAD,
+    HEAD + 'summary: A "quoted" word and a [link]\n',
+    ]
+
+# Front matter that needs the YAML loader
+FALLBACK = [
+    HEAD + 'summary: "Quoted: with colon"\n',
+    HEAD + "summary: 'Single quoted'\n",
+    HEAD + 'summary: Cats # a comment\n',
+    HEAD + 'tags:\n  - a\n  - b\n',
+    HEAD + 'summary: >\n  Folded\n  text\n',
+    HEAD + 'summary: |\n  Literal\n  text\n',
+    HEAD + 'summary: A long\n  summary\n',
+    HEAD + 'summary: &anchor Anchored\n',
+    HEAD + 'summary: !!str 123\n',
+    HEAD + 'summary: [a, b]\n',
+    HEAD + 'summary: {a: b}\n',
+    HEAD + 'nested:\n  key: value\n',
+    HEAD + '"quoted key": value\n',
+    ]
+
+# Front matter the YAML loader rejects, so must not be parsed without it
+INVALID = [
+    HEAD + 'summary: Note:\n',
+    HEAD + 'summary: a: b\n',
+    HEAD + 'summary: - x\n',
+    HEAD + 'summary: ? x\n',
+    HEAD + 'summary: @x\n',
+    HEAD + 'summary: `x`\n',
+    HEAD + 'summary: %x\n',
+    ]
+
+
+def base_loader(meta_txt):
+    """Return front matter parsed by the pure Python YAML loader."""
+    return yaml.load(meta_txt, Loader=yaml.BaseLoader)
+
+
+@pytest.mark.parametrize('meta_txt', SIMPLE)
+def test_simple_front_matter_matches_yaml(meta_txt):
+    meta = parse_simple_front_matter(meta_txt)
+    assert meta is not None
+    assert meta == base_loader(meta_txt)
+    assert parse_front_matter(meta_txt) == meta
+
+
+@pytest.mark.parametrize('meta_txt', FALLBACK)
+def test_fallback_front_matter_matches_yaml(meta_txt):
+    assert parse_simple_front_matter(meta_txt) is None
+    assert parse_front_matter(meta_txt) == base_loader(meta_txt)
+
+
+@pytest.mark.parametrize('meta_txt', INVALID)
+def test_invalid_yaml_is_rejected(meta_txt):
+    assert parse_simple_front_matter(meta_txt) is None
+    with pytest.raises(yaml.YAMLError):
+        base_loader(meta_txt)
+    with pytest.raises(yaml.YAMLError):
+        parse_front_matter(meta_txt)
+
+
+def test_tab_in_value_is_left_to_yaml():
+    # yaml.BaseLoader rejects it, the libyaml based loader does not
+    assert parse_simple_front_matter(HEAD + 'summary: a\tb\n') is None
+
+
+@pytest.mark.parametrize('meta_txt, error', [
+    (None, 'Cannot find metadata'),
+    ('- a\n- b\n', 'Cannot find metadata'),
+    ('title: Cats\n', 'Missing "category" in metadata'),
+    ('category: Drawings\n', 'Missing "title" in metadata'),
+    ])
+def test_invalid_front_matter(meta_txt, error):
+    with pytest.raises(ValueError, match=error):
+        parse_front_matter(meta_txt)
+
+
+def test_split_front_matter():
+    meta_txt, md_txt = split_front_matter(
+        '---\n' + HEAD + '---\n\n# Cats\n\n---\n')
+    assert meta_txt == '---\n' + HEAD
+    assert md_txt == '\n\n# Cats\n\n---\n'
+    assert split_front_matter('# No front matter\n') == \
+        (None, '# No front matter\n')
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 5, 8, 64])
+def test_read_front_matter_in_chunks(tmp_path, monkeypatch, read_size):
+    monkeypatch.setattr(frontmatter, 'READ_SIZE', read_size)
+    txt = '---\n' + HEAD + 'rule: ----\n---- \n---\n\nBody\n---\nMore\n'
+    filepath = tmp_path / 'post.md'
+    filepath.write_text(txt, encoding='utf-8')
+
+    assert read_front_matter(filepath) == split_front_matter(txt)[0]
+
+
+@pytest.mark.parametrize('txt', ['---\n' + HEAD, '---\n' + HEAD + '----\n'])
+def test_read_front_matter_without_end(tmp_path, monkeypatch, txt):
+    monkeypatch.setattr(frontmatter, 'READ_SIZE', 4)
+    filepath = tmp_path / 'post.md'
+    filepath.write_text(txt, encoding='utf-8')
+
+    assert read_front_matter(filepath) is None
@@ -0,0 +1,69 @@
+"""Incremental builds reusing the outputs recorded in the manifest."""
+# Standard libraries
+import os
+import shutil
+
+
+def write_posts(site):
+    """Write three posts, one with an attachment."""
+    site.write_post('cats', 'Cats')
+    site.write_post('trees', 'Trees', category='Paintings')
+    site.write_post('dogs', 'Dogs', body='Dogs.\n\n[Notes](notes.txt)\n')
+    with open(os.path.join(site.content, 'dogs', 'notes.txt'), 'wt') as f:
+        f.write('Notes on dogs\n')
+
+
+def test_unchanged_rebuild_writes_nothing(site):
+    write_posts(site)
+    site.build()
+    before = site.outputs()
+
+    stats = site.build('--incremental')
+
+    assert site.outputs() == before
+    assert stats['rendered'] == 0
+    assert stats['copied'] == 0
+    assert stats['linked'] == 0
+    assert stats['removed'] == 0
+
+
+def test_changed_post_is_the_only_one_rendered(site):
+    write_posts(site)
+    site.build()
+    before = site.outputs()
+
+    site.write_post('cats', 'Cats', body='Other text.\n')
+    stats = site.build('--incremental')
+
+    after = site.outputs()
+    assert stats['rendered'] == 1
+    assert 'Other text.' in site.read('posts/cats/index.html')
+    assert after['posts/cats/index.html'] != before['posts/cats/index.html']
+    for relpath in ('posts/trees/index.html', 'posts/dogs/index.html',
+                    'posts/dogs/notes.txt'):
+        assert after[relpath] == before[relpath]
+
+
+def test_deleted_post_outputs_are_removed(site):
+    write_posts(site)
+    site.build()
+
+    shutil.rmtree(os.path.join(site.content, 'dogs'))
+    stats = site.build('--incremental')
+
+    outputs = site.outputs()
+    assert not any(relpath.startswith('posts/dogs/') for relpath in outputs)
+    assert not os.path.exists(os.path.join(site.output, 'posts', 'dogs'))
+    assert stats['removed'] == 2
+    assert 'posts/cats/index.html' in outputs
+    assert '/posts/dogs/' not in site.read('sitemap.xml')
+
+
+def test_full_build_renders_everything(site):
+    write_posts(site)
+    site.build()
+
+    stats = site.build()
+
+    assert stats['rendered'] == 3
+    assert stats['reused'] == 0
@@ -0,0 +1,83 @@
+"""Minification of generated HTML and CSS."""
+# Standard libraries
+import io
+
+# Installed packages
+import pytest
+
+# Package modules
+from artblog.minify import minify_css, minify_html, write_minified
+
+
+def minified(minifier, txt):
+    """Return (minified text, bytes saved)."""
+    f = io.StringIO()
+    saved = write_minified(f, txt, minifier)
+    return f.getvalue(), saved
+
+
+@pytest.mark.parametrize('element', [
+    '<pre>\n  line 1\n\n    line 2  \n</pre>',
+    '<code class="x">a  =  b\n\n  c</code>',
+    '<textarea name="t">\n   keep   this\n</textarea>',
+    '<script>\n  if (a  <  b) {\n    x = "  y  ";\n  }\n</script>',
+    '<style>\n  p  {  color:  red;  }\n</style>',
+    '<PRE>\n  upper   case\n</PRE>',
+    '<pre>  <!-- kept -->  </pre>',
+    ])
+def test_html_preformatted_elements_are_kept(element):
+    txt = f'<div>\n    <p>Before</p>\n    {element}\n    <p>After</p>\n</div>'
+    html, _ = minified(minify_html, txt)
+    assert element in html
+    assert html == f'<div>\n<p>Before</p>\n{element}\n<p>After</p>\n</div>'
+
+
+def test_html_whitespace_and_comments():
+    txt = ('<p>Some   text\n\n   on  lines</p>  <!-- comment -->\n'
+           '<!--[if IE]><p>IE</p><![endif]-->\n'
+           '<a  href="/a  b"   title="x">link</a>&nbsp; end')
+    html, saved = minified(minify_html, txt)
+    assert html == ('<p>Some text\non lines</p> \n'
+                    '<!--[if IE]><p>IE</p><![endif]-->\n'
+                    '<a  href="/a  b"   title="x">link</a>&nbsp; end')
+    assert saved == len(txt) - len(html)
+
+
+def test_html_saved_bytes_count_encoded_comments():
+    txt = '<p>a</p><!-- café -->'
+    html, saved = minified(minify_html, txt)
+    assert html == '<p>a</p>'
+    assert saved == len(txt.encode('utf-8')) - len(html.encode('utf-8'))
+
+
+def test_css():
+    txt = ('/* Header */\nbody  {\n  margin: 0 auto;\n  font-family: '
+           '"Open  Sans", sans-serif;\n}\n\nnav  ul > li a {\n'
+           "  content: '  a ; b  ';\n}\n")
+    css, saved = minified(minify_css, txt)
+    assert css == ('body{margin: 0 auto;font-family: "Open  Sans",'
+                   "sans-serif;}nav ul>li a{content: '  a ; b  ';}")
+    assert saved == len(txt) - len(css)
+
+
+def test_css_without_minification():
+    css, saved = minified(None, 'a { color: red; }\n')
+    assert css == 'a { color: red; }\n'
+    assert saved == 0
+
+
+def test_minified_build(site):
+    body = 'Some   text.\n\n```\ncode   <x>\n    indented\n```\n'
+    site.write_post('cats', 'Cats', body=body)
+    site.build()
+    assert '    <h1>' in site.read('posts/cats/index.html')
+
+    site.settings['minify'] = 'true'
+    stats = site.build('--incremental')
+
+    page = site.read('posts/cats/index.html')
+    assert stats['rendered'] == 1
+    assert stats['minified'] > 0
+    assert '\n ' not in page.split('<pre>')[0]
+    assert '<pre><code>code   &lt;x&gt;\n    indented\n</code></pre>' in page
+    assert '\n  ' not in site.read('css/style.css')
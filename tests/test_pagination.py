@@ -0,0 +1,79 @@
+"""Category pages split into pages of posts_per_page posts."""
+# Standard libraries
+import os
+import re
+
+# Title link of a post card
+POST_LINK = re.compile(r'class="post-title"><a href="/posts/([^/"]+)/"')
+
+
+def write_posts(site, n_posts):
+    """Write posts dated one day apart in the same category."""
+    for n in range(1, n_posts + 1):
+        site.write_post(f'post{n}', f'Post {n}', date=f'2020-01-{n:02d}')
+
+
+def page_posts(site, page_slug):
+    """Return the folder names of the posts linked from a page."""
+    return POST_LINK.findall(site.read(page_slug + 'index.html'))
+
+
+def test_posts_are_split_into_pages(site):
+    write_posts(site, 5)
+    site.settings.update(posts_per_page='2', sort_posts_by='date',
+                         sort_order='descending')
+
+    site.build()
+
+    assert page_posts(site, 'menu/drawings/') == ['post5', 'post4']
+    assert page_posts(site, 'menu/drawings/page/2/') == ['post3', 'post2']
+    assert page_posts(site, 'menu/drawings/page/3/') == ['post1']
+    assert not os.path.exists(
+        os.path.join(site.output, 'menu', 'drawings', 'page', '4'))
+    # A category without posts has one page
+    assert page_posts(site, 'menu/paintings/') == []
+    assert not os.path.exists(
+        os.path.join(site.output, 'menu', 'paintings', 'page'))
+
+
+def test_pages_link_to_previous_and_next(site):
+    write_posts(site, 5)
+    site.settings['posts_per_page'] = '2'
+
+    site.build()
+
+    first = site.read('menu/drawings/index.html')
+    middle = site.read('menu/drawings/page/2/index.html')
+    last = site.read('menu/drawings/page/3/index.html')
+    assert '<link rel="next" href="/menu/drawings/page/2/">' in first
+    assert 'rel="prev"' not in first
+    assert '<link rel="prev" href="/menu/drawings/">' in middle
+    assert '<link rel="next" href="/menu/drawings/page/3/">' in middle
+    assert '<link rel="prev" href="/menu/drawings/page/2/">' in last
+    assert 'rel="next"' not in last
+    assert '<title>Drawings - Page 3 | Test</title>' in last
+
+
+def test_one_page_without_posts_per_page(site):
+    write_posts(site, 5)
+
+    site.build()
+
+    assert page_posts(site, 'menu/drawings/') == \
+        ['post1', 'post2', 'post3', 'post4', 'post5']
+    assert 'rel="next"' not in site.read('menu/drawings/index.html')
+    assert not os.path.exists(
+        os.path.join(site.output, 'menu', 'drawings', 'page'))
+
+
+def test_pages_no_longer_needed_are_removed(site):
+    write_posts(site, 5)
+    site.settings['posts_per_page'] = '2'
+    site.build()
+
+    site.settings['posts_per_page'] = '3'
+    site.build('--incremental')
+
+    assert page_posts(site, 'menu/drawings/page/2/') == ['post4', 'post5']
+    assert not os.path.exists(
+        os.path.join(site.output, 'menu', 'drawings', 'page', '3'))
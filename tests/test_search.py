@@ -0,0 +1,74 @@
+"""Terms and shards of the client-side search index."""
+# Standard libraries
+import json
+
+# Installed packages
+import pytest
+
+# Package modules
+from artblog.search import (INDEX_FOLDER, MAX_TERM_LENGTH, post_terms,
+                            shard_name, tokenize)
+
+
+def test_tokenize_normalizes_terms():
+    assert tokenize('Ink DRAWINGS, ink-drawings & Paintings!') == \
+        {'ink', 'drawings', 'paintings'}
+    # Decomposed and composed accents give the same term
+    assert tokenize('Cafe\u0301 CAF\u00c9 caf\u00e9') == {'caf\u00e9'}
+    assert tokenize('snake_case 2021 x1') == {'snake', 'case', '2021', 'x1'}
+    assert tokenize('日本 Ελλάδα') == {'日本', 'ελλάδα'}
+
+
+def test_tokenize_drops_short_long_and_common_words():
+    long_term = 'a' * (MAX_TERM_LENGTH + 1)
+    assert tokenize(f'I drew a cat with the pen {long_term}') == \
+        {'drew', 'cat', 'pen'}
+    assert tokenize('a' * MAX_TERM_LENGTH) == {'a' * MAX_TERM_LENGTH}
+
+
+def test_post_terms():
+    meta = {'title': 'Cats', 'summary': 'Sketches', 'tags': 'ink, pen'}
+    content_html = ('<p class="lead">Drawn&nbsp;with <b>care</b> &amp; '
+                    'love</p><img src="cat.jpg" alt="hidden">')
+    assert post_terms(meta, content_html) == \
+        ['care', 'cats', 'drawn', 'ink', 'love', 'pen', 'sketches']
+
+
+@pytest.mark.parametrize('term, name', [
+    ('cats', 'ca'),
+    ('2021', '20'),
+    ('x1', 'x1'),
+    ('été', 'x' + 'ét'.encode('utf-8').hex()),
+    ('aé', 'x61c3a9'),
+    ('日本', 'xe697a5e69cac'),
+    ])
+def test_shard_name(term, name):
+    assert shard_name(term) == name
+
+
+def test_built_index(site):
+    site.write_post('cats', 'Cats', summary='Ink sketches',
+                    body='Drawn with care.\n')
+    site.write_post('trees', 'Trees', category='Paintings',
+                    body='Painted with care, été.\n')
+    site.settings['search'] = 'true'
+
+    site.build()
+
+    def read_json(name):
+        return json.loads(site.read(f'{INDEX_FOLDER}/{name}'))
+
+    meta = read_json('meta.json')
+    assert meta['docs'] == 2
+    for name in meta['shards']:
+        shard = read_json(f'terms-{name}.json')
+        assert all(shard_name(term) == name for term in shard)
+    assert 'xc3a974' in meta['shards']
+
+    # Post ids are delta encoded, cats is post 0 and trees post 1
+    assert read_json('terms-ca.json')['care'] == [0, 1]
+    assert read_json('terms-ca.json')['cats'] == [0]
+    assert read_json('terms-tr.json')['trees'] == [1]
+    assert read_json('docs-0.json') == [
+        ['/posts/cats/', 'Cats', 'Ink sketches'],
+        ['/posts/trees/', 'Trees', '']]
@@ -0,0 +1,76 @@
+"""Compiled templates and escaping of metadata in the generated pages."""
+# Standard libraries
+import html
+import re
+
+# Package modules
+from artblog.template import (BRACKET_SLOT, compile_template, escape,
+                              render_template, split_template)
+
+TITLE = 'Cats & "Dogs" <b>it\'s</b>'
+ESCAPED_TITLE = 'Cats &amp; &quot;Dogs&quot; &lt;b&gt;it&#x27;s&lt;/b&gt;'
+
+
+def test_escape():
+    assert escape(TITLE) == ESCAPED_TITLE
+    assert escape('/posts/a b/?x=1&y=2') == '/posts/a b/?x=1&amp;y=2'
+
+
+def test_render_template():
+    segments = compile_template('<h1>{{title}}</h1>{{content}}{{title}}')
+    assert segments == ['<h1>', 'title', '</h1>', 'content', '', 'title', '']
+    assert render_template(segments, {'title': 'A', 'content': '<p>B</p>'}) \
+        == '<h1>A</h1><p>B</p>A'
+
+
+def test_inserted_text_is_not_scanned_for_slots():
+    segments = compile_template('<p>{{title}}</p><p>{{summary}}</p>')
+    values = {'title': '{{summary}}', 'summary': '[TITLE]'}
+    assert render_template(segments, values) == \
+        '<p>{{summary}}</p><p>[TITLE]</p>'
+
+
+def test_bracket_slots():
+    segments = compile_template('<a href="[HREF]">[TITLE] [x]</a>',
+                                BRACKET_SLOT)
+    assert render_template(segments, {'HREF': '/a', 'TITLE': 'A'}) == \
+        '<a href="/a">A [x]</a>'
+
+
+def test_split_template():
+    segments = compile_template('<main>{{content}}</main>{{footer}}')
+    before, after = split_template(segments, 'content')
+    assert render_template(before, {}) == '<main>'
+    assert render_template(after, {'footer': '<footer>'}) == \
+        '</main><footer>'
+
+
+def test_metadata_is_escaped_in_pages(site):
+    site.write_post('cats', TITLE, summary='1 < 2 & "3"',
+                    tags='ink, <i>, "q"')
+    site.write_post('trees', TITLE, category='<Other> & "more"')
+
+    site.build()
+
+    page = site.read('posts/cats/index.html')
+    assert f'<title>{ESCAPED_TITLE} | Test</title>' in page
+    assert f'<meta property="og:title" content="{ESCAPED_TITLE} | Test">' \
+        in page
+    # Rendered from markdown, which writes the quote as is
+    [h1] = re.findall(r'<h1>(.*)</h1>', page)
+    assert '<' not in h1 and html.unescape(h1) == TITLE
+    assert '<meta property="article:tag" content="&lt;i&gt;">' in page
+    assert '<meta property="article:tag" content="&quot;q&quot;">' in page
+
+    page = site.read('posts/trees/index.html')
+    assert '<meta property="article:tag" ' \
+        'content="&lt;Other&gt; &amp; &quot;more&quot;">' in page
+
+    listing = site.read('menu/drawings/index.html')
+    assert f'<a href="/posts/cats/">{ESCAPED_TITLE}</a>' in listing
+    assert '1 &lt; 2 &amp; &quot;3&quot;' in listing
+
+    # No raw markup from the metadata in any page
+    for relpath in site.outputs():
+        if relpath.endswith('.html'):
+            assert not re.search(r'<b>|<i>|<Other>', site.read(relpath))